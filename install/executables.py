@@ -75,7 +75,7 @@ software_folder = os.path.abspath(
 
 sys.path.append(software_folder)
 
-from tauren import logger, core, load, _interface
+from tauren import logger, core, load, checkpoint, estimate, plan, profiling
 
 log_path = Path(logger.log_file_name)
 
@@ -132,6 +132,117 @@ ap.add_argument(
         )
     )
 
+ap.add_argument(
+    "--resume",
+    action="store_true",
+    help=(
+        "Restores the last checkpoint of a previous run and skips "
+        "the actions that did not change since."
+        ),
+    )
+
+ap.add_argument(
+    "--checkpoint-folder",
+    default="tauren_checkpoints",
+    help="Folder where checkpoints are saved. Defaults to %(default)s.",
+    )
+
+ap.add_argument(
+    "--keep-checkpoints",
+    type=int,
+    default=2,
+    help=(
+        "Number of checkpoints kept, the last actions. "
+        "Defaults to %(default)s."
+        ),
+    )
+
+ap.add_argument(
+    "--no-checkpoints",
+    action="store_true",
+    help="Do not save checkpoints after each action.",
+    )
+
+ap.add_argument(
+    "--no-fuse",
+    action="store_true",
+    help=(
+        "Run each action on its own instead of reading the frames "
+        "once for consecutive actions that only read frames."
+        ),
+    )
+
+ap.add_argument(
+    "--reorder-actions",
+    action="store_true",
+    help=(
+        "Run frame slicing, atom selection and solvent removal "
+        "before preceding actions when the results do not change."
+        ),
+    )
+
+ap.add_argument(
+    "--dry-run",
+    action="store_true",
+    help=(
+        "Reads only the trajectory header and topology and logs the "
+        "estimated bytes read, time, peak memory and output size of "
+        "each action, without running them. XTC and TRR files have "
+        "no frame count in their header, their frames are counted by "
+        "seeking through the whole file."
+        ),
+    )
+
+ap.add_argument(
+    "--throughput",
+    default=None,
+    help=(
+        "Bytes per second actions read, megabytes or a size with a "
+        "unit like 500MB, for the times of --dry-run. Defaults to "
+        f"{estimate.default_throughput}."
+        ),
+    )
+
+ap.add_argument(
+    "--max-memory",
+    default=None,
+    help=(
+        "Memory budget, megabytes or a size with a unit like 16GB. "
+        "Chunk sizes are derived from it. Overrides the "
+        "\"max_memory\" of the configuration file."
+        ),
+    )
+
+ap.add_argument(
+    "--profile",
+    default=None,
+    metavar="FILE",
+    help=(
+        "Writes the wall time, CPU time, peak memory, frames per "
+        "second and cache hits of each action to a JSON file. "
+        "A summary table is always logged at the end of the run."
+        ),
+    )
+
+ap.add_argument(
+    "--trace-memory",
+    action="store_true",
+    help=(
+        "Profiles the memory allocated by Python in each action, "
+        "slows down the run."
+        ),
+    )
+
+ap.add_argument(
+    "--workers",
+    type=int,
+    default=1,
+    help=(
+        "Maximum number of actions run concurrently when they do not "
+        "depend on each other. Defaults to %(default)s."
+        ),
+    )
+
 cmd = ap.parse_args()
 
 # set config file
@@ -170,21 +281,93 @@ else:
     log.info("* ERROR * No trajectory type selected")
     sys.exit(1)
 
-traj = load.load_traj(
-    trajectory_path,
-    topology_path,
-    traj_type=trajtype,
+# set memory budget
+max_memory = cmd.max_memory or getattr(conf, "max_memory", None)
+
+actions = [
+    (action, arguments)
+    for action, arguments in conf.actions.items()
+    if not action.startswith("#")
+    ]
+
+if cmd.reorder_actions:
+    actions = plan.reorder_actions(actions)
+
+if cmd.dry_run:
+    estimates = estimate.estimate_actions(
+        trajectory_path,
+        topology_path,
+        trajtype,
+        actions,
+        fuse=not cmd.no_fuse,
+        max_memory=max_memory,
+        throughput=cmd.throughput,
+        )
+    log.info(f"* Estimated costs:\n\n{estimate.format_table(estimates)}\n")
+    sys.exit(0)
+
+digests = checkpoint.chain_digests(
+    [trajectory_path, topology_path],
+    trajtype,
+    actions,
+    )
+
+checkpoints = checkpoint.Checkpoints(
+    cmd.checkpoint_folder,
+    keep=cmd.keep_checkpoints,
     )
 
-for action, arguments in conf.actions.items():
+profiler = profiling.Profiler(trace_memory=cmd.trace_memory)
+
+with profiler:
+    
+    resumed = checkpoints.restore(digests) if cmd.resume else None
     
-    if action.startswith("#"):
-        continue
+    if resumed:
+        last_done, traj = resumed
+        traj.set_memory_budget(max_memory)
+    
+    else:
+        last_done = -1
+        with profiler.action("load_traj") as loading:
+            try:
+                traj = load.load_traj(
+                    trajectory_path,
+                    topology_path,
+                    traj_type=trajtype,
+                    max_memory=max_memory,
+                    )
+            except MemoryError as e:
+                log.info(f"* ERROR * {e}")
+                sys.exit(1)
+            loading.frames = len(traj.full_frames_list)
     
-    action_name = action.rstrip("_")
-    log.debug(f"*** Performing '{action_name}' with options: '{arguments}'")
+    profiler.taurentraj = traj
     
-    _interface.actions_dict[action_name](traj, arguments)
+    for action, _ in actions[:last_done + 1]:
+        log.info(
+            f"* '{action.rstrip('_')}' unchanged since checkpoint, skipping"
+            )
+    
+    steps = plan.compile_plan(
+        actions[last_done + 1:],
+        start=last_done + 1,
+        fuse=not cmd.no_fuse,
+        )
+    
+    def save_checkpoint(step):
+        checkpoints.save(step.last_index, digests, traj)
+    
+    plan.Scheduler(workers=cmd.workers).run(
+        traj,
+        steps,
+        on_idle=None if cmd.no_checkpoints else save_checkpoint,
+        )
+
+log.info(f"* Profile:\n\n{profiler.format_table()}\n")
+
+if cmd.profile:
+    profiler.write_json(cmd.profile)
 
 log.info("* Tauren-MD completed!")
 """
@@ -293,7 +476,7 @@ log.info("* Checking Conda environment...")
 if install_option == 1:
 
     if system.latest_env_version > installed_env_version:
-
+        
         log.info("* A NEW Python environment version is available")
         log.info("* Software's dependencies must be updated")
     
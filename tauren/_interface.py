@@ -25,6 +25,8 @@ actions_dict = {
     "remove_solvent": lambda x, y: x.remove_solvent(**y),
     "frame_slice": lambda x, y: x.frame_slice(**y),
     "atom_selection": lambda x, y: x.set_atom_selection(**y),
+    "observables_store": lambda x, y: x.set_observables_store(**y),
+    "results_cache": lambda x, y: x.set_results_cache(**y),
     "align_traj": lambda x, y: x.align_traj(**y),
     "try_image_molecules": lambda x, y: x.image_molecules(**y),
     "frames2file": lambda x, y: x.frames2file(**y),
@@ -33,4 +35,8 @@ actions_dict = {
         lambda x, y: produce.rmsds_combined_chains(x, **y),
     "produce_rmsds_separated_chains":
         lambda x, y: produce.rmsds_separated_chains(x, **y),
+    "produce_rmsf": lambda x, y: produce.rmsf(x, **y),
+    "produce_rmsds_per_residue":
+        lambda x, y: produce.rmsds_per_residue(x, **y),
+    "export_observables": lambda x, y: x.export_observables(**y),
     }
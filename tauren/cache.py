@@ -0,0 +1,371 @@
+"""
+Persistent cache of calculated observables.
+
+Observables are stored under a content address: the hash of what
+determines them, the content of the input files, the transformations
+applied to the trajectory, the calculation and its parameters, the
+atom selection and the frame slicing. Rerunning an analysis reads
+the observable instead of calculating it again.
+
+The cache has a maximum size, least recently used observables are
+removed first.
+"""
+# Copyright © 2018-2019 Tauren-MD Project
+#
+# Tauren-MD is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tauren-MD is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tauren-MD. If not, see <http://www.gnu.org/licenses/>.
+#
+# Contributors to this file:
+# - João M.C. Teixeira (https://github.com/joaomcteixeira)
+import functools
+import hashlib
+import inspect
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from tauren import core
+from tauren import logger
+from tauren import reference
+from tauren import storage
+
+log = logger.get_log(__name__)
+
+
+class ResultsCache:
+    """
+    Cache of observables on disk.
+    
+    Each observable is a ``<cache key>.npz`` file with the data,
+    the column names and the storage key. Reading an observable
+    marks it as recently used.
+    
+    Hashes of input files are kept in ``file_hashes.json`` by path,
+    size and modification time, so unchanged files are hashed once.
+    
+    Parameters
+    ----------
+    folder : str or Path, optional
+        Defaults to the "results" folder in
+        :const:`tauren.core.cache_folder`.
+    
+    max_size_mb : float, optional
+        Maximum size of the cached observables in megabytes.
+        Defaults to 1024.
+    """
+    
+    def __init__(self, folder=None, max_size_mb=1024):
+        
+        if max_size_mb <= 0:
+            raise ValueError(
+                f"max_size_mb should be positive: '{max_size_mb}'"
+                )
+        
+        if folder is None:
+            folder = core.cache_folder.joinpath("results")
+        
+        self.folder = Path(folder)
+        self.folder.mkdir(parents=True, exist_ok=True)
+        
+        self.max_size = int(max_size_mb * 1024 ** 2)
+        
+        self.hits = 0
+        self.misses = 0
+        
+        self._hashes_file = self.folder.joinpath("file_hashes.json")
+        
+        try:
+            with open(self._hashes_file, "r") as fh:
+                self._hashes = json.load(fh)
+        
+        except (OSError, ValueError):
+            self._hashes = {}
+    
+    @property
+    def size(self):
+        """Size in bytes of the cached observables."""
+        return sum(f.stat().st_size for f in self.folder.glob("*.npz"))
+    
+    def file_hash(self, file_path):
+        """
+        Returns the sha256 hex digest of the file content.
+        """
+        
+        path = Path(file_path).resolve()
+        stat = path.stat()
+        
+        entry = f"{path}:{stat.st_size}:{stat.st_mtime_ns}"
+        
+        if entry not in self._hashes:
+            
+            log.debug(f"hashing {path}")
+            self._hashes[entry] = reference._file_hash(path)
+            
+            with open(self._hashes_file, "w") as fh:
+                json.dump(self._hashes, fh)
+        
+        return self._hashes[entry]
+    
+    def gen_key(self, input_files, **items):
+        """
+        Generates the cache key of an observable.
+        
+        Parameters
+        ----------
+        input_files : list of str
+            The files from which the trajectory was read,
+            the key depends on their content, not on their paths.
+        
+        items
+            Anything else that determines the observable,
+            must be JSON serializable or have a meaningful str.
+        """
+        
+        description = json.dumps(
+            {
+                "inputs": [self.file_hash(f) for f in input_files],
+                **items,
+                },
+            sort_keys=True,
+            default=str,
+            )
+        
+        return hashlib.sha256(description.encode()).hexdigest()
+    
+    def __contains__(self, cache_key):
+        """Whether <cache_key> is cached, not counted as a lookup."""
+        return self.folder.joinpath(f"{cache_key}.npz").exists()
+    
+    def get(self, cache_key):
+        """
+        Returns the cached observable.
+        
+        Returns
+        -------
+        tuple (key dict, columns, data, columnar) or None
+            The storage key fields, the column names, the data
+            array and whether the observable was stored by column.
+            None if <cache_key> is not cached.
+        """
+        
+        cache_file = self.folder.joinpath(f"{cache_key}.npz")
+        
+        if cache_file.exists():
+            
+            try:
+                with np.load(cache_file) as cached:
+                    result = (
+                        json.loads(str(cached["key"])),
+                        [str(c) for c in cached["columns"]],
+                        cached["data"],
+                        bool(cached["columnar"]),
+                        )
+            
+            except (OSError, ValueError, KeyError) as e:
+                log.debug(e)
+                log.info(f"* corrupted results cache {cache_file}, removing")
+                cache_file.unlink()
+            
+            else:
+                os.utime(cache_file)
+                self.hits += 1
+                return result
+        
+        self.misses += 1
+        
+        return None
+    
+    def put(self, cache_key, key, columns, data, columnar=False):
+        """
+        Stores an observable and removes the least recently used
+        ones beyond the maximum size.
+        
+        Parameters
+        ----------
+        cache_key : str
+            From :meth:`gen_key`.
+        
+        key : StorageKey
+        
+        columns : list of str
+        
+        data : np.ndarray
+        
+        columnar : bool, optional
+            Whether the observable is stored by column.
+        """
+        
+        cache_file = self.folder.joinpath(f"{cache_key}.npz")
+        temp_file = cache_file.with_suffix(".tmp")
+        
+        with open(temp_file, "wb") as fh:
+            np.savez(
+                fh,
+                key=json.dumps(key._asdict()),
+                columns=np.array(columns),
+                data=data,
+                columnar=columnar,
+                )
+        
+        os.replace(temp_file, cache_file)
+        
+        log.debug(f"{key.datatype} cached in {cache_file}")
+        
+        self.evict()
+    
+    def evict(self):
+        """
+        Removes least recently used observables until the cache
+        fits its maximum size.
+        """
+        
+        entries = sorted(
+            self.folder.glob("*.npz"),
+            key=lambda f: f.stat().st_mtime_ns,
+            )
+        
+        sizes = [f.stat().st_size for f in entries]
+        total = sum(sizes)
+        
+        for entry, size in zip(entries, sizes):
+            
+            if total <= self.max_size:
+                break
+            
+            entry.unlink()
+            total -= size
+            log.debug(f"evicted {entry} from results cache")
+
+
+ignored_parameters = ("self", "chunk_size", "export_stream")
+"""Parameters of calc_* methods that do not change the result."""
+
+
+def unversioned(key):
+    """
+    Returns <key> as built by a calc_* method, before
+    :meth:`tauren.storage.TrajObservables.store` gave it a new version.
+    """
+    
+    if not key.version:
+        return key
+    
+    return key._replace(
+        filenaming=key.filenaming[:-len(f"_v{key.version}")],
+        version=0,
+        )
+
+
+def results_cache_key(taurentraj, calc_method, args, kwargs):
+    """
+    Returns the results cache key of a calc_* call, or None if
+    the call is not cached.
+    
+    Streamed calculations and trajectories not read from files
+    are not cached.
+    """
+    
+    results_cache = taurentraj.results_cache
+    
+    if results_cache is None \
+            or not taurentraj.input_files \
+            or kwargs.get("export_stream") is not None:
+        return None
+    
+    bound = inspect.signature(calc_method).bind(taurentraj, *args, **kwargs)
+    bound.apply_defaults()
+    
+    parameters = {
+        name: (
+            results_cache.file_hash(value)
+            if isinstance(value, str) and Path(value).is_file()
+            else value
+            )
+        for name, value in bound.arguments.items()
+        if name not in ignored_parameters
+        }
+    
+    return results_cache.gen_key(
+        taurentraj.input_files,
+        calculation=calc_method.__name__,
+        library=type(taurentraj).__name__,
+        transformations=taurentraj.transformations,
+        selection=taurentraj.atom_selection,
+        slice=taurentraj.slice_tuple,
+        parameters=parameters,
+        )
+
+
+def cached_calculation(calc_method):
+    """
+    Reads the observable of a calc_* method from the results cache,
+    or calculates and caches it, see
+    :meth:`tauren.tauren.TaurenTraj.set_results_cache`.
+    """
+    
+    @functools.wraps(calc_method)
+    def wrapper(self, *args, **kwargs):
+        
+        cache_key = results_cache_key(self, calc_method, args, kwargs)
+        
+        if cache_key is None:
+            return calc_method(self, *args, **kwargs)
+        
+        results_cache = self.results_cache
+        
+        cached = results_cache.get(cache_key)
+        
+        if cached is None:
+            
+            key = calc_method(self, *args, **kwargs)
+            observable = self.observables[key]
+            
+            # the version depends on the observables of this run
+            results_cache.put(
+                cache_key,
+                unversioned(key),
+                observable.columns,
+                observable.data,
+                columnar=isinstance(observable, storage.ColumnarData),
+                )
+            
+            return key
+        
+        key_fields, columns, data, columnar = cached
+        key_fields["chains"] = tuple(key_fields["chains"])
+        
+        if columnar:
+            
+            frames = data[:, 0].astype(np.int32)
+            if np.array_equal(frames, self.frames_index):
+                frames = self.frames_index
+            
+            observable = storage.ColumnarData(
+                frames,
+                columns[1:],
+                [np.ascontiguousarray(column) for column in data[:, 1:].T],
+                )
+        
+        else:
+            observable = storage.StorageData(columns=columns, data=data)
+        
+        log.info(f"* {key_fields['datatype']} read from results cache")
+        
+        return self.observables.store(
+            unversioned(storage.StorageKey(**key_fields)),
+            observable,
+            )
+    
+    return wrapper
@@ -0,0 +1,171 @@
+"""
+Numerical routines shared by Tauren-MD trajectory objects.
+"""
+# Copyright © 2018-2019 Tauren-MD Project
+#
+# Tauren-MD is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tauren-MD is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tauren-MD. If not, see <http://www.gnu.org/licenses/>.
+#
+# Contributors to this file:
+# - João M.C. Teixeira (https://github.com/joaomcteixeira)
+import numpy as np
+
+
+class RunningMeanVar:
+    """
+    Single pass, numerically stable mean and variance accumulator.
+    
+    Chunks of samples are merged with the pairwise update of
+    Chan et al., therefore, memory depends only on the shape
+    of a single sample and not on the number of samples.
+    
+    Parameters
+    ----------
+    shape : tuple
+        The shape of a single sample, for example, (n_atoms, 3).
+    """
+    
+    def __init__(self, shape):
+        
+        self.n = 0
+        self.mean = np.zeros(shape, dtype=np.float64)
+        self._m2 = np.zeros(shape, dtype=np.float64)
+    
+    def update(self, chunk):
+        """
+        Adds a chunk of samples.
+        
+        Parameters
+        ----------
+        chunk : np.ndarray, shape=(k, *shape)
+            Samples stacked in the first axis.
+        """
+        
+        chunk = np.asarray(chunk, dtype=np.float64)
+        n_b = chunk.shape[0]
+        
+        if n_b == 0:
+            return
+        
+        mean_b = chunk.mean(axis=0)
+        m2_b = ((chunk - mean_b) ** 2).sum(axis=0)
+        
+        n = self.n + n_b
+        delta = mean_b - self.mean
+        
+        self.mean += delta * (n_b / n)
+        self._m2 += m2_b + delta ** 2 * (self.n * n_b / n)
+        self.n = n
+        
+        return
+    
+    @property
+    def variance(self):
+        """The population variance of the samples added so far."""
+        
+        if self.n == 0:
+            raise ValueError("No samples were added.")
+        
+        return self._m2 / self.n
+
+
+def residue_boundaries(residue_indexes):
+    """
+    Returns the positions where each residue starts.
+    
+    Parameters
+    ----------
+    residue_indexes : np.ndarray, shape=(N,)
+        The residue index of each atom. Atoms of the same
+        residue must be contiguous.
+    
+    Returns
+    -------
+    np.ndarray of ints
+        Positions to use with ``np.ufunc.reduceat``.
+    """
+    
+    residue_indexes = np.asarray(residue_indexes)
+    
+    return np.concatenate((
+        [0],
+        np.flatnonzero(np.diff(residue_indexes)) + 1,
+        ))
+
+
+def residue_means(values, residue_indexes, axis=-1):
+    """
+    Averages per atom values over residues.
+    
+    Parameters
+    ----------
+    values : np.ndarray
+        Per atom values, atoms in <axis>.
+    
+    residue_indexes : np.ndarray, shape=(N,)
+        The residue index of each atom, see :func:`residue_boundaries`.
+    
+    axis : int, optional
+        The atoms axis in <values>. Defaults to -1.
+    
+    Returns
+    -------
+    np.ndarray
+        Same as values with <axis> reduced to the number of residues.
+    """
+    
+    starts = residue_boundaries(residue_indexes)
+    sizes = np.diff(np.append(starts, len(residue_indexes)))
+    
+    sums = np.add.reduceat(values, starts, axis=axis)
+    
+    shape = [1] * sums.ndim
+    shape[axis] = sizes.size
+    
+    return sums / sizes.reshape(shape)
+
+
+def superposed_rmsds(mobile, reference):
+    """
+    RMSDs of frames to a reference after optimal superposition.
+    
+    Frames are centred and rotated onto <reference> (Kabsch), all
+    frames of a chunk are solved at once.
+    
+    Parameters
+    ----------
+    mobile : np.ndarray, shape=(k, N, 3)
+        Coordinates of k frames.
+    
+    reference : np.ndarray, shape=(N, 3)
+        Reference coordinates, already centred.
+    
+    Returns
+    -------
+    np.ndarray, shape=(k,)
+    """
+    
+    mobile = np.asarray(mobile, dtype=np.float64)
+    mobile = mobile - mobile.mean(axis=1, keepdims=True)
+    
+    covariance = np.einsum("kni,nj->kij", mobile, reference)
+    u, s, vt = np.linalg.svd(covariance)
+    
+    # reflections are not proper rotations
+    s[:, 2] *= np.sign(np.linalg.det(u @ vt))
+    
+    e0 = (mobile ** 2).sum(axis=(1, 2)) + (reference ** 2).sum()
+    
+    squared = np.maximum(e0 - 2 * s.sum(axis=1), 0) / reference.shape[0]
+    
+    return np.sqrt(squared)
@@ -0,0 +1,190 @@
+"""
+Checkpoints of Tauren-MD runs.
+
+After each action of a run the Tauren trajectory, with its
+transformations and observables, is saved to disk. A resumed run
+restores the last checkpoint whose actions did not change and
+continues from the next action.
+
+Each action is identified by a digest chained from the input files,
+the trajectory type and all the actions, with their arguments, up to
+and including it; changing an action invalidates the checkpoints of
+it and of all actions after it.
+"""
+# Copyright © 2018-2019 Tauren-MD Project
+#
+# Tauren-MD is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tauren-MD is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tauren-MD. If not, see <http://www.gnu.org/licenses/>.
+#
+# Contributors to this file:
+# - João M.C. Teixeira (https://github.com/joaomcteixeira)
+import hashlib
+import json
+import os
+import pickle
+import re
+from pathlib import Path
+
+from tauren import logger
+
+log = logger.get_log(__name__)
+
+_checkpoint_name = re.compile(r"(\d{4,})_([0-9a-f]{64})")
+
+
+def chain_digests(input_files, traj_type, actions):
+    """
+    Returns the digest of each action of a run.
+    
+    Input files are identified by path, size and modification time.
+    
+    Parameters
+    ----------
+    input_files : list of str
+        The trajectory and topology files.
+    
+    traj_type : str
+    
+    actions : list of (str, dict)
+        The actions and their arguments, in running order.
+    
+    Returns
+    -------
+    list of str
+        One hex digest per action.
+    """
+    
+    sha = hashlib.sha256(traj_type.encode())
+    
+    for file_ in input_files:
+        path = Path(file_).resolve()
+        stat = path.stat()
+        sha.update(f"\0{path}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    
+    digests = []
+    for action, arguments in actions:
+        sha.update(b"\0")
+        sha.update(action.encode())
+        sha.update(json.dumps(arguments, sort_keys=True, default=str).encode())
+        digests.append(sha.copy().hexdigest())
+    
+    return digests
+
+
+class Checkpoints:
+    """
+    Saves and restores checkpoints of a run.
+    
+    Checkpoints are files ``<action index>_<digest>.pkl`` in <folder>,
+    other files in <folder> are ignored.
+    
+    Parameters
+    ----------
+    folder : str or Path
+        Created with the first checkpoint saved.
+    
+    keep : int, optional
+        Number of checkpoints kept, the oldest are removed.
+        Defaults to 2, enough to resume after changing the
+        last action of a completed run.
+    """
+    
+    def __init__(self, folder, keep=2):
+        
+        if not isinstance(keep, int) or keep < 1:
+            raise ValueError(f"keep should be a positive integer: '{keep}'")
+        
+        self.folder = Path(folder)
+        self.keep = keep
+    
+    def _checkpoints(self):
+        """Returns {action index: (digest, file)} of the checkpoints."""
+        
+        checkpoints = {}
+        for file_ in self.folder.glob("*_*.pkl"):
+            
+            match = _checkpoint_name.fullmatch(file_.stem)
+            
+            if match is not None:
+                checkpoints[int(match.group(1))] = (match.group(2), file_)
+        
+        return checkpoints
+    
+    def save(self, index, digests, taurentraj):
+        """
+        Saves the state after action <index>.
+        
+        Removes checkpoints not matching <digests> and the oldest
+        beyond :attr:`keep`.
+        
+        Parameters
+        ----------
+        index : int
+            Position of the action in the run.
+        
+        digests : list of str
+            From :func:`chain_digests`.
+        
+        taurentraj : :class:`tauren.tauren.TaurenTraj`
+        """
+        
+        self.folder.mkdir(parents=True, exist_ok=True)
+        
+        file_ = self.folder.joinpath(f"{index:04d}_{digests[index]}.pkl")
+        temp_file = file_.with_suffix(".tmp")
+        
+        with open(temp_file, "wb") as fh:
+            pickle.dump(taurentraj, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        
+        os.replace(temp_file, file_)
+        
+        log.debug(f"checkpoint saved {file_}")
+        
+        valid = sorted(
+            i for i, (digest, _) in self._checkpoints().items()
+            if i <= index and digests[i] == digest
+            )[-self.keep:]
+        
+        for i, (_, old_file) in self._checkpoints().items():
+            if i not in valid:
+                old_file.unlink()
+    
+    def restore(self, digests):
+        """
+        Restores the last checkpoint matching <digests>.
+        
+        Returns
+        -------
+        tuple (int, :class:`tauren.tauren.TaurenTraj`) or None
+            The index of the checkpointed action and the Tauren
+            trajectory after it. None if no checkpoint matches.
+        """
+        
+        matching = [
+            (i, file_)
+            for i, (digest, file_) in self._checkpoints().items()
+            if i < len(digests) and digests[i] == digest
+            ]
+        
+        if not matching:
+            log.info(f"* No valid checkpoint in {self.folder}")
+            return None
+        
+        index, file_ = max(matching)
+        
+        with open(file_, "rb") as fh:
+            taurentraj = pickle.load(fh)
+        
+        log.info(f"* Resuming from checkpoint {file_}")
+        
+        return index, taurentraj
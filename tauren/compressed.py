@@ -0,0 +1,428 @@
+"""
+Tauren-MD compressed trajectory format (.tcz).
+
+Coordinates are quantised to a user defined precision, delta encoded
+along frames and entropy coded with zlib, in independent chunks of
+frames. An index at the end of the file gives random access to any
+chunk, so reading a frame decompresses a single chunk.
+
+File layout::
+    
+    MAGIC, header length (uint32), header (JSON)
+    chunk 0 payload
+    chunk 1 payload
+    ...
+    index (JSON), index offset (uint64)
+
+Each chunk payload is the zlib compressed concatenation of:
+the frame numbers (int64), the boxes (float32, frames x 6), the
+first frame quantised coordinates (int32, atoms x 3) and the frame
+to frame differences of the quantised coordinates (the smallest
+signed integer type that fits). Integer arrays are byte shuffled
+before compression.
+"""
+# Copyright © 2018-2019 Tauren-MD Project
+#
+# Tauren-MD is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tauren-MD is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tauren-MD. If not, see <http://www.gnu.org/licenses/>.
+#
+# Contributors to this file:
+# - João M.C. Teixeira (https://github.com/joaomcteixeira)
+import json
+import struct
+import zlib
+
+import numpy as np
+
+from tauren import logger
+
+log = logger.get_log(__name__)
+
+ext = ".tcz"
+"""File extension of compressed trajectories."""
+
+MAGIC = b"TAURENCZ"
+VERSION = 1
+
+_delta_dtypes = (np.int8, np.int16, np.int32)
+
+
+def _shuffle(array):
+    """Groups the bytes of an integer array by significance."""
+    return array.view(np.uint8).reshape(-1, array.itemsize).T.tobytes()
+
+
+def _unshuffle(data, dtype, count):
+    """Reverts :func:`_shuffle`."""
+    itemsize = np.dtype(dtype).itemsize
+    shuffled = np.frombuffer(data, dtype=np.uint8).reshape(itemsize, count)
+    return np.ascontiguousarray(shuffled.T).view(dtype).ravel()
+
+
+def _smallest_dtype(array):
+    """Returns the smallest signed integer type holding <array>."""
+    
+    if array.size == 0:
+        return np.int8
+    
+    low, high = array.min(), array.max()
+    
+    for dtype in _delta_dtypes:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return dtype
+    
+    raise ValueError(
+        "Frame to frame displacements do not fit 32 bit integers, "
+        "use a larger precision value."
+        )
+
+
+class CompressedTrajWriter:
+    """
+    Writes compressed trajectories.
+    
+    Use as a context manager, the index is written on close.
+    
+    Parameters
+    ----------
+    file_name : str
+    
+    n_atoms : int
+    
+    precision : float, optional
+        Quantisation step of coordinates, in Angstroms.
+        Defaults to 0.01 (0.001 nm).
+    
+    chunk_size : int, optional
+        Number of frames per chunk, the unit of random access.
+        Defaults to 100.
+    
+    level : int, optional
+        zlib compression level. Defaults to 6.
+    """
+    
+    def __init__(
+            self,
+            file_name,
+            n_atoms,
+            *,
+            precision=0.01,
+            chunk_size=100,
+            level=6,
+            ):
+        
+        if precision <= 0:
+            raise ValueError(f"precision should be positive: '{precision}'")
+        
+        if not isinstance(chunk_size, int) or chunk_size < 1:
+            raise ValueError(
+                f"chunk_size should be a positive integer: '{chunk_size}'"
+                )
+        
+        self.file_name = file_name
+        self.n_atoms = n_atoms
+        self.precision = precision
+        self.chunk_size = chunk_size
+        self.level = level
+        
+        self._index = []
+        self._frames = []
+        self._coordinates = []
+        self._boxes = []
+        
+        self._fh = open(file_name, "wb")
+        
+        header = json.dumps({
+            "version": VERSION,
+            "n_atoms": n_atoms,
+            "precision": precision,
+            "chunk_size": chunk_size,
+            }).encode()
+        
+        self._fh.write(MAGIC)
+        self._fh.write(struct.pack("<I", len(header)))
+        self._fh.write(header)
+    
+    def write(self, coordinates, box=None, frame=None):
+        """
+        Adds a frame.
+        
+        Parameters
+        ----------
+        coordinates : np.ndarray, shape=(n_atoms, 3)
+            In Angstroms.
+        
+        box : sequence of 6 floats, optional
+            Unit cell lengths (Angstroms) and angles (degrees).
+        
+        frame : int, optional
+            The frame number to store, defaults to the frame
+            count starting at 1.
+        """
+        
+        coordinates = np.asarray(coordinates)
+        
+        if coordinates.shape != (self.n_atoms, 3):
+            raise ValueError(
+                f"coordinates should have shape ({self.n_atoms}, 3): "
+                f"{coordinates.shape} given."
+                )
+        
+        if frame is None:
+            frame = self.n_frames + 1
+        
+        self._frames.append(frame)
+        self._coordinates.append(
+            np.rint(coordinates / self.precision).astype(np.int64)
+            )
+        self._boxes.append(
+            np.full(6, np.nan) if box is None else np.array(box, dtype=float)
+            )
+        
+        if len(self._frames) == self.chunk_size:
+            self._flush_chunk()
+    
+    @property
+    def n_frames(self):
+        """Number of frames written so far."""
+        return sum(c["n_frames"] for c in self._index) + len(self._frames)
+    
+    def _flush_chunk(self):
+        
+        if not self._frames:
+            return
+        
+        quantised = np.stack(self._coordinates)
+        first = quantised[0]
+        
+        if np.abs(first).max(initial=0) > np.iinfo(np.int32).max:
+            raise ValueError(
+                "Coordinates do not fit 32 bit integers, "
+                "use a larger precision value."
+                )
+        
+        deltas = np.diff(quantised, axis=0)
+        delta_dtype = np.dtype(_smallest_dtype(deltas)).newbyteorder("<")
+        
+        payload = b"".join((
+            np.asarray(self._frames, dtype="<i8").tobytes(),
+            np.asarray(self._boxes, dtype="<f4").tobytes(),
+            _shuffle(first.astype("<i4")),
+            _shuffle(deltas.astype(delta_dtype)),
+            ))
+        
+        compressed = zlib.compress(payload, self.level)
+        
+        self._index.append({
+            "offset": self._fh.tell(),
+            "length": len(compressed),
+            "n_frames": len(self._frames),
+            "delta_dtype": delta_dtype.str,
+            })
+        
+        self._fh.write(compressed)
+        
+        self._frames = []
+        self._coordinates = []
+        self._boxes = []
+    
+    def close(self):
+        """Writes the last chunk and the index."""
+        
+        self._flush_chunk()
+        
+        index_offset = self._fh.tell()
+        self._fh.write(json.dumps({"chunks": self._index}).encode())
+        self._fh.write(struct.pack("<Q", index_offset))
+        self._fh.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *args):
+        self.close()
+
+
+class CompressedTrajReader:
+    """
+    Reads compressed trajectories with random access.
+    
+    Indexing with an int returns the coordinates of a frame,
+    indexing with a slice or a list of ints returns a
+    (frames, atoms, 3) array. Only the chunks holding the requested
+    frames are decompressed; the last chunk read is kept in memory.
+    
+    Coordinates are float32 in Angstroms.
+    
+    Parameters
+    ----------
+    file_name : str
+    """
+    
+    def __init__(self, file_name):
+        
+        self.file_name = file_name
+        self._fh = open(file_name, "rb")
+        
+        if self._fh.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"'{file_name}' is not a Tauren-MD .tcz file.")
+        
+        header_length = struct.unpack("<I", self._fh.read(4))[0]
+        header = json.loads(self._fh.read(header_length))
+        
+        self.n_atoms = header["n_atoms"]
+        self.precision = header["precision"]
+        self.chunk_size = header["chunk_size"]
+        
+        self._fh.seek(-8, 2)
+        index_end = self._fh.tell()
+        index_offset = struct.unpack("<Q", self._fh.read(8))[0]
+        self._fh.seek(index_offset)
+        self._chunks = json.loads(
+            self._fh.read(index_end - index_offset)
+            )["chunks"]
+        
+        # position of the first frame of each chunk
+        self._starts = np.cumsum(
+            [0] + [c["n_frames"] for c in self._chunks]
+            )
+        
+        self._cached = (None, None)
+    
+    def __len__(self):
+        return int(self._starts[-1])
+    
+    @property
+    def n_frames(self):
+        return len(self)
+    
+    def read_chunk(self, chunk_index):
+        """
+        Returns (frames, coordinates, boxes) of a chunk.
+        
+        Boxes are NaN for frames written without box.
+        """
+        
+        if self._cached[0] == chunk_index:
+            return self._cached[1]
+        
+        chunk = self._chunks[chunk_index]
+        
+        self._fh.seek(chunk["offset"])
+        payload = zlib.decompress(self._fh.read(chunk["length"]))
+        
+        n_frames = chunk["n_frames"]
+        n_values = self.n_atoms * 3
+        delta_dtype = np.dtype(chunk["delta_dtype"])
+        
+        pos = 0
+        frames = np.frombuffer(payload, dtype="<i8", count=n_frames)
+        pos += frames.nbytes
+        
+        boxes = np.frombuffer(
+            payload,
+            dtype="<f4",
+            count=n_frames * 6,
+            offset=pos,
+            ).reshape(n_frames, 6)
+        pos += boxes.nbytes
+        
+        first = _unshuffle(payload[pos:pos + n_values * 4], "<i4", n_values)
+        pos += n_values * 4
+        
+        deltas = _unshuffle(
+            payload[pos:],
+            delta_dtype,
+            (n_frames - 1) * n_values,
+            ).reshape(n_frames - 1, n_values)
+        
+        quantised = np.empty((n_frames, n_values), dtype=np.int64)
+        quantised[0] = first
+        np.cumsum(deltas, axis=0, out=quantised[1:])
+        quantised[1:] += first
+        
+        coordinates = (quantised * self.precision).astype(np.float32)
+        
+        result = (
+            frames,
+            coordinates.reshape(n_frames, self.n_atoms, 3),
+            boxes,
+            )
+        
+        self._cached = (chunk_index, result)
+        
+        return result
+    
+    def iter_chunks(self):
+        """Yields :meth:`read_chunk` for every chunk, in order."""
+        for chunk_index in range(len(self._chunks)):
+            yield self.read_chunk(chunk_index)
+    
+    def read(self, indexes=None):
+        """
+        Returns (frames, coordinates, boxes) for frame positions.
+        
+        Parameters
+        ----------
+        indexes : list of ints, optional
+            Positions of the frames in the file, indexed at 0.
+            Defaults to None, all frames.
+        """
+        
+        if indexes is None:
+            indexes = np.arange(len(self))
+        
+        indexes = np.asarray(indexes, dtype=np.int64)
+        indexes[indexes < 0] += len(self)
+        
+        if np.any((indexes < 0) | (indexes >= len(self))):
+            raise IndexError("frame index out of range")
+        
+        chunk_of = np.searchsorted(self._starts, indexes, side="right") - 1
+        
+        frames = np.empty(indexes.size, dtype=np.int64)
+        coordinates = np.empty((indexes.size, self.n_atoms, 3), np.float32)
+        boxes = np.empty((indexes.size, 6), dtype=np.float32)
+        
+        for chunk_index in np.unique(chunk_of):
+            
+            where = np.flatnonzero(chunk_of == chunk_index)
+            local = indexes[where] - self._starts[chunk_index]
+            
+            c_frames, c_coordinates, c_boxes = self.read_chunk(chunk_index)
+            
+            frames[where] = c_frames[local]
+            coordinates[where] = c_coordinates[local]
+            boxes[where] = c_boxes[local]
+        
+        return frames, coordinates, boxes
+    
+    def __getitem__(self, item):
+        
+        if isinstance(item, (int, np.integer)):
+            return self.read([item])[1][0]
+        
+        if isinstance(item, slice):
+            item = range(len(self))[item]
+        
+        return self.read(list(item))[1]
+    
+    def close(self):
+        self._fh.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *args):
+        self.close()
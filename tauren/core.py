@@ -1,8 +1,13 @@
 """
 Variables and functions that serve system-wide.
 """
+from pathlib import Path
+
 trajectory_types = (".xtc", ".nc", ".trr", ".h5", ".pdb", ".binpos", ".dcd")
 """Types os trajectories accepted."""
 
 topology_types = (".pdb", ".cif")
 """Types of topologies accepted."""
+
+cache_folder = Path.home().joinpath(".taurenmd_cache")
+"""Folder where Tauren-MD keeps persistent caches between runs."""
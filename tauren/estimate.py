@@ -0,0 +1,543 @@
+"""
+Estimates the cost of a Tauren-MD run without running it.
+
+Only the trajectory header and the topology are read; XTC and TRR
+files have no frame count in their header, their frame headers are
+read through the whole file. The actions are walked in plan order,
+following how each changes the frames and atoms processed after it.
+For each action the estimate gives:
+- the coordinate bytes it touches;
+- the time to touch them at a given throughput;
+- the peak resident memory while it runs;
+- the size of its output files.
+
+Estimates assume float32 coordinates. Text and compressed output
+sizes use typical bytes per atom, and plots are not counted.
+"""
+# Copyright © 2018-2019 Tauren-MD Project
+#
+# Tauren-MD is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tauren-MD is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tauren-MD. If not, see <http://www.gnu.org/licenses/>.
+#
+# Contributors to this file:
+# - João M.C. Teixeira (https://github.com/joaomcteixeira)
+import json
+import os
+from collections import namedtuple
+
+import mdtraj as md
+import MDAnalysis as mda
+from mdtraj.core.residue_names import _SOLVENT_TYPES
+
+from tauren import compressed
+from tauren import logger
+from tauren import memory
+from tauren import plan
+from tauren import tables
+from tauren import tauren
+
+log = logger.get_log(__name__)
+
+coordinate_bytes = memory.coordinate_bytes
+
+# topology and library bookkeeping per atom
+_topology_bytes_per_atom = 200
+
+# output bytes per atom per frame
+_output_bytes_per_atom = {
+    "dcd": 12,
+    "trr": 12,
+    "nc": 12,
+    "h5": 12,
+    "binpos": 12,
+    "xtc": 4,
+    "tcz": 3,
+    "pdb": 81,
+    "gro": 44,
+    "xyz": 40,
+    }
+
+# bytes per second actions touch coordinates, see estimate_actions
+default_throughput = "200MB"
+
+# bytes per value of exported tables
+_table_value_bytes = {
+    "csv": 25,
+    "tsv": 25,
+    "npy": 8,
+    "npz": 8,
+    "parquet": 8,
+    "feather": 8,
+    }
+
+
+ActionEstimate = namedtuple(
+    "ActionEstimate",
+    [
+        "action",
+        "frames",
+        "atoms",
+        "read_bytes",
+        "seconds",
+        "peak_memory",
+        "output_bytes",
+        ],
+    )
+ActionEstimate.__doc__ = """
+Estimated cost of an action.
+
+read_bytes and seconds are None for actions sharing the frame pass
+of a previous action.
+"""
+
+
+class TrajHeader:
+    """
+    Frames and atoms of a trajectory, read from its header and
+    topology only.
+    
+    Selections are evaluated with the library of <traj_type>.
+    
+    Parameters
+    ----------
+    traj_file : str
+    
+    topo_file : str
+    
+    traj_type : {"mdtraj", "mdanalysis"}
+    """
+    
+    def __init__(self, traj_file, topo_file, traj_type):
+        
+        self.traj_type = traj_type
+        
+        if traj_type == "mdanalysis":
+            self._universe = mda.Universe(topo_file)
+            atoms = self._universe.atoms
+            self.n_atoms = len(atoms)
+            self.n_residues = atoms.n_residues
+            self.n_chains = len(set(atoms.chainIDs))
+            self._solvent = None
+        
+        else:
+            self._topology = md.load_topology(topo_file)
+            self.n_atoms = self._topology.n_atoms
+            self.n_residues = self._topology.n_residues
+            self.n_chains = self._topology.n_chains
+            self._solvent = [
+                a.residue.name for a in self._topology.atoms
+                if a.residue.name in _SOLVENT_TYPES
+                ]
+        
+        self.n_frames = self._read_n_frames(traj_file, topo_file)
+    
+    def _read_n_frames(self, traj_file, topo_file):
+        """
+        MDTraj reads the frame count of DCD, NetCDF and HDF5 headers,
+        and seeks XTC and TRR frame headers without writing the
+        offset files MDAnalysis writes next to the trajectory.
+        """
+        
+        if traj_file.endswith(".json"):
+            with open(traj_file, "r") as fh:
+                parts = json.load(fh)["parts"]
+            return sum(part["n_frames"] for part in parts)
+        
+        if traj_file.endswith(compressed.ext):
+            with compressed.CompressedTrajReader(traj_file) as reader:
+                return reader.n_frames
+        
+        try:
+            with md.open(traj_file) as fh:
+                return len(fh)
+        
+        except OSError as e:
+            # formats MDTraj does not read
+            log.debug(e)
+        
+        return mda.Universe(topo_file, traj_file).trajectory.n_frames
+    
+    def count_selection(self, selection):
+        """
+        Returns the number of atoms in <selection>,
+        None if the selection can not be evaluated.
+        """
+        
+        try:
+            if self.traj_type == "mdanalysis":
+                return self._universe.select_atoms(selection).n_atoms
+            
+            return len(self._topology.select(selection))
+        
+        except Exception as e:
+            log.debug(f"could not evaluate selection '{selection}': {e}")
+            return None
+    
+    def count_solvent(self, exclude=None):
+        """
+        Returns the number of solvent atoms remove_solvent removes,
+        0 for libraries where it is not implemented.
+        """
+        
+        if self._solvent is None:
+            return 0
+        
+        exclude = exclude or []
+        
+        return sum(1 for name in self._solvent if name not in exclude)
+
+
+class _RunState:
+    """The frames and atoms actions process, as the run goes."""
+    
+    def __init__(self, header, budget=None):
+        
+        self.header = header
+        self.budget = budget
+        self.n_total = header.n_frames
+        self.n_atoms = header.n_atoms
+        self.slicing = (0, None, 1)
+        self.selection = "all"
+        self.observable_values = 0
+    
+    @property
+    def n_frames(self):
+        """Frames in the current slicing."""
+        start, end, step = self.slicing
+        return len(range(self.n_total)[start:end:step])
+    
+    @property
+    def n_selected(self):
+        """Atoms in the current selection."""
+        
+        if self.selection == "all":
+            return self.n_atoms
+        
+        count = self.header.count_selection(self.selection)
+        
+        return self.n_atoms if count is None else min(count, self.n_atoms)
+    
+    @property
+    def resident(self):
+        """Memory of the loaded trajectory and observables."""
+        
+        memory = self.n_atoms * _topology_bytes_per_atom
+        memory += self.observable_values * 8
+        
+        # MDTraj holds all coordinates in memory
+        if self.header.traj_type == "mdtraj":
+            memory += self.n_total * self.n_atoms * coordinate_bytes
+        
+        return memory
+    
+    def working_set(self, chunk_size=None):
+        """
+        Memory of the coordinates an action holds at once.
+        
+        Without <chunk_size>, the chunk size of the memory budget,
+        see :meth:`tauren.tauren.TaurenTraj.set_memory_budget`.
+        """
+        
+        if self.header.traj_type == "mdtraj":
+            # the selected atoms of all frames are copied
+            return self.n_total * self.n_selected * coordinate_bytes
+        
+        frame_bytes = self.n_selected * coordinate_bytes
+        
+        if self.budget is not None:
+            fitting = self.budget.chunk_frames(frame_bytes, self.resident)
+            chunk_size = min(chunk_size or fitting, fitting)
+        
+        elif chunk_size is None:
+            chunk_size = memory.default_chunk_size
+        
+        return min(chunk_size, self.n_frames) * frame_bytes
+
+
+def _count_frames(frames, state):
+    """Number of frames a frames2file call extracts."""
+    
+    if frames == "all":
+        return state.n_frames
+    
+    return len(tauren._frames_from_string(frames, state.n_total))
+
+
+def _table_bytes(export_data, rows, columns):
+    """Size of an exported table, 0 if not exported."""
+    
+    if not export_data:
+        return 0
+    
+    table_format = export_data.get("format") or "csv"
+    
+    return rows * columns * _table_value_bytes.get(table_format, 25)
+
+
+def _frame_slice(state, start=None, end=None, step=None, **kwargs):
+    state.slicing = ((start or 1) - 1, end, step or 1)
+    return 0, 0
+
+
+def _atom_selection(state, selector="all", **kwargs):
+    state.selection = selector or "all"
+    return 0, 0
+
+
+def _remove_solvent(state, exclude=None, **kwargs):
+    
+    if state.header.traj_type != "mdtraj":
+        return 0, 0
+    
+    touched = state.n_frames * state.n_selected * coordinate_bytes
+    
+    # MDTraj replaces the trajectory with the current view
+    solvent = state.header.count_solvent(exclude)
+    state.n_atoms = max(state.n_selected - solvent, 0)
+    state.n_total = state.n_frames
+    
+    return touched, 0
+
+
+def _transform(state, **kwargs):
+    return state.n_frames * state.n_selected * coordinate_bytes, 0
+
+
+def _frames2file(state, frames="all", ext="pdb", output="files", **kwargs):
+    
+    n_frames = _count_frames(frames, state)
+    
+    if output == "multimodel":
+        ext = "pdb"
+    
+    touched = n_frames * state.n_selected * coordinate_bytes
+    written = n_frames * state.n_selected \
+        * _output_bytes_per_atom.get(ext.lower(), 81)
+    
+    return touched, written
+
+
+def _save_traj(state, file_name="traj_output.dcd", **kwargs):
+    
+    ext = os.path.splitext(file_name)[1].lstrip(".").lower()
+    
+    touched = state.n_frames * state.n_selected * coordinate_bytes
+    written = state.n_frames * state.n_selected \
+        * _output_bytes_per_atom.get(ext, coordinate_bytes)
+    
+    return touched, written
+
+
+def _produce(columns):
+    """
+    Returns the estimator of a produce action whose observable has
+    ``columns(state, calc arguments)`` columns, frames column included.
+    """
+    
+    def estimator(state, export_data=False, **kwargs):
+        
+        calc_arguments = next(
+            (v for k, v in kwargs.items() if k.startswith("calc_")),
+            {},
+            )
+        
+        rows, n_columns = columns(state, calc_arguments)
+        state.observable_values += rows * n_columns
+        
+        return (
+            state.n_frames * state.n_selected * coordinate_bytes,
+            _table_bytes(export_data, rows, n_columns),
+            )
+    
+    return estimator
+
+
+def _n_chains(state, chains):
+    if chains == "all":
+        return state.header.n_chains
+    return len(str(chains).split(","))
+
+
+def _rmsds_combined_columns(state, arguments):
+    ref_frame = arguments.get("ref_frame", 0)
+    n_refs = len(ref_frame) if isinstance(ref_frame, list) else 1
+    return state.n_frames, 1 + n_refs
+
+
+def _rmsds_separated_columns(state, arguments):
+    return state.n_frames, 1 + _n_chains(state, arguments.get("chains"))
+
+
+def _rmsf_columns(state, arguments):
+    if arguments.get("per_residue"):
+        return state.header.n_residues, 2
+    return state.n_selected, 2
+
+
+def _rmsds_per_residue_columns(state, arguments):
+    return state.n_frames, 1 + state.header.n_residues
+
+
+def _export_observables(state, **kwargs):
+    return 0, _table_bytes(kwargs, state.observable_values, 1)
+
+
+_estimators = {
+    "frame_slice": _frame_slice,
+    "atom_selection": _atom_selection,
+    "remove_solvent": _remove_solvent,
+    "align_traj": _transform,
+    "try_image_molecules": _transform,
+    "frames2file": _frames2file,
+    "save_traj": _save_traj,
+    "produce_rmsds_combined_chains": _produce(_rmsds_combined_columns),
+    "produce_rmsds_separated_chains": _produce(_rmsds_separated_columns),
+    "produce_rmsf": _produce(_rmsf_columns),
+    "produce_rmsds_per_residue": _produce(_rmsds_per_residue_columns),
+    "export_observables": _export_observables,
+    }
+
+
+def estimate_actions(
+        traj_file,
+        topo_file,
+        traj_type,
+        actions,
+        fuse=True,
+        max_memory=None,
+        throughput=None,
+        ):
+    """
+    Estimates the cost of each action of a run.
+    
+    Parameters
+    ----------
+    traj_file : str
+    
+    topo_file : str
+    
+    traj_type : {"mdtraj", "mdanalysis"}
+    
+    actions : list of (str, dict)
+        The actions and their arguments, in running order.
+    
+    fuse : bool, optional
+        Whether actions reading frames share frame passes,
+        see :func:`tauren.plan.compile_plan`.
+    
+    max_memory : int, float or str, optional
+        The memory budget chunk sizes are derived from, see
+        :func:`tauren.memory.parse_size`. Defaults to None, the
+        default chunk sizes.
+    
+    throughput : int, float or str, optional
+        Bytes per second actions touch coordinates, megabytes or a
+        size with a unit, see :func:`tauren.memory.parse_size`.
+        Defaults to :data:`default_throughput`.
+    
+    Returns
+    -------
+    list of :class:`ActionEstimate`
+    """
+    
+    throughput = memory.parse_size(throughput or default_throughput)
+    
+    header = TrajHeader(traj_file, topo_file, traj_type)
+    state = _RunState(
+        header,
+        budget=memory.MemoryBudget(max_memory) if max_memory else None,
+        )
+    
+    log.info(
+        f"* Estimating from {header.n_frames} frames "
+        f"and {header.n_atoms} atoms"
+        )
+    
+    estimates = []
+    
+    for step in plan.compile_plan(actions, fuse=fuse):
+        
+        for position, action in enumerate(step.actions):
+            
+            estimator = _estimators.get(action.name, lambda s, **k: (0, 0))
+            
+            working_set = state.working_set(
+                action.arguments.get("chunk_size"),
+                )
+            
+            touched, written = estimator(state, **action.arguments)
+            
+            # the frame pass is held while all its actions run
+            if step.fused:
+                touched = None if position > 0 else touched
+            
+            elif not touched:
+                working_set = 0
+            
+            estimates.append(ActionEstimate(
+                action.name,
+                state.n_frames,
+                state.n_selected,
+                touched,
+                None if touched is None else touched / throughput,
+                state.resident + working_set,
+                written,
+                ))
+    
+    return estimates
+
+
+def format_table(estimates):
+    """
+    Returns the estimates as a text table with a totals row.
+    
+    Actions sharing a frame pass show '-' in the read and time
+    columns.
+    """
+    
+    header = (
+        "action",
+        "frames",
+        "atoms",
+        "read",
+        "time s",
+        "peak memory",
+        "output",
+        )
+    
+    rows = [
+        (
+            e.action,
+            str(e.frames),
+            str(e.atoms),
+            memory.human_bytes(e.read_bytes),
+            "-" if e.seconds is None else f"{e.seconds:.1f}",
+            memory.human_bytes(e.peak_memory),
+            memory.human_bytes(e.output_bytes),
+            )
+        for e in estimates
+        ]
+    
+    rows.append((
+        "total",
+        "",
+        "",
+        memory.human_bytes(sum(e.read_bytes or 0 for e in estimates)),
+        f"{sum(e.seconds or 0 for e in estimates):.1f}",
+        memory.human_bytes(
+            max((e.peak_memory for e in estimates), default=0),
+            ),
+        memory.human_bytes(sum(e.output_bytes for e in estimates)),
+        ))
+    
+    return tables.format_text_table(header, rows)
@@ -0,0 +1,517 @@
+"""
+Single pass over trajectory frames shared by several actions.
+
+Actions that only read frames (RMSDs, frame extraction, saving the
+trajectory) are turned into consumers. The pass reads each chunk of
+frames of the current slicing once, for the union of the atoms the
+consumers need, and hands the chunk to every consumer.
+
+RMSDs calculated in a pass are kept by the Tauren trajectory until
+the corresponding calc_rmsds_* call stores them as observables.
+"""
+# Copyright © 2018-2019 Tauren-MD Project
+#
+# Tauren-MD is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tauren-MD is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tauren-MD. If not, see <http://www.gnu.org/licenses/>.
+#
+# Contributors to this file:
+# - João M.C. Teixeira (https://github.com/joaomcteixeira)
+import numpy as np
+
+from tauren import calc
+from tauren import compressed
+from tauren import logger
+from tauren import memory
+from tauren import parallel
+from tauren import writers
+
+log = logger.get_log(__name__)
+
+
+class FrameConsumer:
+    """
+    Base class of the consumers of a frame pass.
+    
+    Attributes
+    ----------
+    atom_indexes : np.ndarray
+        Sorted topology indexes of the atoms the consumer reads.
+    
+    frames : np.ndarray or None
+        Sorted frames (indexed at 1) the consumer reads,
+        None for all frames of the current slicing.
+    
+    pass_key : tuple or None
+        Key of the results left in the Tauren trajectory, see
+        :meth:`tauren.tauren.TaurenTraj._pass_key`.
+    """
+    
+    atom_indexes = None
+    frames = None
+    pass_key = None
+    
+    def consume(self, frames, coordinates, boxes, times):
+        """
+        Receives a chunk of frames, see
+        :meth:`tauren.tauren.TaurenTraj._read_frames`.
+        """
+        raise NotImplementedError
+    
+    def close(self):
+        """Called once after the last chunk."""
+        pass
+
+
+class RMSDConsumer(FrameConsumer):
+    """
+    Calculates the RMSDs of a calc_rmsds_* call.
+    
+    Parameters
+    ----------
+    taurentraj : :class:`tauren.tauren.TaurenTraj`
+    
+    calculation : str ["rmsds_combined_chains", "rmsds_separated_chains"]
+    
+    chains : str
+    
+    ref_frame : int or list of ints
+    
+    Attributes
+    ----------
+    headers : list
+        The chain header of each group of RMSD columns, None for
+        combined chains.
+    """
+    
+    def __init__(self, taurentraj, calculation, chains, ref_frame):
+        
+        chain_list = taurentraj._gen_chain_list(chains)
+        
+        self._separated = calculation == "rmsds_separated_chains"
+        self._many_refs = isinstance(ref_frame, list)
+        
+        groups = taurentraj._rmsd_groups(chain_list, self._separated)
+        
+        self.headers = [header for header, _ in groups]
+        
+        self.atom_indexes = np.unique(
+            np.concatenate([atoms for _, atoms in groups])
+            )
+        
+        self._positions = [
+            np.searchsorted(self.atom_indexes, atoms)
+            for _, atoms in groups
+            ]
+        
+        self._references = [
+            taurentraj._read_references(ref_frame, atoms)
+            for _, atoms in groups
+            ]
+        
+        self._n_columns = \
+            sum(len(references) for references in self._references)
+        self._chunks = []
+        
+        self._taurentraj = taurentraj
+        self.pass_key = \
+            taurentraj._pass_key(calculation, chain_list, ref_frame)
+    
+    def calc(self, coordinates):
+        """
+        Returns the RMSDs of a chunk of frames, shape=(k, columns),
+        in the length unit of the MD library.
+        
+        Parameters
+        ----------
+        coordinates : np.ndarray, shape=(k, N, 3)
+            Of the atoms in :attr:`atom_indexes`, in Angstroms.
+        """
+        
+        rmsds = np.empty((len(coordinates), self._n_columns))
+        
+        column = 0
+        for positions, references in zip(self._positions, self._references):
+            
+            mobile = coordinates[:, positions]
+            
+            for reference in references:
+                rmsds[:, column] = calc.superposed_rmsds(mobile, reference)
+                column += 1
+        
+        return rmsds / self._taurentraj._length_unit
+    
+    def consume(self, frames, coordinates, boxes, times):
+        self._chunks.append(self.calc(coordinates))
+    
+    def close(self):
+        
+        rmsds = np.concatenate(
+            [np.empty((0, self._n_columns))] + self._chunks
+            )
+        self._chunks = []
+        
+        if self._separated:
+            result = (rmsds, self.headers)
+        elif self._many_refs:
+            result = rmsds
+        else:
+            result = rmsds[:, 0]
+        
+        self._taurentraj._pass_results[self.pass_key] = result
+
+
+class FramesConsumer(FrameConsumer):
+    """
+    Extracts frames as :meth:`tauren.tauren.TaurenTraj.frames2file`
+    does with Tauren-MD writers.
+    
+    Parameters
+    ----------
+    taurentraj : :class:`tauren.tauren.TaurenTraj`
+    
+    frames_list : list of ints
+        Sorted frames to extract, indexed at 1.
+    
+    pdb_name_fmt : str
+    
+    ext : str
+    
+    output : str
+    
+    file_name : str
+    
+    workers : int, optional
+    
+    processes : bool, optional
+    """
+    
+    def __init__(
+            self,
+            taurentraj,
+            frames_list,
+            pdb_name_fmt,
+            ext,
+            output,
+            file_name,
+            workers=None,
+            processes=False,
+            ):
+        
+        self.atom_indexes = \
+            taurentraj._select_atom_indexes(taurentraj.atom_selection)
+        self.frames = np.asarray(frames_list)
+        
+        self._formatter = writers.get_formatter(
+            ext,
+            taurentraj._gen_atoms_table(),
+            )
+        
+        self._name_fmt = pdb_name_fmt
+        self._workers = parallel.get_workers(workers)
+        self._processes = processes
+        
+        if output == "files":
+            self._sink = None
+        else:
+            self._sink = writers.open_frames_sink(output, file_name)
+    
+    def consume(self, frames, coordinates, boxes, times):
+        
+        texts = (
+            (
+                self._formatter.format(
+                    coordinates[ii],
+                    None if boxes is None else boxes[ii],
+                    ),
+                self._name_fmt.format(frame),
+                frame,
+                )
+            for ii, frame in enumerate(frames)
+            )
+        
+        if self._sink is not None:
+            for text, name, frame in texts:
+                self._sink.add(name, frame, text)
+            return
+        
+        for file_name in parallel.bounded_map(
+                writers.write_text,
+                ((text, name) for text, name, _ in texts),
+                workers=self._workers,
+                processes=self._processes,
+                ):
+            
+            log.debug(f"    extracted {file_name}")
+    
+    def close(self):
+        if self._sink is not None:
+            self._sink.close()
+
+
+class TrajConsumer(FrameConsumer):
+    """
+    Saves the current slicing as
+    :meth:`tauren.tauren.TaurenTraj.save_traj` does.
+    
+    Parameters
+    ----------
+    atom_indexes : np.ndarray
+        The atoms of the current selection.
+    
+    writer : object
+        With ``write(coordinates, boxes, frames, times)`` and
+        ``close()``.
+    """
+    
+    def __init__(self, atom_indexes, writer):
+        self.atom_indexes = atom_indexes
+        self._writer = writer
+    
+    def consume(self, frames, coordinates, boxes, times):
+        self._writer.write(coordinates, boxes, frames, times)
+    
+    def close(self):
+        self._writer.close()
+
+
+class _CompressedChunksWriter:
+    """Adapts :class:`tauren.compressed.CompressedTrajWriter`."""
+    
+    def __init__(self, writer):
+        self._writer = writer
+    
+    def write(self, coordinates, boxes, frames, times):
+        for ii, frame in enumerate(frames):
+            self._writer.write(
+                coordinates[ii],
+                None if boxes is None else boxes[ii],
+                frame=int(frame),
+                )
+    
+    def close(self):
+        self._writer.close()
+
+
+def rmsds_consumer(
+        taurentraj,
+        calculation,
+        chains="all",
+        ref_frame=0,
+        ref_structure=None,
+        **kwargs
+        ):
+    """
+    Returns the :class:`RMSDConsumer` of a calc_rmsds_* call,
+    or None if the call can not be calculated in a pass.
+    
+    RMSDs against external reference structures and separated
+    chains against several reference frames are not, RMSDs
+    already in the results cache are not calculated again.
+    """
+    
+    if ref_structure:
+        return None
+    
+    if calculation == "rmsds_separated_chains" \
+            and isinstance(ref_frame, list):
+        return None
+    
+    if taurentraj._in_results_cache(
+            calculation,
+            chains=chains,
+            ref_frame=ref_frame,
+            ref_structure=ref_structure,
+            **kwargs
+            ):
+        log.debug(f"{calculation} in results cache, not in frame pass")
+        return None
+    
+    return RMSDConsumer(taurentraj, calculation, chains, ref_frame)
+
+
+def frames_consumer(
+        taurentraj,
+        frames="all",
+        prefix="_",
+        ext="pdb",
+        workers=None,
+        processes=False,
+        output="files",
+        file_name=None,
+        **kwargs
+        ):
+    """
+    Returns the :class:`FramesConsumer` of a frames2file call,
+    or None if the frames can not be extracted in a pass.
+    
+    Frames must be written with Tauren-MD writers, in increasing
+    order and be in the current slicing.
+    """
+    
+    if output not in writers.frames_outputs:
+        return None
+    
+    frames_list, pdb_name_fmt, ext, file_name = \
+        taurentraj._resolve_frames2file(frames, prefix, ext, output, file_name)
+    
+    if ext.lower() not in writers.formatters \
+            or frames_list != sorted(frames_list) \
+            or not set(frames_list) <= set(taurentraj.sliced_frames_list):
+        return None
+    
+    return FramesConsumer(
+        taurentraj,
+        frames_list,
+        pdb_name_fmt,
+        ext,
+        output,
+        file_name,
+        workers=workers,
+        processes=processes,
+        )
+
+
+def traj_consumer(
+        taurentraj,
+        file_name="traj_output.dcd",
+        chunk_size=None,
+        shards=1,
+        precision=0.01,
+        **kwargs
+        ):
+    """
+    Returns the :class:`TrajConsumer` of a save_traj call,
+    or None if the trajectory can not be saved in a pass.
+    
+    Sharded outputs and formats the MD library does not stream are
+    not, see :meth:`tauren.tauren.TaurenTraj._open_traj_writer`.
+    """
+    
+    if shards != 1:
+        return None
+    
+    atom_indexes = \
+        taurentraj._select_atom_indexes(taurentraj.atom_selection)
+    
+    if file_name.endswith(compressed.ext):
+        writer = _CompressedChunksWriter(compressed.CompressedTrajWriter(
+            file_name,
+            len(atom_indexes),
+            precision=precision,
+            chunk_size=taurentraj._chunk_size(
+                chunk_size,
+                len(atom_indexes),
+                "save_traj",
+                ),
+            ))
+    
+    else:
+        writer = taurentraj._open_traj_writer(file_name, atom_indexes)
+    
+    if writer is None:
+        return None
+    
+    return TrajConsumer(atom_indexes, writer)
+
+
+def run_pass(taurentraj, consumers, chunk_size=None):
+    """
+    Reads the frames of the current slicing once, in chunks,
+    and hands each chunk to the consumers.
+    
+    Only the frames and atoms some consumer needs are read.
+    
+    Parameters
+    ----------
+    taurentraj : :class:`tauren.tauren.TaurenTraj`
+    
+    consumers : list of :class:`FrameConsumer`
+    
+    chunk_size : int, optional
+        Number of frames read at once. Defaults to None, 100 or the
+        frames that fit in the memory budget, see
+        :meth:`tauren.tauren.TaurenTraj.set_memory_budget`.
+    
+    Returns
+    -------
+    int
+        The number of frames read.
+    """
+    
+    atom_indexes = np.unique(
+        np.concatenate([c.atom_indexes for c in consumers])
+        )
+    
+    positions = [
+        None
+        if np.array_equal(c.atom_indexes, atom_indexes)
+        else np.searchsorted(atom_indexes, c.atom_indexes)
+        for c in consumers
+        ]
+    
+    frames_list = np.asarray(taurentraj.sliced_frames_list)
+    
+    if all(c.frames is not None for c in consumers):
+        frames_list = frames_list[np.isin(
+            frames_list,
+            np.concatenate([c.frames for c in consumers]),
+            )]
+    
+    log.info(
+        f"* Reading {frames_list.size} frames once for "
+        f"{len(consumers)} actions, {atom_indexes.size} atoms"
+        )
+    
+    # the chunk read and the copies of consumers reading fewer atoms
+    copies = 1 + sum(p is not None for p in positions)
+    chunk_size = taurentraj._chunk_size(
+        chunk_size,
+        atom_indexes.size,
+        "frame pass",
+        atom_bytes=copies * memory.coordinate_bytes,
+        )
+    
+    try:
+        for start in range(0, frames_list.size, chunk_size):
+            
+            frames = frames_list[start:start + chunk_size]
+            coordinates, boxes, times = \
+                taurentraj._read_frames(frames, atom_indexes)
+            
+            for consumer, consumer_positions in zip(consumers, positions):
+                
+                c_coordinates = coordinates
+                if consumer_positions is not None:
+                    c_coordinates = coordinates[:, consumer_positions]
+                
+                if consumer.frames is None:
+                    consumer.consume(frames, c_coordinates, boxes, times)
+                    continue
+                
+                rows = np.isin(frames, consumer.frames)
+                
+                if rows.any():
+                    consumer.consume(
+                        frames[rows],
+                        c_coordinates[rows],
+                        None if boxes is None else boxes[rows],
+                        times[rows],
+                        )
+            
+            log.debug(f"    frames up to {frames[-1]} read")
+    
+    finally:
+        for consumer in consumers:
+            consumer.close()
+    
+    return frames_list.size
@@ -22,9 +22,13 @@ from pathlib import Path
 from collections import namedtuple
 
 import mdtraj as md
+import numpy as np
 import simtk.openmm.app as app
 
+from tauren import compressed
+from tauren import estimate
 from tauren import logger
+from tauren import memory
 from tauren import tauren
 
 log = logger.get_log(__name__)
@@ -109,14 +113,107 @@ def _load_topology(topo_file):
         raise TypeError("Unkown topology file type")
 
 
+def _read_manifest(manifest_file):
+    """
+    Reads the trajectory parts listed in a manifest written by
+    :meth:`tauren.tauren.TaurenTraj.save_traj` with shards.
+    
+    Returns
+    -------
+    list of str
+        The part files, in trajectory order.
+    """
+    
+    with open(manifest_file, 'r') as fh:
+        manifest = json.load(fh)
+    
+    if "tauren_manifest" not in manifest:
+        raise ValueError(
+            f"'{manifest_file}' is not a Tauren-MD trajectory manifest."
+            )
+    
+    folder = Path(manifest_file).resolve().parent
+    
+    parts = [str(folder.joinpath(part["file"])) for part in manifest["parts"]]
+    
+    for part in parts:
+        if not Path(part).is_file():
+            raise FileNotFoundError(f"'{part}' does NOT exist.")
+    
+    log.info(f"trajectory manifest with {len(parts)} parts")
+    
+    return parts
+
+
+def _read_compressed(traj_file, topology, traj_type):
+    """
+    Reads a Tauren-MD compressed trajectory (.tcz) in memory.
+    
+    Returns the trajectory input and the keyword arguments for the
+    Tauren trajectory of <traj_type>.
+    """
+    
+    with compressed.CompressedTrajReader(traj_file) as reader:
+        _, coordinates, boxes = reader.read()
+    
+    log.info(f"read {len(coordinates)} frames from {traj_file}")
+    
+    has_box = not np.isnan(boxes).any()
+    
+    if traj_type == "mdanalysis":
+        
+        kwargs = {"dimensions": boxes} if has_box else {}
+        
+        return coordinates, kwargs
+    
+    if not isinstance(topology, md.Topology):
+        topology = md.load_topology(topology)
+    
+    # MDTraj works in nanometers
+    traj = md.Trajectory(
+        coordinates / 10,
+        topology,
+        unitcell_lengths=boxes[:, :3] / 10 if has_box else None,
+        unitcell_angles=boxes[:, 3:] if has_box else None,
+        )
+    
+    return traj, {}
+
+
+def _check_memory_budget(traj_file, topo_file, traj_type, max_memory):
+    """
+    Raises MemoryError if the trajectory is read in memory and its
+    coordinates do not fit in <max_memory>, before reading it.
+    """
+    
+    if traj_type != "mdtraj" and not traj_file.endswith(compressed.ext):
+        # MDAnalysis reads frames from disk as needed
+        return
+    
+    budget = memory.MemoryBudget(max_memory)
+    header = estimate.TrajHeader(traj_file, topo_file, traj_type)
+    
+    nbytes = header.n_frames * header.n_atoms * memory.coordinate_bytes
+    
+    if not budget.fits(nbytes):
+        raise MemoryError(
+            f"'{traj_file}' takes {memory.human_bytes(nbytes)} in memory, "
+            f"over the {budget} memory budget. "
+            "The 'mdanalysis' trajectory type reads frames from disk "
+            "as needed."
+            )
+    
+    return
+
+
 def _load_mdtraj(traj_file, topology):
     
     return tauren.TaurenMDTraj(traj_file, topology)
 
 
-def _load_mdanalysis(traj_file, topology):
+def _load_mdanalysis(traj_file, topology, **kwargs):
     
-    return tauren.TaurenMDAnalysis(traj_file, topology)
+    return tauren.TaurenMDAnalysis(traj_file, topology, **kwargs)
 
 
 @_validate_file_paths
@@ -124,6 +221,7 @@ def load_traj(
         traj_file,
         topo_file,
         traj_type="mdtraj",
+        max_memory=None,
         ):
     """
     Loads MD trajectory.
@@ -134,6 +232,10 @@ def load_traj(
         Trajectory file name (path)
         Formats allowed: ".xtc", ".nc", ".trr", ".h5", ".pdb",
         ".binpos", ".dcd".
+        A ".json" trajectory manifest written by
+        :meth:`tauren.tauren.TaurenTraj.save_traj` with shards
+        loads all parts as a single trajectory.
+        A ".tcz" Tauren-MD compressed trajectory is read in memory.
         
     topo_file : dstr
         Topology file name (path).
@@ -142,24 +244,55 @@ def load_traj(
     traj_type : {"mdtraj", "mdanalysis"}
         The type of trajectory generated.
     
+    max_memory : int, float or str, optional
+        Memory budget of the trajectory, see
+        :meth:`tauren.tauren.TaurenTraj.set_memory_budget`.
+        Trajectories read in memory (MDTraj and ".tcz") are checked
+        against it before reading.
+        Defaults to None, no budget.
+    
     Returns
     -------
     Tauren Trajectory
+    
+    Raises
+    ------
+    MemoryError
+        If the trajectory is read in memory and does not fit in
+        <max_memory>.
     """
     
     log.info("loading trajectory...")
     
+    if max_memory is not None:
+        _check_memory_budget(traj_file, topo_file, traj_type, max_memory)
+    
     topology = _load_topology(topo_file)
     
+    traj_kwargs = {}
+    
+    if traj_file.endswith(".json"):
+        traj_input = _read_manifest(traj_file)
+    elif traj_file.endswith(compressed.ext):
+        traj_input, traj_kwargs = \
+            _read_compressed(traj_file, topology, traj_type)
+    else:
+        traj_input = traj_file
+    
     # Exceptions are handled directly by md.load()
     
     if traj_type == "mdtraj":
         
-        traj = _load_mdtraj(traj_file, topology)
+        traj = _load_mdtraj(traj_input, topology)
     
     elif traj_type == "mdanalysis":
         
-        traj = _load_mdanalysis(traj_file, topology)
+        traj = _load_mdanalysis(traj_input, topology, **traj_kwargs)
+    
+    if isinstance(traj_input, list):
+        traj.input_files = traj_input + [topo_file]
+    else:
+        traj.input_files = [traj_file, topo_file]
     
     info = f"""
 *** Loaded ***
@@ -170,6 +303,8 @@ topology: {topo_file}
     
     log.info(info)
     
+    traj.set_memory_budget(max_memory)
+    
     traj.report()
     
     return traj
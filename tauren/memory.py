@@ -0,0 +1,185 @@
+"""
+Memory budget of a Tauren-MD run.
+
+With a budget, code paths that hold frames in chunks (trajectory
+export, RMSDs, RMSFs, frame passes and frame extraction) derive the
+number of frames they hold at once from the memory left after what
+the trajectory already holds and from the bytes per frame of the
+atoms they read. Without a budget they keep their default chunk size.
+"""
+# Copyright © 2018-2019 Tauren-MD Project
+#
+# Tauren-MD is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tauren-MD is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tauren-MD. If not, see <http://www.gnu.org/licenses/>.
+#
+# Contributors to this file:
+# - João M.C. Teixeira (https://github.com/joaomcteixeira)
+import re
+
+from tauren import logger
+
+log = logger.get_log(__name__)
+
+# float32 x, y, z
+coordinate_bytes = 12
+
+# a PDB ATOM line, the largest text format written per atom
+text_bytes_per_atom = 81
+
+default_chunk_size = 100
+
+_units = {
+    "b": 1,
+    "k": 1024,
+    "kb": 1024,
+    "m": 1024 ** 2,
+    "mb": 1024 ** 2,
+    "g": 1024 ** 3,
+    "gb": 1024 ** 3,
+    "t": 1024 ** 4,
+    "tb": 1024 ** 4,
+    }
+
+_size_regex = re.compile(r"\s*([0-9]*\.?[0-9]+)\s*([a-zA-Z]*)\s*")
+
+
+def parse_size(size):
+    """
+    Returns the number of bytes of <size>.
+    
+    Parameters
+    ----------
+    size : int, float or str
+        Megabytes, or a string with a unit, for example:
+        "16GB", "512 MB" or "2g".
+    
+    Raises
+    ------
+    ValueError
+        If <size> is not a positive size.
+    """
+    
+    if isinstance(size, (int, float)) and not isinstance(size, bool):
+        value, unit = size, "mb"
+    
+    else:
+        match = _size_regex.fullmatch(str(size))
+        
+        if match is None or match.group(2).lower() not in _units:
+            raise ValueError(
+                "<max_memory> should be megabytes or a size with a unit, "
+                f"like '16GB': '{size}' given."
+                )
+        
+        value, unit = float(match.group(1)), match.group(2).lower()
+    
+    nbytes = int(value * _units[unit])
+    
+    if nbytes <= 0:
+        raise ValueError(f"<max_memory> should be positive: '{size}' given.")
+    
+    return nbytes
+
+
+def human_bytes(size):
+    """Formats a number of bytes, '-' for None."""
+    
+    if size is None:
+        return "-"
+    
+    if size < 1024:
+        return f"{size} B"
+    
+    for unit in ("KB", "MB", "GB"):
+        size /= 1024
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+    
+    return f"{size / 1024:.1f} TB"
+
+
+class MemoryBudget:
+    """
+    Maximum memory of a run.
+    
+    Parameters
+    ----------
+    max_memory : int, float or str
+        See :func:`parse_size`.
+    
+    Attributes
+    ----------
+    max_bytes : int
+    
+    chunk_sizes : list of (str, int)
+        The chunk sizes chosen with :meth:`chunk_frames`, in order.
+    """
+    
+    def __init__(self, max_memory):
+        self.max_bytes = parse_size(max_memory)
+        self.chunk_sizes = []
+    
+    def __str__(self):
+        return human_bytes(self.max_bytes)
+    
+    def fits(self, nbytes, resident=0):
+        """Whether <nbytes> fit in the budget besides <resident>."""
+        return resident + nbytes <= self.max_bytes
+    
+    def chunk_frames(self, frame_bytes, resident=0, n_frames=None, label=None):
+        """
+        Returns the number of frames of <frame_bytes> each that fit
+        in the budget left after <resident> bytes, at least 1.
+        
+        Parameters
+        ----------
+        frame_bytes : int
+            Bytes held per frame.
+        
+        resident : int, optional
+            Bytes already held, defaults to 0.
+        
+        n_frames : int, optional
+            Frames to process, the chunk size is at most <n_frames>.
+        
+        label : str, optional
+            If given, the chunk size is logged and recorded in
+            :attr:`chunk_sizes` under <label>.
+        """
+        
+        available = self.max_bytes - resident
+        frames = max(available // max(frame_bytes, 1), 1)
+        
+        if n_frames:
+            frames = min(frames, n_frames)
+        
+        if label is None:
+            return frames
+        
+        if available < frame_bytes:
+            log.info(
+                f"    * WARNING * a frame of '{label}' "
+                f"({human_bytes(frame_bytes)}) does not fit in the "
+                f"{self} memory budget, {human_bytes(resident)} are "
+                "already in use"
+                )
+        
+        log.info(
+            f"    chunk size {frames} frames for '{label}' "
+            f"({human_bytes(frame_bytes)} per frame, "
+            f"{human_bytes(max(available, 0))} of {self} available)"
+            )
+        
+        self.chunk_sizes.append((label, frames))
+        
+        return frames
@@ -0,0 +1,232 @@
+"""
+Helpers to distribute independent tasks over thread or process pools.
+"""
+# Copyright © 2018-2019 Tauren-MD Project
+#
+# Tauren-MD is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tauren-MD is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tauren-MD. If not, see <http://www.gnu.org/licenses/>.
+#
+# Contributors to this file:
+# - João M.C. Teixeira (https://github.com/joaomcteixeira)
+import os
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+
+def get_workers(workers=None):
+    """
+    Returns the number of workers to use.
+    
+    Defaults to the number of CPUs if <workers> is None.
+    """
+    
+    if workers is None:
+        return os.cpu_count() or 1
+    
+    if not isinstance(workers, int) or workers < 1:
+        raise ValueError(f"workers should be a positive integer: '{workers}'")
+    
+    return workers
+
+
+def bounded_map(
+        func,
+        iterable,
+        *,
+        workers=None,
+        processes=False,
+        max_pending=None,
+        ):
+    """
+    Applies ``func(*args)`` for each args tuple in <iterable>.
+    
+    At most <max_pending> tasks are submitted at any time, so
+    <iterable> is consumed as results are yielded and memory does
+    not depend on the number of tasks.
+    
+    Parameters
+    ----------
+    func : callable
+        Must be picklable if processes is True.
+    
+    iterable : iterable of tuples
+        The positional arguments of each task.
+    
+    workers : int, optional
+        Number of workers. Defaults to the number of CPUs.
+        With 1 worker tasks run serially in the calling thread.
+    
+    processes : bool, optional
+        Whether to use a process pool instead of a thread pool.
+        Defaults to False.
+    
+    max_pending : int, optional
+        Maximum number of submitted tasks not yet yielded.
+        Defaults to two times <workers>.
+    
+    Yields
+    ------
+    The results of func, in the order of <iterable>.
+    """
+    
+    workers = get_workers(workers)
+    
+    if workers == 1:
+        for args in iterable:
+            yield func(*args)
+        return
+    
+    max_pending = max_pending or 2 * workers
+    
+    Executor = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    
+    with Executor(max_workers=workers) as executor:
+        
+        pending = deque()
+        
+        for args in iterable:
+            
+            pending.append(executor.submit(func, *args))
+            
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        
+        while pending:
+            yield pending.popleft().result()
+    
+    return
+
+
+def pipeline(items, consumer, *, max_pending=2):
+    """
+    Runs a producer/consumer pipeline in two threads.
+    
+    A reader thread iterates over <items> while a writer thread
+    calls ``consumer(item)`` for each item, in order. Items are
+    passed through a queue of at most <max_pending> items so that
+    reading and writing overlap while memory stays bounded.
+    
+    Parameters
+    ----------
+    items : iterable
+        Consumed in the reader thread.
+    
+    consumer : callable
+        Called in the writer thread with each item.
+    
+    max_pending : int, optional
+        Maximum number of items read and not yet consumed.
+        Defaults to 2, double buffering.
+    
+    Exceptions
+    ----------
+    Exceptions raised in any of the threads stop both threads and
+    are raised again in the calling thread.
+    """
+    
+    buffer = queue.Queue(maxsize=max_pending)
+    stop = threading.Event()
+    errors = []
+    done = object()
+    
+    def put(item):
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def read():
+        try:
+            for item in items:
+                if not put(item):
+                    return
+        except BaseException as err:
+            errors.append(err)
+            stop.set()
+        finally:
+            put(done)
+    
+    def write():
+        try:
+            while not stop.is_set():
+                try:
+                    item = buffer.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if item is done:
+                    return
+                consumer(item)
+        except BaseException as err:
+            errors.append(err)
+            stop.set()
+    
+    threads = [
+        threading.Thread(target=read, name="tauren-reader", daemon=True),
+        threading.Thread(target=write, name="tauren-writer", daemon=True),
+        ]
+    
+    for thread in threads:
+        thread.start()
+    
+    for thread in threads:
+        thread.join()
+    
+    if errors:
+        raise errors[0]
+    
+    return
+
+
+class OrderedTurns:
+    """
+    Orders the effects of tasks run concurrently.
+    
+    Tasks are numbered in their serial order. A task calling
+    :meth:`wait` with its number blocks until every registered task
+    numbered before it finished, so whatever follows happens in
+    serial order while the work before runs concurrently.
+    """
+    
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._pending = set()
+    
+    def register(self, number):
+        """Registers task <number> before it is submitted."""
+        with self._condition:
+            self._pending.add(number)
+    
+    def run(self, number, func, *args):
+        """
+        Runs ``func(*args)`` as task <number> and finishes it.
+        """
+        
+        try:
+            return func(*args)
+        
+        finally:
+            with self._condition:
+                self._pending.discard(number)
+                self._condition.notify_all()
+    
+    def wait(self, number):
+        """Blocks until the tasks before <number> finished."""
+        with self._condition:
+            self._condition.wait_for(
+                lambda: not any(n < number for n in self._pending)
+                )
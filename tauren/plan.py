@@ -0,0 +1,593 @@
+"""
+Execution plans of Tauren-MD runs.
+
+Actions can first be reordered so that cheap actions reducing the
+frames or atoms processed run earlier, see :func:`reorder_actions`.
+
+A plan splits the actions of a run in steps. Consecutive actions
+that only read the frames of the trajectory are fused in one step
+that reads each frame once, see :mod:`tauren.framepass`; any other
+action is a step of its own.
+
+The :class:`Scheduler` runs steps that do not depend on each other
+concurrently. Dependencies are inferred from the resources each
+action reads and writes.
+"""
+# Copyright © 2018-2019 Tauren-MD Project
+#
+# Tauren-MD is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tauren-MD is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tauren-MD. If not, see <http://www.gnu.org/licenses/>.
+#
+# Contributors to this file:
+# - João M.C. Teixeira (https://github.com/joaomcteixeira)
+import functools
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from tauren import _interface
+from tauren import framepass
+from tauren import logger
+from tauren import parallel
+from tauren import profiling
+from tauren import tauren
+
+log = logger.get_log(__name__)
+
+
+PlannedAction = namedtuple("PlannedAction", ["index", "name", "arguments"])
+PlannedAction.__doc__ = """
+An action of a run.
+
+index is the position of the action in the run, name is the
+action name without the trailing underscores that allow repeating
+actions in configuration files.
+"""
+
+# consumer factories of the actions that only read frames,
+# each returns None when the action arguments can not be fused
+frame_actions = {
+    "produce_rmsds_combined_chains": lambda x, y: framepass.rmsds_consumer(
+        x,
+        "rmsds_combined_chains",
+        **y["calc_rmsds_combined_chains"],
+        ),
+    "produce_rmsds_separated_chains": lambda x, y: framepass.rmsds_consumer(
+        x,
+        "rmsds_separated_chains",
+        **y["calc_rmsds_separated_chains"],
+        ),
+    "frames2file": lambda x, y: framepass.frames_consumer(x, **y),
+    "save_traj": lambda x, y: framepass.traj_consumer(x, **y),
+    }
+
+# actions whose whole work is done by their consumer
+_consumed_actions = ("frames2file", "save_traj")
+
+
+Effects = namedtuple("Effects", ["reads", "writes", "appends"])
+Effects.__doc__ = """
+Resources an action reads, writes and appends to.
+"""
+
+# resources: "slicing", "selection", "coordinates" (including the
+# topology and transformations) and "settings" (observables store
+# and results cache) are the state of the Tauren trajectory;
+# "frames" is reading its frames; "observables" are the calculated
+# observables, produce actions append to them in serial order, see
+# parallel.OrderedTurns. Output files are added from the arguments.
+_view = ("slicing", "selection", "frames")
+_frames_consumer = Effects(_view + ("coordinates",), (), ())
+_producer = Effects(
+    _view + ("coordinates", "settings"),
+    (),
+    ("observables",),
+    )
+
+action_effects = {
+    "remove_solvent": Effects(_view, ("coordinates",), ()),
+    "frame_slice": Effects((), ("slicing",), ()),
+    "atom_selection": Effects((), ("selection",), ()),
+    "observables_store": Effects((), ("settings", "observables"), ()),
+    "results_cache": Effects((), ("settings",), ()),
+    "align_traj": Effects(_view, ("coordinates",), ()),
+    "try_image_molecules": Effects(_view, ("coordinates",), ()),
+    "frames2file": _frames_consumer,
+    "save_traj": _frames_consumer,
+    "produce_rmsds_combined_chains": _producer,
+    "produce_rmsds_separated_chains": _producer,
+    "produce_rmsf": _producer,
+    "produce_rmsds_per_residue": _producer,
+    "export_observables": Effects(("observables",), (), ()),
+    }
+
+_resource_names = {
+    "slicing": "the frame slicing",
+    "selection": "the atom selection",
+    "coordinates": "the coordinates",
+    "settings": "the observables settings",
+    "frames": "the frames",
+    "observables": "the observables",
+    }
+
+# arguments naming output files, at any depth
+_output_arguments = ("file_name", "fig_name", "prefix")
+
+
+def _output_files(arguments):
+    """Yields the output files named in <arguments>."""
+    
+    for name, value in arguments.items():
+        
+        if isinstance(value, dict):
+            yield from _output_files(value)
+        
+        elif name in _output_arguments and value is not None:
+            yield f"file:{value}"
+
+
+def get_effects(name, arguments):
+    """
+    Returns the :class:`Effects` of action <name> with <arguments>.
+    """
+    
+    effects = action_effects[name]
+    reads = effects.reads
+    
+    # explicit frames are numbered in the input trajectory
+    if name == "frames2file" and arguments.get("frames", "all") != "all":
+        reads = tuple(r for r in reads if r != "slicing")
+    
+    return Effects(
+        reads,
+        effects.writes + tuple(_output_files(arguments)),
+        effects.appends,
+        )
+
+
+def _conflicts(effects1, effects2):
+    """
+    Returns the resources for which two actions must run in order.
+    
+    Appends conflict with reads and writes but not among them.
+    """
+    
+    touched2 = set(effects2.reads + effects2.writes + effects2.appends)
+    
+    return (
+        set(effects1.writes) & touched2
+        | set(effects1.reads) & set(effects2.writes + effects2.appends)
+        | set(effects1.appends) & set(effects2.reads + effects2.writes)
+        )
+
+
+# cheap actions reducing the frames or atoms processed after them
+reducing_actions = ("frame_slice", "atom_selection", "remove_solvent")
+
+
+def _conflict(effects1, effects2):
+    """Whether two actions must run in order."""
+    return bool(_conflicts(effects1, effects2))
+
+
+def frames_read(taurentraj, action):
+    """
+    Number of frames of <taurentraj> a :class:`PlannedAction` reads,
+    0 for actions not reading frames.
+    """
+    
+    if "frames" not in get_effects(action.name, action.arguments).reads:
+        return 0
+    
+    frames = action.arguments.get("frames", "all")
+    
+    if action.name != "frames2file" or frames == "all":
+        return taurentraj.n_frames
+    
+    return len(tauren._frames_from_string(
+        frames,
+        len(taurentraj.full_frames_list),
+        ))
+
+
+def run_action(taurentraj, action, frames=None):
+    """
+    Runs a :class:`PlannedAction` on its own.
+    
+    The action is measured by the active profilers, see
+    :mod:`tauren.profiling`, as processing <frames> frames,
+    defaults to :func:`frames_read`.
+    """
+    
+    log.debug(
+        f"*** Performing '{action.name}' with options: '{action.arguments}'"
+        )
+    
+    if frames is None:
+        frames = frames_read(taurentraj, action)
+    
+    with profiling.measure(action.name, frames=frames):
+        _interface.actions_dict[action.name](taurentraj, action.arguments)
+
+
+class Step:
+    """
+    Actions run together.
+    
+    Parameters
+    ----------
+    actions : list of :class:`PlannedAction`
+    
+    chunk_size : int, optional
+        Number of frames read at once by fused steps.
+        Defaults to None, see :func:`tauren.framepass.run_pass`.
+    """
+    
+    def __init__(self, actions, chunk_size=None):
+        self.actions = actions
+        self.chunk_size = chunk_size
+    
+    @property
+    def fused(self):
+        """Whether the actions share a frame pass."""
+        return len(self.actions) > 1
+    
+    @property
+    def last_index(self):
+        """Index of the last action in the run."""
+        return self.actions[-1].index
+    
+    def __str__(self):
+        names = ", ".join(action.name for action in self.actions)
+        return f"one pass: {names}" if self.fused else names
+    
+    def effects(self, taurentraj):
+        """
+        Returns the :class:`Effects` of the actions of the step
+        on <taurentraj>.
+        
+        Reading frames is exclusive if the MD library can not read
+        frames from several threads.
+        """
+        
+        reads, writes, appends = set(), set(), set()
+        
+        for action in self.actions:
+            effects = get_effects(action.name, action.arguments)
+            reads.update(effects.reads)
+            writes.update(effects.writes)
+            appends.update(effects.appends)
+        
+        if not taurentraj._concurrent_frame_reads and "frames" in reads:
+            reads.remove("frames")
+            writes.add("frames")
+        
+        return Effects(tuple(reads), tuple(writes), tuple(appends))
+    
+    def _gen_consumers(self, taurentraj):
+        """
+        Returns {action index: consumer} of the fusible actions.
+        """
+        
+        consumers = {}
+        
+        for action in self.actions:
+            
+            try:
+                consumer = frame_actions[action.name](
+                    taurentraj,
+                    action.arguments,
+                    )
+            
+            except (KeyError, TypeError, ValueError, IndexError) as e:
+                # the action reports its own error when run alone
+                log.debug(e)
+                consumer = None
+            
+            if consumer is None:
+                log.info(f"* '{action.name}' runs outside the frame pass")
+            
+            else:
+                consumers[action.index] = consumer
+        
+        return consumers
+    
+    def run(self, taurentraj, wait_turn=None):
+        """
+        Runs the actions of the step on <taurentraj>.
+        
+        In fused steps, the frame pass runs first; produce actions
+        then read their precalculated RMSDs while exporting and
+        plotting as usual.
+        
+        Parameters
+        ----------
+        taurentraj : :class:`tauren.tauren.TaurenTraj`
+        
+        wait_turn : callable, optional
+            Called before each action appending observables, blocks
+            until the steps before in the run appended theirs, see
+            :class:`Scheduler`.
+        """
+        
+        def run(action, frames=None):
+            
+            if wait_turn is not None \
+                    and get_effects(action.name, action.arguments).appends:
+                wait_turn()
+            
+            run_action(taurentraj, action, frames=frames)
+        
+        if not self.fused:
+            run(self.actions[0])
+            return
+        
+        consumers = self._gen_consumers(taurentraj)
+        
+        try:
+            if consumers:
+                
+                pass_name = f"frame pass of {len(consumers)} actions"
+                
+                with profiling.measure(pass_name) as measurements:
+                    
+                    n_frames = framepass.run_pass(
+                        taurentraj,
+                        list(consumers.values()),
+                        chunk_size=self.chunk_size,
+                        )
+                    
+                    for measurement in measurements:
+                        measurement.frames = n_frames
+            
+            for action in self.actions:
+                
+                if action.index in consumers \
+                        and action.name in _consumed_actions:
+                    log.info(f"* '{action.name}' done in frame pass")
+                    continue
+                
+                # frames were read by the pass
+                run(
+                    action,
+                    frames=0 if action.index in consumers else None,
+                    )
+        
+        finally:
+            for consumer in consumers.values():
+                taurentraj._pass_results.pop(consumer.pass_key, None)
+        
+        return
+
+
+def compile_plan(actions, start=0, fuse=True, chunk_size=None):
+    """
+    Splits actions in :class:`Step` s.
+    
+    Parameters
+    ----------
+    actions : list of (str, dict)
+        The actions and their arguments, in running order.
+    
+    start : int, optional
+        Index of the first action in the run.
+        Defaults to 0.
+    
+    fuse : bool, optional
+        Whether consecutive actions reading frames are fused.
+        Defaults to True.
+    
+    chunk_size : int, optional
+        Number of frames read at once by fused steps.
+        Defaults to None, see :func:`tauren.framepass.run_pass`.
+    
+    Returns
+    -------
+    list of :class:`Step`
+    """
+    
+    steps = []
+    group = []
+    
+    for index, (action, arguments) in enumerate(actions, start=start):
+        
+        planned = PlannedAction(index, action.rstrip("_"), arguments)
+        
+        if fuse and planned.name in frame_actions:
+            group.append(planned)
+            continue
+        
+        if group:
+            steps.append(Step(group, chunk_size=chunk_size))
+            group = []
+        
+        steps.append(Step([planned], chunk_size=chunk_size))
+    
+    if group:
+        steps.append(Step(group, chunk_size=chunk_size))
+    
+    for step in steps:
+        if step.fused:
+            log.info(f"* Planned {step}")
+    
+    return steps
+
+
+class Scheduler:
+    """
+    Runs steps concurrently in a thread pool when they do not
+    depend on each other.
+    
+    A step depends on the previous steps it conflicts with, see
+    :class:`Effects`, and starts once those finished. Produce actions
+    running concurrently store their observables in serial order,
+    so observables, their keys and exported files are the same as
+    in a serial run.
+    
+    Parameters
+    ----------
+    workers : int, optional
+        Maximum number of steps running at once.
+        Defaults to 1, steps run one after the other.
+    """
+    
+    def __init__(self, workers=1):
+        self.workers = parallel.get_workers(workers)
+    
+    def run(self, taurentraj, steps, on_idle=None):
+        """
+        Runs <steps> on <taurentraj>.
+        
+        Parameters
+        ----------
+        taurentraj : :class:`tauren.tauren.TaurenTraj`
+        
+        steps : list of :class:`Step`
+            From :func:`compile_plan`.
+        
+        on_idle : callable, optional
+            Called with the last step done whenever no step is
+            running and all steps up to it are done, for example
+            to save checkpoints.
+        """
+        
+        effects = [step.effects(taurentraj) for step in steps]
+        
+        depends = [
+            {j for j in range(i) if _conflict(effects[i], effects[j])}
+            for i in range(len(steps))
+            ]
+        
+        turns = parallel.OrderedTurns()
+        pending = list(range(len(steps)))
+        running = {}
+        done = set()
+        
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            
+            while pending or running:
+                
+                # appending steps are submitted in order, so each
+                # waits only for steps already in the pool
+                appends_blocked = False
+                
+                for i in list(pending):
+                    
+                    appends = bool(effects[i].appends)
+                    
+                    if not depends[i] <= done \
+                            or (appends and appends_blocked):
+                        appends_blocked = appends_blocked or appends
+                        continue
+                    
+                    if running:
+                        log.info(f"* '{steps[i]}' runs concurrently")
+                    
+                    pending.remove(i)
+                    
+                    if appends:
+                        turns.register(i)
+                        future = executor.submit(
+                            turns.run,
+                            i,
+                            steps[i].run,
+                            taurentraj,
+                            functools.partial(turns.wait, i),
+                            )
+                    
+                    else:
+                        future = executor.submit(steps[i].run, taurentraj)
+                    
+                    running[future] = i
+                
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                
+                for future in finished:
+                    i = running.pop(future)
+                    future.result()
+                    done.add(i)
+                
+                if on_idle and not running \
+                        and done == set(range(len(done))):
+                    on_idle(steps[len(done) - 1])
+        
+        return
+
+
+def reorder_actions(actions):
+    """
+    Moves reducing actions before the preceding actions they
+    commute with.
+    
+    Two actions commute when neither reads or writes a resource
+    the other writes or appends to, see :class:`Effects`, so that
+    running them in either order gives the same results. Each
+    reducing action moves up to the first preceding action it
+    does not commute with or another reducing action.
+    
+    Parameters
+    ----------
+    actions : list of (str, dict)
+        The actions and their arguments, in running order.
+    
+    Returns
+    -------
+    list of (str, dict)
+        The actions in the new order, logged if it changed.
+    """
+    
+    reordered = []
+    
+    for action, arguments in actions:
+        
+        name = action.rstrip("_")
+        position = len(reordered)
+        
+        if name in reducing_actions:
+            
+            effects = get_effects(name, arguments)
+            
+            while position > 0:
+                
+                previous, previous_arguments = reordered[position - 1]
+                previous_name = previous.rstrip("_")
+                
+                shared = _conflicts(
+                    effects,
+                    get_effects(previous_name, previous_arguments),
+                    )
+                
+                if shared:
+                    resources = ", ".join(
+                        _resource_names.get(r, r) for r in sorted(shared)
+                        )
+                    log.info(
+                        f"* '{name}' kept after '{previous_name}', "
+                        f"both use {resources}"
+                        )
+                    break
+                
+                if previous_name in reducing_actions:
+                    break
+                
+                position -= 1
+        
+        reordered.insert(position, (action, arguments))
+    
+    if reordered != actions:
+        
+        log.info("* Actions reordered:")
+        
+        for action, _ in reordered:
+            log.info(f"    {action}")
+    
+    return reordered
@@ -467,3 +467,108 @@ def rmsd_individual_chains_one_subplot(
     plt.close("all")
     
     return
+
+
+@_check_data
+def rmsf(
+        x_data,
+        y_data,
+        *,
+        label="No labels provided",
+        suptitle="RMSFs",
+        x_label="Residue Number",
+        y_label="RMSFs",
+        color='blue',
+        alpha=0.7,
+        grid=True,
+        grid_color="lightgrey",
+        grid_ls="-",
+        grid_lw=1,
+        grid_alpha=0.5,
+        legend=True,
+        legend_fs=6,
+        legend_loc=1,
+        fig_name='plot_rmsf.pdf',
+        **kwargs
+        ):
+    """
+    Plots the RMSFs of atoms or residues.
+    
+    Bellow parameters concern data representation and are considered
+    of highest importance because their incorrect use can mislead
+    data analysis and consequent conclusions.
+    
+    Plot style parameters concernning only plot style, i.e., colors,
+    shapes, fonts, etc... and which do not distort the actual data,
+    are not listed in the paremeter list bellow. We hope these
+    parameter names are self-explanatory and are listed in the function
+    definition.
+    
+    Parameters
+    ----------
+    x_data : interable of numbers
+        Container of the X axis data, atom or residue numbers.
+        Should be accepted by matplotlib.
+    
+    y_data : np.ndarray, shape=(M,)
+        Container of the Y axis data.
+        Where M is the RMSF of each atom or residue.
+    
+    label : str, optional
+        The label to represent in plot legend.
+        Defauts to: "no labels provided".
+    
+    fig_name : str, optional
+        The file name with which the plot figure will be saved
+        in disk. Defaults to plot_rmsf.pdf.
+        You can change the file type by specifying its extention in
+        the file name.
+    """
+    log.info("* Plotting RMSFs...")
+    
+    fig, ax = plt.subplots(nrows=1, ncols=1)
+    
+    plt.tight_layout(rect=[0.05, 0.02, 0.995, 0.985])
+    
+    fig.suptitle(
+        suptitle,
+        x=0.5,
+        y=0.990,
+        va="top",
+        ha="center",
+        )
+    
+    ax.plot(
+        x_data,
+        y_data,
+        label=label,
+        color=color,
+        alpha=alpha,
+        )
+    
+    ax.set_xlabel(x_label, weight='bold')
+    ax.set_ylabel(y_label, weight='bold')
+    
+    ax.set_xlim(x_data[0], x_data[-1])
+    ax.set_ylim(0)
+    
+    if grid:
+        ax.grid(
+            color=grid_color,
+            linestyle=grid_ls,
+            linewidth=grid_lw,
+            alpha=grid_alpha,
+            )
+    
+    if legend:
+        ax.legend(
+            fontsize=legend_fs,
+            loc=legend_loc,
+            )
+    
+    fig.savefig(fig_name)
+    log.info(_msg_fig_saved.format(fig_name))
+    
+    plt.close("all")
+    
+    return
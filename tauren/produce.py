@@ -18,8 +18,11 @@ Functions that perform combined operations that are related.
 #
 # Contributors to this file:
 # - João M.C. Teixeira (https://github.com/joaomcteixeira)
+import numpy as np
+
 from tauren import logger
 from tauren import plot
+from tauren import tables
 
 log = logger.get_log(__name__)
 
@@ -35,9 +38,17 @@ def rmsds_separated_chains(
         ):
     """
     Execute routines related to RMSDs of separated chains.
+    
+    If <export_data> has "stream" set to true, rows are exported
+    while they are calculated, see :func:`rmsds_per_residue`.
     """
-        
-    key = taurentraj.calc_rmsds_separated_chains(**calc_rmsds_separated_chains)
+    
+    export_data, export_stream = _split_stream_options(export_data)
+    
+    key = taurentraj.calc_rmsds_separated_chains(
+        **calc_rmsds_separated_chains,
+        export_stream=export_stream,
+        )
     
     if export_data:
         
@@ -56,10 +67,9 @@ def rmsds_separated_chains(
             "plot_rmsd_chain_per_subplot",
             taurentraj.observables[key],
             )
-
+        
         plot.rmsd_chain_per_subplot(
-            taurentraj.observables[key][1][:, 0],
-            taurentraj.observables[key][1][:, 1:].T,
+            *_get_frames_and_values(taurentraj.observables, key),
             **plot_rmsd_chain_per_subplot,
             )
     
@@ -73,8 +83,7 @@ def rmsds_separated_chains(
             )
         
         plot.rmsd_individual_chains_one_subplot(
-            taurentraj.observables[key][1][:, 0],
-            taurentraj.observables[key][1][:, 1:].T,
+            *_get_frames_and_values(taurentraj.observables, key),
             **plot_rmsd_individual_chains_one_subplot
             )
         
@@ -91,9 +100,17 @@ def rmsds_combined_chains(
         ):
     """
     Execute routines related to RMSDs of combined chains.
+    
+    If <export_data> has "stream" set to true, rows are exported
+    while they are calculated, see :func:`rmsds_per_residue`.
     """
-        
-    key = taurentraj.calc_rmsds_combined_chains(**calc_rmsds_combined_chains)
+    
+    export_data, export_stream = _split_stream_options(export_data)
+    
+    key = taurentraj.calc_rmsds_combined_chains(
+        **calc_rmsds_combined_chains,
+        export_stream=export_stream,
+        )
     
     if export_data:
         
@@ -113,15 +130,143 @@ def rmsds_combined_chains(
             taurentraj.observables[key],
             )
         
-        plot.rmsd_combined_chains(
+        if len(taurentraj.observables[key].columns) > 2:
+            # one RMSD series per reference frame
+            plot_kwargs = dict(plot_rmsd_combined_chains)
+            plot_kwargs.pop("label")
+            plot_kwargs.pop("color", None)
+            plot_kwargs["labels"] = taurentraj.observables[key].columns[1:]
+            
+            plot.rmsd_individual_chains_one_subplot(
+                *_get_frames_and_values(taurentraj.observables, key),
+                **plot_kwargs,
+                )
+        
+        else:
+            plot.rmsd_combined_chains(
+                taurentraj.observables.column(key, 0),
+                taurentraj.observables.column(key, 1),
+                **plot_rmsd_combined_chains,
+                )
+    
+    return
+
+
+def rmsf(
+        taurentraj,
+        calc_rmsf,
+        *,
+        export_data=False,
+        plot_rmsf=False,
+        **kwargs
+        ):
+    """
+    Execute routines related to RMSFs.
+    """
+    
+    key = taurentraj.calc_rmsf(**calc_rmsf)
+    
+    if export_data:
+        
+        _update_export_data(
+            export_data,
+            key,
+            )
+        
+        taurentraj.export_data(key, **export_data)
+    
+    if plot_rmsf:
+        
+        _update_single_plot_config(
+            plot_rmsf,
+            key,
+            "plot_rmsf",
+            taurentraj.observables[key],
+            )
+        
+        plot.rmsf(
             taurentraj.observables[key][1][:, 0],
             taurentraj.observables[key][1][:, 1],
-            **plot_rmsd_combined_chains,
+            **plot_rmsf,
+            )
+    
+    return
+
+
+def rmsds_per_residue(
+        taurentraj,
+        calc_rmsds_per_residue,
+        *,
+        export_data=False,
+        **kwargs
+        ):
+    """
+    Execute routines related to RMSDs decomposed per residue.
+    
+    If <export_data> has "stream" set to true, rows are exported
+    while they are calculated, see
+    :meth:`tauren.tauren.TaurenTraj.calc_rmsds_per_residue`.
+    """
+    
+    export_data, export_stream = _split_stream_options(export_data)
+    
+    key = taurentraj.calc_rmsds_per_residue(
+        **calc_rmsds_per_residue,
+        export_stream=export_stream,
+        )
+    
+    if export_data:
+        
+        _update_export_data(
+            export_data,
+            key,
             )
         
+        taurentraj.export_data(key, **export_data)
+    
     return
 
 
+def _split_stream_options(export_data):
+    """
+    Splits the <export_data> configuration, which is not modified,
+    in the arguments of :meth:`tauren.tauren.TaurenTraj.export_data`
+    and of a calc_* <export_stream>.
+    
+    Returns
+    -------
+    tuple
+        (False, export_stream) if "stream" is true, else
+        (export_data, None).
+    """
+    
+    if not export_data:
+        return export_data, None
+    
+    export_data = dict(export_data)
+    
+    if export_data.pop("stream", False):
+        return False, export_data
+    
+    export_data.pop("flush_every", None)
+    
+    return export_data, None
+
+
+def _get_frames_and_values(observables, key):
+    """
+    Returns the frames column and the other columns stacked
+    in rows, shape=(N columns, M frames).
+    """
+    
+    n_columns = len(observables[key].columns)
+    
+    return (
+        observables.column(key, 0),
+        np.array([observables.column(key, ii) for ii in range(1, n_columns)]),
+        )
+
+
 def _get_key_list(key):
     """
     .. deprecated:: 0.6.0
@@ -137,7 +282,8 @@ def _update_export_data(
         ):
         
     if kwargs["file_name"] is None:
-        kwargs["file_name"] = f"{key.datatype}_{key.filenaming}.csv"
+        kwargs["file_name"] = \
+            tables.default_file_name(key, kwargs.get("format"))
 
 
 def _update_single_plot_config(
@@ -0,0 +1,400 @@
+"""
+Per action profiling of Tauren-MD runs.
+
+A :class:`Profiler` records, for each action run while it is active,
+the wall and CPU times, the process peak resident memory, optionally
+the peak of memory allocated by Python (tracemalloc), the frames
+processed and the hits of the results and reference caches.
+
+Actions run by :mod:`tauren.plan` are recorded automatically, other
+code is recorded with :meth:`Profiler.action`::
+    
+    with profiling.Profiler(traj) as profiler:
+        
+        with profiler.action("rmsf", frames=traj.n_frames):
+            traj.calc_rmsf()
+    
+    profiler.write_json("profile.json")
+    print(profiler.format_table())
+
+CPU times include the worker processes already finished and, as the
+memory and cache counters, are shared by actions running
+concurrently.
+"""
+# Copyright © 2018-2019 Tauren-MD Project
+#
+# Tauren-MD is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tauren-MD is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tauren-MD. If not, see <http://www.gnu.org/licenses/>.
+#
+# Contributors to this file:
+# - João M.C. Teixeira (https://github.com/joaomcteixeira)
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import namedtuple
+
+from tauren import logger
+from tauren import memory
+from tauren import reference
+from tauren import tables
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+log = logger.get_log(__name__)
+
+ActionProfile = namedtuple(
+    "ActionProfile",
+    [
+        "action",
+        "wall_time",
+        "cpu_time",
+        "frames",
+        "frames_per_second",
+        "peak_rss",
+        "peak_rss_delta",
+        "traced_peak",
+        "caches",
+        ],
+    )
+ActionProfile.__doc__ = """
+Cost of an action.
+
+Times are in seconds and memory in bytes. peak_rss is the process
+peak resident memory after the action, None where it is not
+available, and peak_rss_delta how much the action raised it.
+traced_peak is the peak of memory allocated by Python during the
+action above the memory allocated at its start, None if not traced.
+caches is {cache name: {"hits": int, "misses": int}}.
+"""
+
+# profilers active in any thread, see Profiler.__enter__
+_active = []
+_active_lock = threading.Lock()
+
+
+def _cpu_time():
+    """CPU time of the process and its finished children."""
+    times = os.times()
+    return times.user + times.system \
+        + times.children_user + times.children_system
+
+
+def _peak_rss():
+    """Peak resident memory of the process in bytes, or None."""
+    
+    if resource is None:
+        return None
+    
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    
+    # kilobytes, except on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _hit_rate(counts):
+    lookups = counts["hits"] + counts["misses"]
+    return counts["hits"] / lookups if lookups else None
+
+
+class _Measurement:
+    """
+    An action being measured, <frames> can be set while it runs.
+    """
+    
+    def __init__(self, name, frames):
+        self.name = name
+        self.frames = frames
+
+
+class Profiler:
+    """
+    Records the cost of the actions run while it is active.
+    
+    Parameters
+    ----------
+    taurentraj : :class:`tauren.tauren.TaurenTraj`, optional
+        The trajectory whose results cache hits are recorded,
+        can be set later.
+    
+    trace_memory : bool, optional
+        Whether to trace memory allocated by Python with
+        :mod:`tracemalloc`, which slows down the run.
+        Defaults to False.
+    
+    Attributes
+    ----------
+    records : list of :class:`ActionProfile`
+        In the order actions finished.
+    """
+    
+    def __init__(self, taurentraj=None, trace_memory=False):
+        
+        self.taurentraj = taurentraj
+        self.trace_memory = trace_memory
+        self.records = []
+        
+        self._lock = threading.Lock()
+        self._tracing = False
+        self._start = None
+        self._wall_time = None
+        self._cpu_time = None
+    
+    def __enter__(self):
+        
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+        
+        self._start = (time.perf_counter(), _cpu_time())
+        self._wall_time = self._cpu_time = None
+        
+        with _active_lock:
+            _active.append(self)
+        
+        return self
+    
+    def __exit__(self, *exc):
+        
+        with _active_lock:
+            _active.remove(self)
+        
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+        
+        self._wall_time = time.perf_counter() - self._start[0]
+        self._cpu_time = _cpu_time() - self._start[1]
+        
+        return False
+    
+    @property
+    def wall_time(self):
+        """Seconds the profiler was active, so far if still active."""
+        if self._wall_time is None:
+            return time.perf_counter() - self._start[0]
+        return self._wall_time
+    
+    @property
+    def cpu_time(self):
+        """CPU seconds while the profiler was active."""
+        if self._cpu_time is None:
+            return _cpu_time() - self._start[1]
+        return self._cpu_time
+    
+    def _cache_counts(self):
+        
+        counts = {"references": dict(reference.cache_stats)}
+        
+        results_cache = getattr(self.taurentraj, "results_cache", None)
+        if results_cache is not None:
+            counts["results"] = {
+                "hits": results_cache.hits,
+                "misses": results_cache.misses,
+                }
+        
+        return counts
+    
+    @contextlib.contextmanager
+    def action(self, name, frames=0):
+        """
+        Measures the code run in the context as action <name>.
+        
+        Parameters
+        ----------
+        name : str
+        
+        frames : int, optional
+            Frames the action processes. The measurement the context
+            yields has a <frames> attribute to set it while running.
+            Defaults to 0.
+        """
+        
+        measurement = _Measurement(name, frames)
+        
+        caches = self._cache_counts()
+        peak_rss = _peak_rss()
+        
+        traced = tracemalloc.is_tracing() and self.trace_memory
+        if traced:
+            traced_start = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        
+        cpu_start = _cpu_time()
+        wall_start = time.perf_counter()
+        
+        try:
+            yield measurement
+        
+        finally:
+            
+            wall_time = time.perf_counter() - wall_start
+            cpu_time = _cpu_time() - cpu_start
+            
+            traced_peak = None
+            if traced and tracemalloc.is_tracing():
+                traced_peak = max(
+                    tracemalloc.get_traced_memory()[1] - traced_start,
+                    0,
+                    )
+            
+            peak_rss_end = _peak_rss()
+            
+            # counters of a results cache set by the action start at 0
+            cache_deltas = {
+                cache: {
+                    count: value - caches.get(cache, {}).get(count, 0)
+                    for count, value in counts.items()
+                    }
+                for cache, counts in self._cache_counts().items()
+                }
+            
+            frames = measurement.frames
+            
+            record = ActionProfile(
+                action=name,
+                wall_time=wall_time,
+                cpu_time=cpu_time,
+                frames=frames,
+                frames_per_second=(
+                    frames / wall_time if frames and wall_time else None
+                    ),
+                peak_rss=peak_rss_end,
+                peak_rss_delta=(
+                    None if peak_rss is None else peak_rss_end - peak_rss
+                    ),
+                traced_peak=traced_peak,
+                caches=cache_deltas,
+                )
+            
+            with self._lock:
+                self.records.append(record)
+            
+            log.debug(f"{name}: {wall_time:.3f} s")
+    
+    def report(self):
+        """
+        Returns the profile as a dictionary, the JSON report.
+        """
+        
+        actions = []
+        for record in self.records:
+            
+            entry = record._asdict()
+            entry["caches"] = {
+                cache: dict(counts, hit_rate=_hit_rate(counts))
+                for cache, counts in record.caches.items()
+                }
+            
+            actions.append(entry)
+        
+        return {
+            "wall_time": self.wall_time,
+            "cpu_time": self.cpu_time,
+            "peak_rss": _peak_rss(),
+            "traced_memory": self.trace_memory,
+            "actions": actions,
+            }
+    
+    def write_json(self, file_name):
+        """Writes :meth:`report` to <file_name>."""
+        
+        with open(file_name, "w") as fh:
+            json.dump(self.report(), fh, indent=4)
+        
+        log.info(f"* Profile saved to {file_name}")
+        
+        return
+    
+    def format_table(self):
+        """
+        Returns the records as a text table with a totals row.
+        
+        The cache column gives hits and lookups of all caches.
+        """
+        
+        header = (
+            "action",
+            "wall s",
+            "cpu s",
+            "frames",
+            "frames/s",
+            "peak RSS",
+            "+RSS",
+            "traced",
+            "cache hits",
+            )
+        
+        def row(record):
+            
+            hits = sum(c["hits"] for c in record.caches.values())
+            lookups = hits + sum(c["misses"] for c in record.caches.values())
+            
+            return (
+                record.action,
+                f"{record.wall_time:.3f}",
+                f"{record.cpu_time:.3f}",
+                str(record.frames or "-"),
+                (
+                    f"{record.frames_per_second:.1f}"
+                    if record.frames_per_second else "-"
+                    ),
+                memory.human_bytes(record.peak_rss),
+                memory.human_bytes(record.peak_rss_delta),
+                memory.human_bytes(record.traced_peak),
+                f"{hits}/{lookups}" if lookups else "-",
+                )
+        
+        rows = [row(record) for record in self.records]
+        
+        rows.append((
+            "total",
+            f"{self.wall_time:.3f}",
+            f"{self.cpu_time:.3f}",
+            "",
+            "",
+            memory.human_bytes(_peak_rss()),
+            "",
+            "",
+            "",
+            ))
+        
+        return tables.format_text_table(header, rows)
+
+
+@contextlib.contextmanager
+def measure(name, frames=0):
+    """
+    Measures the code run in the context as action <name> in the
+    active profilers, does nothing without active profilers.
+    
+    See :meth:`Profiler.action`.
+    """
+    
+    with _active_lock:
+        profilers = list(_active)
+    
+    with contextlib.ExitStack() as stack:
+        
+        measurements = [
+            stack.enter_context(profiler.action(name, frames))
+            for profiler in profilers
+            ]
+        
+        yield measurements
@@ -0,0 +1,241 @@
+"""
+Manages external reference structures for RMSD calculations.
+
+Prepared references (the selected and centred coordinates and the
+weights) are cached in memory and on disk, under
+:const:`tauren.core.cache_folder`, so that batch runs comparing
+against the same structure parse and centre it only once.
+"""
+# Copyright © 2018-2019 Tauren-MD Project
+#
+# Tauren-MD is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tauren-MD is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tauren-MD. If not, see <http://www.gnu.org/licenses/>.
+#
+# Contributors to this file:
+# - João M.C. Teixeira (https://github.com/joaomcteixeira)
+import hashlib
+import os
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+
+from tauren import core
+from tauren import logger
+
+log = logger.get_log(__name__)
+
+PreparedReference = namedtuple(
+    "PreparedReference",
+    [
+        "coordinates",
+        "weights",
+        ],
+    )
+
+_memory_cache = {}
+
+# references found in the memory or disk cache and prepared,
+# see :mod:`tauren.profiling`
+cache_stats = {"hits": 0, "misses": 0}
+
+
+def _file_hash(file_path, block_size=1048576):
+    """
+    Returns the sha256 hex digest of the file content.
+    """
+    
+    sha = hashlib.sha256()
+    
+    with open(file_path, "rb") as fh:
+        for block in iter(lambda: fh.read(block_size), b""):
+            sha.update(block)
+    
+    return sha.hexdigest()
+
+
+def _gen_cache_key(ref_structure, selection, library, weights):
+    """
+    Generates the cache key of a prepared reference.
+    
+    The key depends on the reference file content, not on its path.
+    """
+    
+    sha = hashlib.sha256(_file_hash(ref_structure).encode())
+    
+    for item in (selection, library, str(weights)):
+        sha.update(b"\0")
+        sha.update(item.encode())
+    
+    return sha.hexdigest()
+
+
+def prepare_reference(coordinates, weights=None):
+    """
+    Centres reference coordinates.
+    
+    Parameters
+    ----------
+    coordinates : np.ndarray, shape=(N, 3)
+        The selected atom coordinates.
+    
+    weights : np.ndarray, shape=(N,), optional
+        Per atom weights. Defaults to None, all atoms weight the same.
+    
+    Returns
+    -------
+    :class:`PreparedReference`
+    """
+    
+    coordinates = np.asarray(coordinates, dtype=np.float64)
+    
+    if weights is None:
+        weights = np.ones(coordinates.shape[0])
+    
+    weights = np.asarray(weights, dtype=np.float64)
+    
+    center = np.average(coordinates, axis=0, weights=weights)
+    
+    return PreparedReference(
+        coordinates=coordinates - center,
+        weights=weights,
+        )
+
+
+def get_reference(
+        ref_structure,
+        selection,
+        library,
+        parser,
+        *,
+        weights=None,
+        cache_folder=None,
+        ):
+    """
+    Returns the prepared reference for a structure and selection.
+    
+    Looks for the prepared reference in memory, then on disk,
+    and only if both fail parses <ref_structure>.
+    
+    Parameters
+    ----------
+    ref_structure : str
+        Path to the reference structure file.
+    
+    selection : str
+        The atom selection applied to the reference structure.
+    
+    library : str
+        Name identifying the MD library used to parse the structure.
+        Different libraries use different selection grammars and units.
+    
+    parser : callable
+        ``parser(ref_structure, selection)`` returns a tuple with the
+        selected coordinates, shape=(N, 3), and atom masses, shape=(N,).
+    
+    weights : {None, "mass"}
+        Defaults to None, atoms are not weighted.
+    
+    cache_folder : str or Path, optional
+        Defaults to :const:`tauren.core.cache_folder`.
+    
+    Returns
+    -------
+    :class:`PreparedReference`
+    
+    Exceptions
+    ----------
+    FileNotFoundError
+        If ref_structure does not exist.
+    
+    ValueError
+        If weights is not valid.
+    """
+    
+    if not Path(ref_structure).is_file():
+        raise FileNotFoundError(f"'{ref_structure}' does NOT exist.")
+    
+    if weights not in (None, "mass"):
+        raise ValueError(f"weights should be None or 'mass': '{weights}'")
+    
+    key = _gen_cache_key(ref_structure, selection, library, weights)
+    
+    try:
+        prepared = _memory_cache[key]
+    
+    except KeyError:
+        pass
+    
+    else:
+        cache_stats["hits"] += 1
+        return prepared
+    
+    cache_file = Path(cache_folder or core.cache_folder).joinpath(
+        "references",
+        f"{key}.npz",
+        )
+    
+    if cache_file.exists():
+        
+        try:
+            with np.load(cache_file) as cached:
+                prepared = PreparedReference(
+                    coordinates=cached["coordinates"],
+                    weights=cached["weights"],
+                    )
+        
+        except (OSError, ValueError, KeyError) as e:
+            log.debug(e)
+            log.info(f"* corrupted reference cache {cache_file}, rebuilding")
+        
+        else:
+            log.debug(f"reference {ref_structure} read from {cache_file}")
+            _memory_cache[key] = prepared
+            cache_stats["hits"] += 1
+            return prepared
+    
+    cache_stats["misses"] += 1
+    
+    log.info(f"* Preparing reference structure {ref_structure}")
+    
+    coordinates, masses = parser(ref_structure, selection)
+    
+    if len(coordinates) == 0:
+        raise ValueError(
+            f"selection '{selection}' is empty in '{ref_structure}'"
+            )
+    
+    prepared = prepare_reference(
+        coordinates,
+        weights=masses if weights == "mass" else None,
+        )
+    
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        
+        # concurrent runs may prepare the same reference
+        tmp_file = cache_file.with_name(f"{key}.{os.getpid()}.tmp.npz")
+        np.savez(
+            tmp_file,
+            coordinates=prepared.coordinates,
+            weights=prepared.weights,
+            )
+        os.replace(tmp_file, cache_file)
+    
+    except OSError as e:
+        log.debug(e)
+        log.info(f"* could not write reference cache to {cache_file}")
+    
+    _memory_cache[key] = prepared
+    
+    return prepared
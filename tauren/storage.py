@@ -0,0 +1,513 @@
+"""
+Tauren-MD storage of trajectory observables.
+
+Observables are stored in :class:`TrajObservables`, in memory, or in
+:class:`DiskTrajObservables`, on disk, under a :class:`StorageKey`.
+Their data is a :class:`StorageData` table or a :class:`ColumnarData`.
+"""
+# Copyright © 2018-2019 Tauren-MD Project
+#
+# Tauren-MD is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tauren-MD is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tauren-MD. If not, see <http://www.gnu.org/licenses/>.
+#
+# Contributors to this file:
+# - João M.C. Teixeira (https://github.com/joaomcteixeira)
+import itertools
+import tempfile
+from collections import OrderedDict, namedtuple
+from pathlib import Path
+
+import numpy as np
+
+from tauren import logger
+from tauren import tables
+
+log = logger.get_log(__name__)
+
+StorageKey = namedtuple(
+    "StorageKey",
+    [
+        "datatype",
+        "identifier",
+        "filenaming",
+        "selection",
+        "chains",
+        "version",
+        ],
+    defaults=(None, (), 0),
+    )
+"""
+Key of an observable, see :class:`TrajObservables`.
+``selection`` is the atom selection and ``chains`` the sorted tuple
+of chain identifiers the observable was calculated on.
+``version`` counts observables stored with otherwise equal keys.
+"""
+
+StorageData = namedtuple(
+    "StorageData",
+    [
+        "columns",
+        "data",
+        ],
+    )
+
+
+class ColumnarData:
+    """
+    Observable data stored column by column.
+    
+    The "frames" column is the int32 frame index shared by all
+    observables calculated on the same frame slicing, see
+    :attr:`tauren.tauren.TaurenTraj.frames_index`, and each other column is an
+    independent 1D array with its own dtype. Columns are returned
+    without copies by :meth:`column`.
+    
+    Behaves as :class:`StorageData` for reading: ``columns``,
+    ``data`` (a 2D float array built on access) and indexing
+    ``[0]`` and ``[1]``.
+    
+    Parameters
+    ----------
+    frames : np.ndarray of ints, shape=(N,)
+    
+    columns : list of str
+        The names of the value columns, "frames" excluded.
+    
+    values : list of np.ndarray, shape=(N,)
+        One array per column.
+    """
+    
+    def __init__(self, frames, columns, values):
+        
+        if len(columns) != len(values):
+            raise ValueError(
+                f"{len(columns)} columns given for {len(values)} values."
+                )
+        
+        for name, array in zip(columns, values):
+            if array.shape != frames.shape:
+                raise ValueError(
+                    f"column '{name}' shape {array.shape} does not match "
+                    f"frames shape {frames.shape}."
+                    )
+        
+        self._columns = ["frames", *columns]
+        self._arrays = [frames, *values]
+    
+    @property
+    def columns(self):
+        return list(self._columns)
+    
+    @property
+    def frames(self):
+        return self._arrays[0]
+    
+    def column(self, column):
+        """
+        Returns a column array, without copying.
+        
+        Parameters
+        ----------
+        column : str or int
+            The column name or position, "frames" is position 0.
+        """
+        
+        if isinstance(column, str):
+            try:
+                column = self._columns.index(column)
+            except ValueError:
+                raise KeyError(f"column '{column}' not in {self._columns}")
+        
+        return self._arrays[column]
+    
+    @property
+    def data(self):
+        """All columns as a 2D float array, built on each access."""
+        return np.column_stack(self._arrays).astype(np.float64, copy=False)
+    
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self._arrays)
+    
+    def __getitem__(self, item):
+        return (self.columns, self.data)[item]
+    
+    def __iter__(self):
+        yield self.columns
+        yield self.data
+    
+    def __len__(self):
+        return 2
+
+
+def chain_set(chains):
+    """
+    Returns the chain identifiers in <chains> as a sorted tuple
+    of str, as kept in :attr:`StorageKey.chains`.
+    """
+    
+    if isinstance(chains, str):
+        chains = chains.split(",")
+    
+    return tuple(sorted(set(map(str, chains))))
+
+
+class TrajObservables(dict):
+    """
+    Stores observables obtained from traj analysis.
+    
+    Keys are indexed by datatype, selection and chain set, see
+    :meth:`find` and :meth:`resolve`. Keys are never modified,
+    storing with an existing key stores under a new version of it.
+    """
+    
+    _indexed_fields = ("datatype", "selection", "chains")
+    
+    def __init__(self):
+        
+        super().__init__()
+        
+        # field -> value -> keys, insertion ordered dicts as sets
+        self._indexes = {field: {} for field in self._indexed_fields}
+    
+    def store(self, key, data):
+        """
+        Stored data with key.
+        
+        If <key> exists, data is stored with a new version of the
+        key, ``version`` is increased and ``_v<version>`` is
+        appended to ``filenaming``.
+        
+        Returns
+        -------
+        StorageKey
+            The key with which data was stored.
+        """
+        
+        if not(isinstance(key, StorageKey)):
+            raise TypeError(f"key should be namedtuple, '{type(key)}' given.")
+        
+        if not(isinstance(data, (StorageData, ColumnarData))):
+            raise TypeError(f"data sould be SorageData, '{type(data)}' given.")
+        
+        if key in self:
+            
+            log.warning(
+                "* WARNING *"
+                f" The storage keyword {key} already exists in the"
+                " trajectory observables data base."
+                )
+            
+            base, version = key, key.version
+            while key in self:
+                version += 1
+                key = base._replace(
+                    filenaming=f"{base.filenaming}_v{version}",
+                    version=version,
+                    )
+            
+            log.warning(
+                f" CHANGING KEY TO... {key}"
+                )
+            
+        self.setdefault(key, data)
+        self._index(key)
+        
+        return key
+    
+    def _index(self, key):
+        for field in self._indexed_fields:
+            keys = self._indexes[field].setdefault(getattr(key, field), {})
+            keys[key] = None
+    
+    def _unindex(self, key):
+        for field in self._indexed_fields:
+            keys = self._indexes[field][getattr(key, field)]
+            del keys[key]
+            if not keys:
+                del self._indexes[field][getattr(key, field)]
+    
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._unindex(key)
+    
+    def pop(self, key, *default):
+        
+        if key not in self:
+            return dict.pop(self, key, *default)
+        
+        data = self[key]
+        del self[key]
+        
+        return data
+    
+    def find(self, datatype=None, selection=None, chains=None):
+        """
+        Returns the keys matching all given fields, in storing order.
+        
+        Parameters
+        ----------
+        datatype : str, optional
+        
+        selection : str, optional
+        
+        chains : str or list, optional
+            Chain identifiers, a comma separated str or a list,
+            matches keys calculated on exactly these chains.
+        """
+        
+        if chains is not None:
+            chains = chain_set(chains)
+        
+        matches = [
+            self._indexes[field].get(value, {})
+            for field, value in zip(
+                self._indexed_fields,
+                (datatype, selection, chains),
+                )
+            if value is not None
+            ]
+        
+        if not matches:
+            return list(self)
+        
+        smallest = min(matches, key=len)
+        
+        return [
+            key
+            for key in smallest
+            if all(key in keys for keys in matches)
+            ]
+    
+    def resolve(
+            self,
+            datatype,
+            selection=None,
+            chains=None,
+            version=None,
+            ):
+        """
+        Returns the key of an observable.
+        
+        Parameters are as in :meth:`find`.
+        
+        Parameters
+        ----------
+        version : int, optional
+            Defaults to None, the last stored key.
+        
+        Raises
+        ------
+        KeyError
+            If no key matches.
+        """
+        
+        keys = self.find(datatype, selection, chains)
+        
+        if version is not None:
+            keys = [key for key in keys if key.version == version]
+        
+        if not keys:
+            raise KeyError(
+                f"No observable for datatype '{datatype}', "
+                f"selection '{selection}', chains '{chains}' "
+                f"and version '{version}'."
+                )
+        
+        return keys[-1]
+    
+    def column(self, key, column):
+        """
+        Returns a column of the observable stored with <key>.
+        
+        Columns are returned without copying the data.
+        
+        Parameters
+        ----------
+        key : StorageKey
+        
+        column : str or int
+            The column name or position, "frames" is position 0.
+        """
+        
+        observable = self[key]
+        
+        if isinstance(observable, ColumnarData):
+            return observable.column(column)
+        
+        if isinstance(column, str):
+            column = observable.columns.index(column)
+        
+        return observable.data[:, column]
+
+
+class DiskTrajObservables(TrajObservables):
+    """
+    Stores observables on disk, keeping only recently used ones
+    in memory.
+    
+    Each observable is written to a memory mappable raw table
+    (see :mod:`tauren.tables`) when stored. Observables in memory
+    are kept in least recently used order and the oldest are
+    released when their total size exceeds <budget_mb>; released
+    observables are read from disk again when accessed.
+    
+    Has the same interface as :class:`TrajObservables`.
+    
+    Parameters
+    ----------
+    folder : str, optional
+        Folder where observables are written.
+        Defaults to None, a new temporary folder removed with the
+        store or at exit.
+    
+    budget_mb : float, optional
+        Memory budget in megabytes for observables kept in memory.
+        The most recently used observable is always kept.
+        Defaults to 256.
+    """
+    
+    def __init__(self, folder=None, budget_mb=256):
+        
+        super().__init__()
+        
+        self._temp_folder = None
+        
+        if folder is None:
+            self._temp_folder = tempfile.TemporaryDirectory(
+                prefix="tauren_observables_",
+                )
+            folder = self._temp_folder.name
+        
+        self.folder = Path(folder)
+        self.folder.mkdir(parents=True, exist_ok=True)
+        
+        self.budget = int(budget_mb * 1024 ** 2)
+        self._resident = OrderedDict()
+        self._file_numbers = itertools.count()
+        
+        # the read only frames columns of columnar observables, shared
+        # again when observables are read back, see
+        # tauren.tauren.TaurenTraj.frames_index
+        self._frames_indexes = []
+        
+        log.info(f"* Observables stored in {self.folder}")
+    
+    @property
+    def resident_bytes(self):
+        """Size of the observables kept in memory."""
+        return sum(
+            d.nbytes if isinstance(d, ColumnarData) else d.data.nbytes
+            for d in self._resident.values()
+            )
+    
+    def _keep(self, key, data):
+        
+        self._resident[key] = data
+        self._resident.move_to_end(key)
+        
+        while len(self._resident) > 1 \
+                and self.resident_bytes > self.budget:
+            
+            released, _ = self._resident.popitem(last=False)
+            log.debug(f"released from memory: {released}")
+    
+    def setdefault(self, key, data):
+        
+        if key in self:
+            return self[key]
+        
+        file_name = str(
+            self.folder.joinpath(f"{next(self._file_numbers):06d}.raw")
+            )
+        
+        columnar = isinstance(data, ColumnarData)
+        
+        tables.write_table(
+            file_name,
+            data.data,
+            data.columns,
+            key=key,
+            format="raw",
+            extra_metadata={"columnar": columnar},
+            )
+        
+        if columnar and not data.column("frames").flags.writeable:
+            self._share_frames(data.column("frames"))
+        
+        dict.__setitem__(self, key, file_name)
+        self._keep(key, data)
+        
+        return data
+    
+    def __getitem__(self, key):
+        
+        if key in self._resident:
+            self._resident.move_to_end(key)
+            return self._resident[key]
+        
+        file_name = dict.__getitem__(self, key)
+        columns, data, metadata = tables.read_table(file_name, format="raw")
+        
+        if metadata.get("columnar"):
+            observable = ColumnarData(
+                self._share_frames(data[:, 0].astype(np.int32)),
+                columns[1:],
+                [np.ascontiguousarray(column) for column in data[:, 1:].T],
+                )
+        
+        else:
+            observable = StorageData(columns=columns, data=data)
+        
+        self._keep(key, observable)
+        
+        return observable
+    
+    def _share_frames(self, frames):
+        """
+        Returns the frames index equal to <frames> already known,
+        or <frames>, read only, as a new one.
+        """
+        
+        for frames_index in self._frames_indexes:
+            if np.array_equal(frames_index, frames):
+                return frames_index
+        
+        if frames.flags.writeable:
+            frames = frames.copy()
+            frames.flags.writeable = False
+        
+        self._frames_indexes.append(frames)
+        
+        return frames
+    
+    def __delitem__(self, key):
+        
+        file_name = dict.__getitem__(self, key)
+        super().__delitem__(key)
+        
+        self._resident.pop(key, None)
+        Path(file_name).unlink()
+    
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+    
+    def values(self):
+        """Yields the observables, read from disk one at a time."""
+        for key in self:
+            yield self[key]
+    
+    def items(self):
+        """Yields (key, observable), read from disk one at a time."""
+        for key in self:
+            yield key, self[key]
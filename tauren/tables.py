@@ -0,0 +1,589 @@
+"""
+Tauren-MD data tables export formats.
+
+Observables are exported as tables whose first column is usually the
+frames. Besides text (csv), tables can be exported to binary formats,
+chosen by file extension or by name:
+
+    - "npy": a single Fortran ordered array, metadata in a
+      "<file>.json" side file.
+    - "npz": one array per column.
+    - "hdf5": a chunked and compressed dataset, requires ``h5py``.
+    - "raw": a JSON header followed by the column-major array,
+      ready for ``np.memmap``.
+
+The column names and the storage key are kept in all binary formats.
+Columns are stored contiguously, :func:`read_column` loads a single
+column without reading the whole table.
+
+:func:`format_text_table` renders the summary tables Tauren-MD logs.
+"""
+# Copyright © 2018-2019 Tauren-MD Project
+#
+# Tauren-MD is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tauren-MD is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tauren-MD. If not, see <http://www.gnu.org/licenses/>.
+#
+# Contributors to this file:
+# - João M.C. Teixeira (https://github.com/joaomcteixeira)
+import json
+import os
+import struct
+
+import numpy as np
+
+from tauren import logger
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+log = logger.get_log(__name__)
+
+formats_ext = {
+    "csv": ".csv",
+    "npy": ".npy",
+    "npz": ".npz",
+    "hdf5": ".h5",
+    "raw": ".raw",
+    }
+"""Default file extension of each table format."""
+
+_ext_formats = {
+    ".npy": "npy",
+    ".npz": "npz",
+    ".h5": "hdf5",
+    ".hdf5": "hdf5",
+    ".raw": "raw",
+    }
+
+RAW_MAGIC = b"TAURENRAW"
+_RAW_ALIGN = 64
+
+
+def get_format(file_name, format=None):
+    """
+    Returns the table format for a file name.
+    
+    Parameters
+    ----------
+    file_name : str
+    
+    format : str, optional
+        One of :data:`formats_ext` keys. Overrides the extension.
+        Defaults to None, the format is taken from the extension,
+        unknown extensions are text ("csv").
+    """
+    
+    if format is not None:
+        
+        if format not in formats_ext:
+            raise ValueError(
+                f"table format should be one of {list(formats_ext)}: "
+                f"'{format}' given."
+                )
+        
+        return format
+    
+    return _ext_formats.get(os.path.splitext(file_name)[1].lower(), "csv")
+
+
+def format_text_table(header, rows):
+    """
+    Returns a text table whose last row is the totals row.
+    
+    The first column is left aligned and the others right aligned.
+    
+    Parameters
+    ----------
+    header : tuple of str
+    
+    rows : list of tuples of str
+        The last row is separated from the others.
+    """
+    
+    widths = [
+        max(len(row[ii]) for row in rows + [header])
+        for ii in range(len(header))
+        ]
+    
+    def line(row):
+        return "  ".join(
+            cell.ljust(w) if ii == 0 else cell.rjust(w)
+            for ii, (cell, w) in enumerate(zip(row, widths))
+            )
+    
+    separator = "  ".join("-" * w for w in widths)
+    
+    return "\n".join(
+        [line(header), separator]
+        + [line(row) for row in rows[:-1]]
+        + [separator, line(rows[-1])]
+        )
+
+
+def _gen_metadata(columns, key, header, extra_metadata=None):
+    
+    return {
+        **(extra_metadata or {}),
+        "columns": list(columns),
+        "key": dict(key._asdict()) if hasattr(key, "_asdict") else key,
+        "header": header,
+        }
+
+
+def _require_h5py():
+    
+    if h5py is None:
+        raise ImportError(
+            "HDF5 tables require the h5py package: pip install h5py"
+            )
+
+
+def write_table(
+        file_name,
+        data,
+        columns,
+        *,
+        key=None,
+        header="",
+        format=None,
+        sep=",",
+        extra_metadata=None,
+        ):
+    """
+    Writes a table to file.
+    
+    Parameters
+    ----------
+    file_name : str
+    
+    data : np.ndarray, shape=(rows, columns)
+    
+    columns : list of str
+        The column names.
+    
+    key : StorageKey, optional
+        The observable storage key, kept as metadata.
+    
+    header : str, optional
+        Any text to keep with the table.
+    
+    format : str, optional
+        See :func:`get_format`.
+    
+    sep : str, optional
+        The column separator of text tables.
+    
+    extra_metadata : dict, optional
+        JSON serializable items kept in the metadata of binary
+        tables, see :func:`read_metadata`.
+    
+    Returns
+    -------
+    str
+        The format used.
+    """
+    
+    format = get_format(file_name, format)
+    data = np.asarray(data)
+    
+    if data.ndim != 2 or data.shape[1] != len(columns):
+        raise ValueError(
+            f"data shape {data.shape} does not match "
+            f"{len(columns)} columns."
+            )
+    
+    metadata = _gen_metadata(columns, key, header, extra_metadata)
+    
+    if format == "csv":
+        
+        np.savetxt(
+            file_name,
+            data,
+            delimiter=sep,
+            header=f"{key}\n{header}\n{','.join(columns)}",
+            )
+    
+    elif format == "npy":
+        
+        # file handles keep numpy from changing the extension
+        with open(file_name, "wb") as fh:
+            np.save(fh, np.asfortranarray(data))
+        
+        with open(f"{file_name}.json", "w") as fh:
+            json.dump(metadata, fh)
+    
+    elif format == "npz":
+        
+        with open(file_name, "wb") as fh:
+            np.savez(
+                fh,
+                __metadata__=np.array(json.dumps(metadata)),
+                **{f"col{ii}": data[:, ii] for ii in range(data.shape[1])},
+                )
+    
+    elif format == "hdf5":
+        
+        _require_h5py()
+        
+        with h5py.File(file_name, "w") as fh:
+            dataset = fh.create_dataset(
+                "data",
+                data=data,
+                chunks=(min(len(data), 65536) or 1, 1),
+                compression="gzip",
+                shuffle=True,
+                )
+            dataset.attrs["metadata"] = json.dumps(metadata)
+    
+    elif format == "raw":
+        
+        metadata["dtype"] = data.dtype.str
+        metadata["shape"] = list(data.shape)
+        metadata["order"] = "F"
+        
+        with open(file_name, "wb") as fh:
+            fh.write(_gen_raw_header(metadata))
+            fh.write(np.asfortranarray(data).tobytes(order="F"))
+    
+    return format
+
+
+def default_file_name(key, format=None):
+    """
+    Returns the default export file name for an observable key.
+    """
+    return f"{key.datatype}_{key.filenaming}{formats_ext[format or 'csv']}"
+
+
+def _gen_raw_header(metadata, min_length=0):
+    """
+    Returns the raw table header bytes, padded so that data starts
+    aligned and the header is at least <min_length> bytes.
+    """
+    
+    header_bytes = json.dumps(metadata).encode()
+    offset = max(len(RAW_MAGIC) + 8 + len(header_bytes), min_length)
+    padding = offset - len(RAW_MAGIC) - 8 - len(header_bytes)
+    padding += -offset % _RAW_ALIGN
+    
+    return b"".join((
+        RAW_MAGIC,
+        struct.pack("<Q", len(header_bytes) + padding),
+        header_bytes,
+        b" " * padding,
+        ))
+
+
+class TableStream:
+    """
+    Appends rows to a table file while they are calculated.
+    
+    Rows are written as they are appended and the file is flushed
+    to disk every <flush_every> appends, so an interrupted run keeps
+    the rows written until the last flush and memory does not depend
+    on the number of rows.
+    
+    Supports "csv" and "raw" tables. Raw stream tables are row-major
+    and their header is updated on every flush, they are read with
+    :func:`read_table` and :func:`read_column` as any raw table.
+    
+    Parameters
+    ----------
+    file_name : str
+    
+    columns : list of str
+    
+    key : StorageKey, optional
+    
+    header : str, optional
+    
+    format : str, optional
+        See :func:`get_format`.
+    
+    sep : str, optional
+        The column separator of text tables.
+    
+    flush_every : int, optional
+        Number of appends between flushes. Defaults to 1.
+    """
+    
+    # large enough for any number of rows
+    _raw_rows_placeholder = 10 ** 18
+    
+    def __init__(
+            self,
+            file_name,
+            columns,
+            *,
+            key=None,
+            header="",
+            format=None,
+            sep=",",
+            flush_every=1,
+            ):
+        
+        self.file_name = file_name
+        self.columns = list(columns)
+        self.format = get_format(file_name, format)
+        self.sep = sep
+        self.flush_every = flush_every
+        self.n_rows = 0
+        self._appends = 0
+        
+        if self.format not in ("csv", "raw"):
+            raise ValueError(
+                f"tables can be streamed as 'csv' or 'raw': "
+                f"'{self.format}' given."
+                )
+        
+        if not isinstance(flush_every, int) or flush_every < 1:
+            raise ValueError(
+                f"flush_every should be a positive integer: '{flush_every}'"
+                )
+        
+        self._metadata = _gen_metadata(columns, key, header)
+        
+        if self.format == "csv":
+            
+            self._fh = open(file_name, "w")
+            self._fh.write("".join(
+                f"# {line}\n"
+                for line in f"{key}\n{header}\n{','.join(columns)}".split("\n")
+                ))
+        
+        else:
+            
+            self._metadata["dtype"] = np.dtype(np.float64).str
+            self._metadata["order"] = "C"
+            self._fh = open(file_name, "wb")
+            self._header_length = len(self._raw_header(
+                self._raw_rows_placeholder,
+                ))
+            self._fh.write(self._raw_header(0))
+    
+    def _raw_header(self, n_rows):
+        
+        self._metadata["shape"] = [n_rows, len(self.columns)]
+        
+        return _gen_raw_header(
+            self._metadata,
+            min_length=getattr(self, "_header_length", 0),
+            )
+    
+    def append(self, rows):
+        """
+        Appends rows, np.ndarray of shape=(k, columns).
+        """
+        
+        rows = np.asarray(rows, dtype=np.float64)
+        
+        if rows.ndim != 2 or rows.shape[1] != len(self.columns):
+            raise ValueError(
+                f"rows shape {rows.shape} does not match "
+                f"{len(self.columns)} columns."
+                )
+        
+        if self.format == "csv":
+            np.savetxt(self._fh, rows, delimiter=self.sep)
+        else:
+            self._fh.write(np.ascontiguousarray(rows).tobytes())
+        
+        self.n_rows += rows.shape[0]
+        self._appends += 1
+        
+        if self._appends % self.flush_every == 0:
+            self.flush()
+    
+    def flush(self):
+        """Writes buffered rows to disk."""
+        
+        if self.format == "raw":
+            position = self._fh.tell()
+            self._fh.flush()
+            self._fh.seek(0)
+            self._fh.write(self._raw_header(self.n_rows))
+            self._fh.seek(position)
+        
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+    
+    def close(self):
+        self.flush()
+        self._fh.close()
+    
+    def load(self):
+        """
+        Returns the table data.
+        
+        Raw tables are memory mapped, csv tables are read in memory.
+        """
+        
+        if self.format == "raw":
+            return _memmap_raw(self.file_name)
+        
+        return np.loadtxt(self.file_name, delimiter=self.sep, ndmin=2)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *args):
+        self.close()
+
+
+def read_metadata(file_name, format=None):
+    """
+    Returns the metadata of a binary table.
+    
+    A dictionary with "columns", "key" and "header" keys, and
+    the extra metadata the table was written with.
+    """
+    
+    format = get_format(file_name, format)
+    
+    if format == "npy":
+        with open(f"{file_name}.json", "r") as fh:
+            return json.load(fh)
+    
+    elif format == "npz":
+        with np.load(file_name) as npz:
+            return json.loads(str(npz["__metadata__"]))
+    
+    elif format == "hdf5":
+        _require_h5py()
+        with h5py.File(file_name, "r") as fh:
+            return json.loads(fh["data"].attrs["metadata"])
+    
+    elif format == "raw":
+        return _read_raw_header(file_name)[0]
+    
+    raise ValueError(f"'{format}' tables do not carry metadata.")
+
+
+def _read_raw_header(file_name):
+    
+    with open(file_name, "rb") as fh:
+        
+        if fh.read(len(RAW_MAGIC)) != RAW_MAGIC:
+            raise ValueError(f"'{file_name}' is not a Tauren-MD raw table.")
+        
+        header_length = struct.unpack("<Q", fh.read(8))[0]
+        metadata = json.loads(fh.read(header_length))
+    
+    return metadata, len(RAW_MAGIC) + 8 + header_length
+
+
+def _memmap_raw(file_name):
+    
+    metadata, offset = _read_raw_header(file_name)
+    
+    return np.memmap(
+        file_name,
+        dtype=np.dtype(metadata["dtype"]),
+        mode="r",
+        offset=offset,
+        shape=tuple(metadata["shape"]),
+        order=metadata["order"],
+        )
+
+
+def _column_position(columns, column):
+    
+    if isinstance(column, (int, np.integer)):
+        return int(column)
+    
+    try:
+        return columns.index(column)
+    
+    except ValueError:
+        raise KeyError(f"column '{column}' not in table: {columns}")
+
+
+def read_column(file_name, column, format=None):
+    """
+    Reads a single column of a binary table.
+    
+    Only the requested column is read from disk.
+    
+    Parameters
+    ----------
+    file_name : str
+    
+    column : str or int
+        The column name or position.
+    
+    format : str, optional
+        See :func:`get_format`.
+    
+    Returns
+    -------
+    np.ndarray, shape=(rows,)
+    """
+    
+    format = get_format(file_name, format)
+    
+    if format == "csv":
+        raise ValueError("Single column reading requires a binary table.")
+    
+    position = _column_position(
+        read_metadata(file_name, format)["columns"],
+        column,
+        )
+    
+    if format == "npy":
+        return np.array(np.load(file_name, mmap_mode="r")[:, position])
+    
+    elif format == "npz":
+        with np.load(file_name) as npz:
+            return npz[f"col{position}"]
+    
+    elif format == "hdf5":
+        with h5py.File(file_name, "r") as fh:
+            return fh["data"][:, position]
+    
+    elif format == "raw":
+        return np.array(_memmap_raw(file_name)[:, position])
+
+
+def read_table(file_name, format=None):
+    """
+    Reads a binary table.
+    
+    Returns
+    -------
+    tuple
+        (columns, data, metadata)
+    """
+    
+    format = get_format(file_name, format)
+    metadata = read_metadata(file_name, format)
+    columns = metadata["columns"]
+    
+    if format == "npy":
+        data = np.load(file_name)
+    
+    elif format == "npz":
+        with np.load(file_name) as npz:
+            data = np.column_stack(
+                [npz[f"col{ii}"] for ii in range(len(columns))]
+                )
+    
+    elif format == "hdf5":
+        with h5py.File(file_name, "r") as fh:
+            data = fh["data"][:]
+    
+    elif format == "raw":
+        data = np.array(_memmap_raw(file_name))
+    
+    return columns, data, metadata
@@ -18,8 +18,11 @@ Tauren-MD trajectory objects.
 #
 # Contributors to this file:
 # - João M.C. Teixeira (https://github.com/joaomcteixeira)
+import itertools
+import os
 import sys
-import string
+import tempfile
+from pathlib import Path
 from collections import namedtuple
 import numpy as np
 
@@ -29,27 +32,67 @@ import mdtraj
 import MDAnalysis as mda
 from MDAnalysis.analysis import align as mdaalign
 from MDAnalysis.analysis.rms import RMSD as mdaRMSD
+from MDAnalysis.analysis.rms import rmsd as mdarmsd
+from MDAnalysis.coordinates.memory import MemoryReader
 
+from tauren import cache
+from tauren import calc
+from tauren import compressed
+from tauren import framepass
 from tauren import logger
+from tauren import memory
+from tauren import parallel
+from tauren import reference
+from tauren import storage
+from tauren import tables
+from tauren import writers
 
 log = logger.get_log(__name__)
 
-StorageKey = namedtuple(
-    "StorageKey",
+FittedChunks = namedtuple(
+    "FittedChunks",
     [
-        "datatype",
-        "identifier",
-        "filenaming",
+        "reference",
+        "atom_indexes",
+        "residue_indexes",
+        "chunks",
         ],
     )
+"""
+Coordinates fitted to a reference, see :meth:`TaurenTraj._fit_chunks`.
+``reference`` has shape=(N, 3), ``atom_indexes`` and ``residue_indexes``
+the topology indexes of the N atoms.
+"""
 
-StorageData = namedtuple(
-    "StorageData",
-    [
-        "columns",
-        "data",
-        ],
-    )
+def _frames_from_string(frames, n_frames):
+    """
+    Returns the frames (indexed at 1) a <frames> string of
+    :meth:`TaurenTraj.frames2file` selects in <n_frames> frames.
+    
+    Frames beyond <n_frames> given by number are not removed.
+    
+    Raises
+    ------
+    ValueError
+        If <frames> is not of a valid format, "all" included.
+    """
+    
+    if frames.isdigit():
+        return [int(frames)]
+    
+    if "," in frames and frames.replace(",", "").isdigit():
+        return [int(f) for f in frames.split(",")]
+    
+    if ":" in frames and frames.replace(":", "").isdigit() \
+            and frames.count(":") <= 2:
+        
+        parts = [int(p) if p else None for p in frames.split(":")]
+        start, end, step = (parts + [None])[:3]
+        start = start - 1 if start else None
+        
+        return list(range(1, n_frames + 1))[start:end:step]
+    
+    raise ValueError(f"<frames> not of valid format: '{frames}'")
 
 
 class TaurenTraj(ABC):
@@ -60,8 +103,16 @@ class TaurenTraj(ABC):
     _err_frame_index = \
         "    frame '{}' does NOT exist in trajectory, ignoring..."
     
+    _length_unit = 1.0
+    """Length unit of the MD library in Angstroms."""
+    
+    _concurrent_frame_reads = False
+    """Whether frames can be read by several threads at once."""
+    
     def __init__(self):
         
+        self._frames_index = None
+        
         self._set_full_frames_list()
         self._update_traj_slicer(
             start=0,
@@ -72,6 +123,17 @@ class TaurenTraj(ABC):
         self.observables = None
         self._rmsds_counter = 0
         
+        self.results_cache = None
+        self.memory_budget = None
+        self.input_files = []
+        self.transformations = []
+        
+        # results of frame passes waiting for their calc_* call,
+        # see :mod:`tauren.framepass`
+        self._pass_results = {}
+        
+        self._update_chain_index()
+        
         return
     
     # @property
@@ -99,7 +161,220 @@ class TaurenTraj(ABC):
     
     @observables.setter
     def observables(self, obs=None):
-        self._observables = obs or TrajObservables()
+        self._observables = (
+            obs if obs is not None else storage.TrajObservables()
+            )
+    
+    def set_observables_store(
+            self,
+            store="memory",
+            folder=None,
+            budget_mb=256,
+            **kwargs
+            ):
+        """
+        Sets where observables are stored.
+        
+        Observables already calculated are moved to the new store.
+        
+        Parameters
+        ----------
+        store : str, optional ["memory", "disk"]
+            "memory" keeps all observables in memory.
+            "disk" writes observables to <folder> and keeps only the
+            recently used in memory, see
+            :class:`tauren.storage.DiskTrajObservables`.
+            Defaults to "memory".
+        
+        folder : str, optional
+            The folder for the "disk" store.
+            Defaults to None, a temporary folder.
+        
+        budget_mb : float, optional
+            Memory budget in megabytes of the "disk" store.
+            Defaults to 256.
+        """
+        
+        if store == "memory":
+            new_store = storage.TrajObservables()
+        
+        elif store == "disk":
+            new_store = storage.DiskTrajObservables(
+                folder=folder,
+                budget_mb=budget_mb,
+                )
+        
+        else:
+            raise ValueError(
+                f"<store> should be 'memory' or 'disk': '{store}' given."
+                )
+        
+        for key, data in self.observables.items():
+            new_store.store(key, data)
+        
+        self.observables = new_store
+        
+        return
+    
+    def set_results_cache(
+            self,
+            enabled=True,
+            folder=None,
+            max_size_mb=1024,
+            **kwargs
+            ):
+        """
+        Enables the persistent cache of calculated observables.
+        
+        When enabled, calc_* methods whose input files,
+        trajectory transformations, parameters, atom selection and
+        frame slicing match a previous calculation read the
+        observable from the cache, see :mod:`tauren.cache`.
+        
+        Parameters
+        ----------
+        enabled : bool, optional
+            Defaults to True. False disables the cache.
+        
+        folder : str, optional
+            Defaults to None, the "results" folder in
+            :const:`tauren.core.cache_folder`.
+        
+        max_size_mb : float, optional
+            Maximum size of the cache in megabytes, least recently
+            used observables are removed first.
+            Defaults to 1024.
+        """
+        
+        if not enabled:
+            self.results_cache = None
+            return
+        
+        self.results_cache = cache.ResultsCache(
+            folder=folder,
+            max_size_mb=max_size_mb,
+            )
+        
+        log.info(f"* Results cache in {self.results_cache.folder}")
+        
+        return
+    
+    def set_memory_budget(self, max_memory=None, **kwargs):
+        """
+        Sets the maximum memory the chunked code paths hold.
+        
+        Trajectory export, RMSF and per residue RMSD calculations,
+        frame passes and frame extraction derive the number of frames
+        they hold at once from the memory left after the coordinates
+        the MD library holds and the bytes per frame of the current
+        atom selection, see :mod:`tauren.memory`. Chunk sizes given
+        explicitly to those methods are reduced to fit.
+        The chosen chunk sizes are logged.
+        
+        Parameters
+        ----------
+        max_memory : int, float or str, optional
+            Megabytes, or a size with a unit, for example "16GB".
+            Defaults to None, no budget: default chunk sizes.
+        """
+        
+        if max_memory is None:
+            self.memory_budget = None
+            return
+        
+        self.memory_budget = memory.MemoryBudget(max_memory)
+        
+        log.info(
+            f"* Memory budget {self.memory_budget}, "
+            f"{memory.human_bytes(self._resident_bytes())} "
+            "held by the trajectory"
+            )
+        
+        return
+    
+    def _resident_bytes(self):
+        """
+        Bytes of the coordinates the MD library holds in memory.
+        """
+        return 0
+    
+    def _chunk_size(
+            self,
+            chunk_size,
+            n_atoms,
+            label,
+            atom_bytes=memory.coordinate_bytes,
+            ):
+        """
+        Returns the number of frames a chunked code path holds at once.
+        
+        Parameters
+        ----------
+        chunk_size : int or None
+            The chunk size given to the code path, None for the
+            default or, with a memory budget, the frames that fit.
+            With a memory budget, larger chunk sizes are reduced.
+        
+        n_atoms : int
+            Atoms read per frame.
+        
+        label : str
+            Reported with the chosen chunk size.
+        
+        atom_bytes : int, optional
+            Bytes held per atom and frame, including copies.
+            Defaults to one copy of float32 coordinates.
+        """
+        
+        if self.memory_budget is None:
+            return chunk_size or memory.default_chunk_size
+        
+        fitting = self.memory_budget.chunk_frames(
+            n_atoms * atom_bytes,
+            resident=self._resident_bytes(),
+            n_frames=self.n_frames,
+            label=label,
+            )
+        
+        if chunk_size is None:
+            return fitting
+        
+        if chunk_size > fitting:
+            log.info(
+                f"    chunk size {chunk_size} reduced to {fitting} frames"
+                )
+        
+        return min(chunk_size, fitting)
+    
+    def _fits_memory(self, nbytes, label=None):
+        """
+        Whether a copy of <nbytes> fits in the memory budget,
+        always True without budget.
+        
+        If not, a warning is logged for the <label> code path.
+        """
+        
+        if self.memory_budget is None \
+                or self.memory_budget.fits(nbytes, self._resident_bytes()):
+            return True
+        
+        if label is None:
+            return False
+        
+        log.info(
+            f"    * WARNING * '{label}' copies "
+            f"{memory.human_bytes(nbytes)}, over the "
+            f"{self.memory_budget} memory budget"
+            )
+        
+        return False
+    
+    def _record_transformation(self, name, **parameters):
+        """
+        Records a transformation of the trajectory, transformations
+        are part of the results cache keys.
+        """
+        self.transformations.append([name, parameters])
     
     @abstractmethod
     def _set_full_frames_list(self, num_frames):
@@ -122,6 +397,25 @@ class TaurenTraj(ABC):
         """
         return self.full_frames_list[self._fslicer]
     
+    @property
+    def frames_index(self):
+        """
+        The frames of the current frame slicing as a read only
+        int32 array.
+        
+        The same array is returned while the slicing does not change
+        and it is shared by the observables calculated on it.
+        """
+        
+        if self._frames_index is None \
+                or self._frames_index[0] != self.slice_tuple:
+            
+            index = np.array(self.sliced_frames_list, dtype=np.int32)
+            index.flags.writeable = False
+            self._frames_index = (self.slice_tuple, index)
+        
+        return self._frames_index[1]
+    
     @property
     def slice_tuple(self):
         """
@@ -217,6 +511,58 @@ class TaurenTraj(ABC):
         """
         pass
     
+    @property
+    def chain_index(self):
+        """
+        Dictionary mapping chain identifiers (str) to np.ndarrays
+        with the chain's atom indexes in the loaded topology.
+        """
+        return self._chain_index
+    
+    def _update_chain_index(self):
+        """
+        (Re)generates :attr:`chain_index`.
+        
+        Must be called whenever the topology of the loaded
+        trajectory changes, for example, after removing solvent.
+        """
+        
+        self._chain_index = self._gen_chain_index()
+        
+        log.debug(f"<chain_index>: {list(self._chain_index.keys())}")
+        
+        return
+    
+    @abstractmethod
+    def _gen_chain_index(self):
+        """
+        MD analysis library specific implementation.
+        
+        Returns
+        -------
+        dict
+            Chain identifiers (str) as keys and np.ndarrays
+            of atom indexes as values.
+        """
+        pass
+    
+    def _filter_existent_chains(self, chain_list):
+        """
+        Returns the chain identifiers (str) of <chain_list> that
+        exist in :attr:`chain_index`, keeping order.
+        """
+        
+        chains = []
+        for chain in map(str, chain_list):
+            
+            if chain not in self.chain_index:
+                log.debug(f"chain {chain} does not exist")
+                continue
+            
+            chains.append(chain)
+        
+        return chains
+    
     def _update_traj_slicer(
             self,
             start,
@@ -287,6 +633,7 @@ class TaurenTraj(ABC):
         """
         
         self._remove_solvent(**kwargs)
+        self._record_transformation("remove_solvent", **kwargs)
     
     @abstractmethod
     def _remove_solvent(self):
@@ -320,6 +667,13 @@ class TaurenTraj(ABC):
             inplace,
             )
         
+        self._record_transformation(
+            "align_traj",
+            weights=weights,
+            inplace=inplace,
+            slice=self.slice_tuple,
+            )
+        
         log.info("    done")
         
         return
@@ -447,6 +801,10 @@ class TaurenTraj(ABC):
             frames="all",
             prefix="_",
             ext="pdb",
+            workers=None,
+            processes=False,
+            output="files",
+            file_name=None,
             ):
         """
         Extracts trajectory frames to PDB files using prefix name.
@@ -457,6 +815,9 @@ class TaurenTraj(ABC):
             Frame or range of frames to extract.
             Defaults to "all": extract all frames from current slicing.
             
+            Frames other than "all" are numbers (starting at 1) of
+            the input trajectory, whatever the current slicing.
+            
             A frame range can be defined as follows:
             End values are INCLUSIVE.
                 - "1"           -> the first frame
@@ -472,9 +833,37 @@ class TaurenTraj(ABC):
         
         ext : str, optional ["pdb"]
             The file extention to which the frames are saved.
-            Deppending on the trajectory type used the allowed
-            file types may differ. Reffer to the documentation of
-            the MD analysis library you are using.
+            "pdb", "gro" and "xyz" are written by Tauren-MD,
+            see :mod:`tauren.writers`. For other extensions the
+            allowed file types depend on the trajectory type used,
+            reffer to the documentation of the MD analysis library
+            you are using.
+        
+        workers : int, optional
+            Number of workers writing files concurrently.
+            Defaults to None, the number of CPUs.
+        
+        processes : bool, optional
+            Whether workers are processes instead of threads.
+            Processes do not compete for the Python interpreter but
+            each frame must be sent to the worker.
+            Defaults to False.
+        
+        output : str, optional ["files", "multimodel", "zip", "tar"]
+            "files" writes one file per frame.
+            "multimodel" writes all frames to a single PDB file,
+            the MODEL serial number is the frame number.
+            "zip" and "tar" write one file per frame as members of a
+            single uncompressed archive together with an
+            "index.csv" member relating member names and frames.
+            Frames are streamed to the single file outputs,
+            <workers> and <processes> are ignored for those.
+            Defaults to "files".
+        
+        file_name : str, optional
+            The file name for single file outputs.
+            Defaults to "<prefix>frames.pdb" for "multimodel" and
+            "<prefix>frames.zip" or "<prefix>frames.tar" for archives.
         
         Exceptions
         ----------
@@ -483,7 +872,7 @@ class TaurenTraj(ABC):
             
         ValueError
             If frames string is not consistent with parameter
-            description.
+            description or if output is not a valid option.
         """
         
         log.info("* Extracting frames...")
@@ -491,6 +880,86 @@ class TaurenTraj(ABC):
         log.debug(f"<frames>: {frames}")
         log.debug(f"<prefix>: {prefix}")
         log.debug(f"<ext>: {ext}")
+        log.debug(f"<output>: {output}")
+        
+        if output not in writers.frames_outputs:
+            raise ValueError(
+                f"<output> should be one of {writers.frames_outputs}: "
+                f"'{output}' given."
+                )
+        
+        frames_list, pdb_name_fmt, ext, file_name = \
+            self._resolve_frames2file(frames, prefix, ext, output, file_name)
+        
+        n_atoms = len(self._select_atom_indexes(self.atom_selection))
+        
+        if n_atoms == 0:
+            log.info(
+                "   * EMPTY SELECTION ERROR *"
+                f" The atom selection provided '{self.atom_selection}'"
+                " gives an empty selection.\n"
+                "* Aborting calculation..."
+                )
+            sys.exit(1)
+        
+        workers = parallel.get_workers(workers)
+        
+        if output == "files":
+            # frames read and formatted, waiting for the workers
+            max_pending = self._chunk_size(
+                2 * workers,
+                n_atoms,
+                "frames2file",
+                atom_bytes=memory.coordinate_bytes
+                + memory.text_bytes_per_atom,
+                )
+        
+        if output == "files" and ext.lower() in writers.formatters:
+            
+            self._frames2files(
+                frames_list,
+                pdb_name_fmt,
+                ext,
+                workers=workers,
+                processes=processes,
+                max_pending=max_pending,
+                )
+        
+        elif output == "files":
+            
+            self._frames2file(
+                frames_list,
+                pdb_name_fmt,
+                workers=workers,
+                processes=processes,
+                max_pending=max_pending,
+                )
+        
+        else:
+            
+            self._frames2single_file(
+                frames_list,
+                pdb_name_fmt,
+                ext,
+                output,
+                file_name,
+                )
+        
+        log.info("    frames extracted successfully!")
+        
+        return
+    
+    def _resolve_frames2file(self, frames, prefix, ext, output, file_name):
+        """
+        Resolves the arguments of :meth:`frames2file`.
+        
+        Returns
+        -------
+        tuple
+            The existing frames to extract (indexed at 1), the
+            file name format of each frame, the file extension and
+            the file name of single file outputs.
+        """
         
         # frames_to_extract is a list of the frames number
         # starting at 1.
@@ -499,19 +968,13 @@ class TaurenTraj(ABC):
         
         elif isinstance(frames, str):
             
-            if frames.isdigit():
-                frames_to_extract = [int(frames)]
-            
-            elif "," in frames and frames.replace(",", "").isdigit():
-                frames_to_extract = frames.split(",")
-                
-            elif ":" in frames and frames.replace(":", "").isdigit():
-                frames_to_extract = \
-                    self.full_frames_list[
-                        self._gen_frame_slicer_from_string(frames)
-                        ]
+            try:
+                frames_to_extract = _frames_from_string(
+                    frames,
+                    len(self.full_frames_list),
+                    )
             
-            else:
+            except ValueError:
                 raise ValueError(
                     "<frames> not of valid format see: "
                     f"{self.frames2file.__doc__}"
@@ -536,55 +999,26 @@ class TaurenTraj(ABC):
             f"{type(pdb_name_fmt)} given"
             )
         
-        self._frames2file(frames_to_extract, pdb_name_fmt)
-        
-        log.info("    frames extracted successfully!")
-        
-        return
-    
-    def _gen_frame_slicer_from_string(self, s):
-        """
-        Returns a slicer object.
-        
-        Does not check for s integrity.
-        """
-        
-        if s.isdigit():
-            start = int(s) - 1
-            end = int(s)
-            step = 1
-        
-        elif s.endswith(":") and s.count(":") == 1:
-            ss = s.split(":")
-            start = int(ss[0]) - 1
-            end = len(self.full_frames_list)
-            step = 1
-        
-        elif s.startswith(":") and s.count(":") == 1:
-            ss = s.split(":")
-            start = 0
-            end = int(ss[0])
-            step = 1
-        
-        elif s.count(":") == 1:
-            ss = s.split(":")
-            start = int(ss[0]) - 1
-            end = int(ss[1])
-            step = 1
-        
-        elif s.count(":") == 2:
-            ss = s.split(":")
-            start = int(ss[0] - 1)
-            end = int(ss[1])
-            step = int(ss[2])
-        
-        else:
-            raise ValueError("slice string not valid")
-        
-        slicer = slice(start, end, step)
+        if output != "files":
+            
+            if output == "multimodel":
+                # multi-model files are always PDB
+                ext = "pdb"
+                pdb_name_fmt = prefix + self._gen_pdb_name_format(
+                    len(self.full_frames_list),
+                    ext,
+                    )
+            
+            if file_name is None:
+                _ext = ext if output == "multimodel" else output
+                file_name = f"{prefix}frames.{_ext}"
         
-        assert isinstance(slicer, slice), "NOT A SLICE OBJECT"
-        return slicer
+        return (
+            self._filter_existent_frames(frames_to_extract),
+            pdb_name_fmt,
+            ext,
+            file_name,
+            )
     
     @staticmethod
     def _gen_pdb_name_format(num_of_frames, ext):
@@ -605,52 +1039,518 @@ class TaurenTraj(ABC):
         
         return pdb_name_fmt
     
+    def _filter_existent_frames(self, frames_list):
+        """
+        Returns the frames in <frames_list> (indexed at 1) that
+        exist in the input trajectory, logging the others.
+        """
+        
+        n_frames = len(self.full_frames_list)
+        
+        frames = []
+        for frame in frames_list:
+            
+            if not 0 < frame <= n_frames:
+                log.info(self._err_frame_index.format(frame))
+                continue
+            
+            frames.append(frame)
+        
+        return frames
+    
     @abstractmethod
-    def _frames2file(self, frames_list, pdb_name_fmt):
+    def _frames2file(
+            self,
+            frames_list,
+            pdb_name_fmt,
+            workers,
+            processes,
+            max_pending=None,
+            ):
         """
         frames_list is a list of integers with the frames to extract.
         frames_list should be indexed at 1 (human way not python way)
+        and frames are guaranteed to exist.
         
         pdb_name_fmt is a .format() prepared string where the number
         of the extracted frame will fit in.
+        
+        Used for extensions not written by :mod:`tauren.writers`.
+        The selected frames should be read only once and written
+        with :func:`tauren.parallel.bounded_map` using
+        <workers>, <processes> and <max_pending>.
         """
         return
     
-    def save_traj(
+    def _frames2files(
             self,
-            file_name="traj_output.dcd",
-            **kwargs
+            frames_list,
+            pdb_name_fmt,
+            ext,
+            workers,
+            processes,
+            max_pending=None,
             ):
         """
-        Saves trajectory to file.
+        Writes one file per frame with Tauren-MD writers.
         
-        Overwrites existing files.
-    
-        Parameters
-        ----------
-        file_name : str
-            Name of the output trajectory file.
-            File extention is taken from file_name.
+        Frames are read once and formatted in the main thread,
+        the workers only write the text to disk.
         """
-        log.info(f"* Exporting trajectory to: {file_name}")
-    
-        self._save_traj(file_name)
-    
-        log.info("    ... saved")
+        
+        formatter = writers.get_formatter(ext, self._gen_atoms_table())
+        
+        jobs = (
+            (formatter.format(coordinates, box), pdb_name_fmt.format(frame))
+            for frame, coordinates, box in self._iter_frames(frames_list)
+            )
+        
+        for file_name in parallel.bounded_map(
+                writers.write_text,
+                jobs,
+                workers=workers,
+                processes=processes,
+                max_pending=max_pending,
+                ):
+            
+            log.info(f"    extracted {file_name}")
         
         return
     
-    @abstractmethod
-    def _save_traj(self, file_name):
-        """The subclass algorithm to save a trajectory."""
-        pass
-    
-    def calc_rmsds_combined_chains(
+    def _frames2single_file(
             self,
-            *,
+            frames_list,
+            pdb_name_fmt,
+            ext,
+            output,
+            file_name,
+            ):
+        """
+        Streams frames to a single file output.
+        
+        Frames are read once, formatted according to <ext> and
+        sent to the sink as they are produced.
+        """
+        
+        formatter = writers.get_formatter(ext, self._gen_atoms_table())
+        
+        with writers.open_frames_sink(output, file_name) as sink:
+            
+            for frame, coordinates, box in self._iter_frames(frames_list):
+                
+                sink.add(
+                    pdb_name_fmt.format(frame),
+                    frame,
+                    formatter.format(coordinates, box),
+                    )
+                
+                log.debug(f"    frame {frame} added to {file_name}")
+        
+        log.info(f"    {len(frames_list)} frames written to {file_name}")
+        
+        return
+    
+    @abstractmethod
+    def _gen_atoms_table(self):
+        """
+        Returns a :class:`tauren.writers.AtomsTable` for the atoms
+        in the current atom selection.
+        """
+        return
+    
+    @abstractmethod
+    def _iter_frames(self, frames_list):
+        """
+        Yields (frame, coordinates, box) for each frame in
+        <frames_list> (indexed at 1, frames exist) for the atoms in
+        the current atom selection.
+        
+        Coordinates are in Angstroms. Box is the unit cell lengths
+        (Angstroms) and angles (degrees), or None.
+        """
+        return
+    
+    @abstractmethod
+    def _select_atom_indexes(self, selection):
+        """
+        Returns the topology indexes of the atoms in <selection>.
+        """
+        return
+    
+    @abstractmethod
+    def _read_frames(self, frames_list, atom_indexes):
+        """
+        Reads the coordinates of several frames.
+        
+        Parameters
+        ----------
+        frames_list : sequence of ints
+            Frames indexed at 1.
+        
+        atom_indexes : np.ndarray
+            Topology indexes of the atoms to read.
+        
+        Returns
+        -------
+        tuple (np.ndarray, np.ndarray or None, np.ndarray)
+            Coordinates in Angstroms, shape=(k, N, 3), boxes,
+            shape=(k, 6), lengths (Angstroms) and angles (degrees),
+            or None if the trajectory has no unit cell, and the
+            frame times in picoseconds, shape=(k,).
+        """
+        return
+    
+    def _read_references(self, ref_frame, atom_indexes):
+        """
+        Returns the centred reference coordinates, in Angstroms,
+        used by the calc_rmsds_* methods for <ref_frame>.
+        
+        Parameters
+        ----------
+        ref_frame : int or list of ints
+            Indexes of the current slicing, see
+            :meth:`calc_rmsds_combined_chains`.
+        
+        Returns
+        -------
+        list of np.ndarray, shape=(N, 3)
+        """
+        
+        ref_frames = ref_frame if isinstance(ref_frame, list) else [ref_frame]
+        
+        coordinates, _, _ = self._read_frames(
+            [self.sliced_frames_list[r] for r in ref_frames],
+            atom_indexes,
+            )
+        
+        return [
+            c - c.mean(axis=0)
+            for c in coordinates.astype(np.float64)
+            ]
+    
+    @abstractmethod
+    def _rmsd_groups(self, chain_list, separated):
+        """
+        Returns the atoms of each RMSD column of the calc_rmsds_*
+        methods for <chain_list>.
+        
+        Returns
+        -------
+        list of tuples (header, np.ndarray)
+            The chain header, None for combined chains, and the
+            topology indexes of the atoms.
+        """
+        return
+    
+    def _open_traj_writer(self, file_name, atom_indexes):
+        """
+        Returns a streaming trajectory writer for <file_name>, an
+        object with ``write(coordinates, boxes, frames, times)``
+        receiving chunks as read by :meth:`_read_frames` and
+        ``close()``.
+        
+        Returns None if the MD library can not stream to the
+        file format.
+        """
+        return None
+    
+    def _in_results_cache(self, calculation, **kwargs):
+        """
+        Whether calc_<calculation>(**kwargs) would read its
+        observable from the results cache.
+        """
+        
+        calc_method = getattr(type(self), f"calc_{calculation}").__wrapped__
+        cache_key = cache.results_cache_key(self, calc_method, (), kwargs)
+        
+        return cache_key is not None and cache_key in self.results_cache
+    
+    def _pass_key(self, calculation, chain_list, ref_frame):
+        """
+        Identifies results calculated in a frame pass for a
+        calc_* call in the current selection and slicing.
+        """
+        return (
+            calculation,
+            self.atom_selection,
+            self.slice_tuple,
+            tuple(map(str, chain_list)),
+            repr(ref_frame),
+            )
+    
+    def save_traj(
+            self,
+            file_name="traj_output.dcd",
+            chunk_size=None,
+            progress_interval=1000,
+            shards=1,
+            workers=None,
+            precision=0.01,
+            **kwargs
+            ):
+        """
+        Saves trajectory to file.
+        
+        Overwrites existing files.
+    
+        Parameters
+        ----------
+        file_name : str
+            Name of the output trajectory file.
+            File extention is taken from file_name.
+            The ".tcz" extension writes the Tauren-MD compressed
+            format, see :mod:`tauren.compressed`, which
+            :func:`tauren.load.load_traj` reads back.
+        
+        chunk_size : int, optional
+            Number of frames read at once. Frames are read in one
+            thread and written in another, at most two chunks are
+            held in memory.
+            For ".tcz" files, the number of frames per compressed
+            chunk, the unit of random access.
+            Defaults to None, 100 or, with a memory budget, the
+            frames that fit, see :meth:`set_memory_budget`.
+        
+        progress_interval : int, optional
+            Logs progress every <progress_interval> frames.
+            Defaults to 1000.
+        
+        shards : int, optional
+            Splits the current frame slicing in <shards> contiguous
+            ranges written concurrently by worker processes to
+            "<name>.part<K>.<ext>" files, K starting at 1.
+            A "<name>.manifest.json" file is written alongside, it
+            can be given to :func:`tauren.load.load_traj` in place of
+            a trajectory file to load all parts as one trajectory.
+            <chunk_size> and <progress_interval> are not used with
+            shards.
+            Defaults to 1, a single output file.
+        
+        workers : int, optional
+            Number of worker processes writing shards.
+            Defaults to None, the number of CPUs up to <shards>.
+        
+        precision : float, optional
+            Quantisation step of coordinates in Angstroms
+            for ".tcz" files.
+            Defaults to 0.01 (0.001 nm).
+        """
+        log.info(f"* Exporting trajectory to: {file_name}")
+        
+        for name, value in (
+                ("chunk_size", chunk_size or 1),
+                ("progress_interval", progress_interval),
+                ("shards", shards),
+                ):
+            
+            if not isinstance(value, int) or value < 1:
+                raise ValueError(
+                    f"<{name}> should be a positive integer: '{value}'"
+                    )
+        
+        if shards == 1:
+            # the chunk being read and two chunks waiting to be written
+            chunk_size = self._chunk_size(
+                chunk_size,
+                len(self._select_atom_indexes(self.atom_selection)),
+                "save_traj",
+                atom_bytes=3 * memory.coordinate_bytes,
+                )
+        
+        if file_name.endswith(compressed.ext):
+            
+            if shards > 1:
+                raise ValueError(
+                    f"{compressed.ext} files can not be written in shards."
+                    )
+            
+            self._save_traj_compressed(
+                file_name,
+                precision,
+                chunk_size,
+                progress_interval,
+                )
+        
+        elif shards > 1:
+            
+            self._save_traj_sharded(
+                file_name,
+                shards,
+                min(parallel.get_workers(workers), shards),
+                )
+        
+        else:
+            
+            self._save_traj(
+                file_name,
+                chunk_size=chunk_size,
+                progress_interval=progress_interval,
+                )
+    
+        log.info("    ... saved")
+        
+        return
+    
+    @abstractmethod
+    def _save_traj(self, file_name, chunk_size, progress_interval):
+        """The subclass algorithm to save a trajectory."""
+        pass
+    
+    def _save_traj_chunks(
+            self,
+            writer,
+            atom_indexes,
+            chunk_size,
+            progress_interval,
+            ):
+        """
+        Writes the current frame slicing with a streaming writer,
+        see :meth:`_open_traj_writer`, reading <chunk_size> frames
+        at once.
+        """
+        
+        frames_list = np.asarray(self.sliced_frames_list)
+        
+        try:
+            for start in range(0, frames_list.size, chunk_size):
+                
+                frames = frames_list[start:start + chunk_size]
+                coordinates, boxes, times = \
+                    self._read_frames(frames, atom_indexes)
+                writer.write(coordinates, boxes, frames, times)
+                
+                exported = start + frames.size
+                if exported // progress_interval > start // progress_interval:
+                    log.info(
+                        f"    exported {exported}/{frames_list.size} frames"
+                        )
+        
+        finally:
+            writer.close()
+        
+        n_frames = frames_list.size
+        if n_frames % progress_interval:
+            log.info(f"    exported {n_frames}/{n_frames} frames")
+        
+        return
+    
+    def _save_traj_compressed(
+            self,
+            file_name,
+            precision,
+            chunk_size,
+            progress_interval,
+            ):
+        """
+        Writes the current frame slicing in the Tauren-MD
+        compressed format.
+        """
+        
+        n_frames = len(self.sliced_frames_list)
+        frames = self._iter_frames(self.sliced_frames_list)
+        first = next(frames)
+        
+        with compressed.CompressedTrajWriter(
+                file_name,
+                len(first[1]),
+                precision=precision,
+                chunk_size=chunk_size,
+                ) as writer:
+            
+            for exported, (frame, coordinates, box) in enumerate(
+                    itertools.chain([first], frames),
+                    start=1,
+                    ):
+                
+                writer.write(coordinates, box, frame=frame)
+                
+                if exported % progress_interval == 0:
+                    log.info(f"    exported {exported}/{n_frames} frames")
+        
+        if n_frames % progress_interval:
+            log.info(f"    exported {n_frames}/{n_frames} frames")
+        
+        return
+    
+    def _save_traj_sharded(self, file_name, shards, workers):
+        """
+        Writes the current frame slicing in contiguous parts
+        and the manifest relating them.
+        """
+        
+        frames = self.sliced_frames_list
+        
+        stem, ext = os.path.splitext(file_name)
+        
+        shard_frames = [
+            [frames[ii] for ii in part]
+            for part in np.array_split(np.arange(len(frames)), shards)
+            if part.size
+            ]
+        
+        part_names = [
+            f"{stem}.part{k}{ext}"
+            for k in range(1, len(shard_frames) + 1)
+            ]
+        
+        for k, (part_name, n_frames) in enumerate(
+                parallel.bounded_map(
+                    self._get_shard_writer(),
+                    self._gen_shard_jobs(shard_frames, part_names),
+                    workers=workers,
+                    processes=True,
+                    ),
+                start=1,
+                ):
+            
+            log.info(
+                f"    exported part {k}/{len(part_names)}: "
+                f"{part_name} ({n_frames} frames)"
+                )
+        
+        manifest = writers.write_trajectory_manifest(
+            f"{stem}.manifest.json",
+            part_names,
+            shard_frames,
+            )
+        
+        log.info(f"    manifest: {manifest}")
+        
+        return
+    
+    @abstractmethod
+    def _get_shard_writer(self):
+        """
+        Returns the module level function that writes a shard.
+        
+        The function receives the arguments generated by
+        :meth:`_gen_shard_jobs` and returns the tuple
+        (part_name, number of frames written).
+        """
+        return
+    
+    @abstractmethod
+    def _gen_shard_jobs(self, shard_frames, part_names):
+        """
+        Yields the arguments of the shard writer for each part.
+        
+        shard_frames are lists of frames (indexed at 1) of each
+        part, part_names are the output file names.
+        Arguments are sent to worker processes.
+        """
+        return
+    
+    @cache.cached_calculation
+    def calc_rmsds_combined_chains(
+            self,
+            *,
             chains="all",
             ref_frame=0,
+            ref_structure=None,
+            ref_weights=None,
             storage_key="rmsds_combined_chains",
+            chunk_size=None,
+            export_stream=None,
             **kwargs
             ):
         """
@@ -678,14 +1578,49 @@ class TaurenTraj(ABC):
             # when using **MDTraj**, identifiers are digits that
             represent chain order.
         
-        ref_frame : int, optional
+        ref_frame : int or list of ints, optional
             The reference frame for the RMSD calculation.
+            If a list is given, e.g. [0, 500, 1000], the trajectory
+            is traversed only once and each frame is fitted against
+            every reference frame; one RMSD column is stored per
+            reference. Reference frames are indexes (starting at 0)
+            of the current frame slicing.
+            
+            With MDAnalysis, an int is a frame of the topology file,
+            as MDAnalysis RMSD reads it: ref_frame=0 fits to the
+            topology coordinates, not to the first frame of the
+            slicing. With MDTraj, an int indexes the slicing too.
+        
+        ref_structure : str, optional
+            Path to an external reference structure, for example
+            a crystal structure. If given, ref_frame is ignored.
+            The structure must contain the selected atoms in the
+            same order as the trajectory. The prepared reference
+            is cached on disk, see :mod:`tauren.reference`.
+            Defaults to None.
+        
+        ref_weights : {None, "mass"}, optional
+            Weights used to centre and fit to ref_structure.
+            Defaults to None.
         
         storage_key : str, optional
             The first element of the key tuple with which the
             calculated RMSD data will be stored in the trajectory's
             observables' dictionary. Defaults to "rmsds_combined_chains".
         
+        chunk_size : int, optional
+            Number of frames read at once when streaming.
+            Defaults to None, 100 or, with a memory budget, the
+            frames that fit, see :meth:`set_memory_budget`.
+        
+        export_stream : dict, optional
+            Keyword arguments of :class:`tauren.tables.TableStream`
+            to append the rows of each chunk of frames to a table
+            file as they are calculated, see
+            :meth:`calc_rmsds_per_residue`. RMSDs against
+            <ref_structure> are calculated before being streamed.
+            Defaults to None, no streaming.
+        
         Returns
         -------
         key : tuple
@@ -696,6 +1631,7 @@ class TaurenTraj(ABC):
         ----------
         TypeError
             If chains is not list or string.
+            If ref_frame is not int or list of ints.
         
         ValueError
             If chains str or list is not of valid format (read above).
@@ -709,30 +1645,69 @@ class TaurenTraj(ABC):
         storage_key = storage_key or "rmsds_combined_chains"
         
         self._check_chains_argument(chains)
-                
-        chain_list = self._gen_chain_list(chains)  # abstractmethod
         
-        combined_rmsds = self._calc_rmsds_combined_chains(
-            chain_list,
-            ref_frame,
-            )
+        if ref_structure:
+            log.debug(f"using <ref_structure>: {ref_structure}")
+            ref_frame = 0
         
-        assert combined_rmsds.ndim == 1, (
-            "<combined_rmsds> array should have only one dimension. "
-            f"Detected array with {combined_rmsds.ndim}."
-            )
+        self._check_ref_frame_argument(ref_frame)
         
-        frames_array = np.array(self.sliced_frames_list)
+        chain_list = self._gen_chain_list(chains)  # abstractmethod
         
-        assert combined_rmsds.size == frames_array.size, (
-            "combined_rmsds and frames_array size does not match. "
-            f"{combined_rmsds.size} vs. {frames_array.size}"
+        combined_rmsds = self._pass_results.pop(
+            self._pass_key("rmsds_combined_chains", chain_list, ref_frame),
+            None,
             )
         
-        data = np.vstack((frames_array, combined_rmsds)).T
+        frames_array = self.frames_index
+        
+        if export_stream is not None \
+                and combined_rmsds is None \
+                and not ref_structure:
+            
+            _, rows_chunks = self._stream_rmsds(
+                "rmsds_combined_chains",
+                chains,
+                ref_frame,
+                chunk_size,
+                )
+        
+        else:
+            
+            if combined_rmsds is None or ref_structure:
+                combined_rmsds = self._calc_rmsds_combined_chains(
+                    chain_list,
+                    ref_frame,
+                    ref_structure=ref_structure,
+                    ref_weights=ref_weights,
+                    )
+            
+            expected_ndim = 2 if isinstance(ref_frame, list) else 1
+            assert combined_rmsds.ndim == expected_ndim, (
+                "<combined_rmsds> array should have "
+                f"{expected_ndim} dimensions. "
+                f"Detected array with {combined_rmsds.ndim}."
+                )
+            
+            assert combined_rmsds.shape[0] == frames_array.size, (
+                "combined_rmsds and frames_array size does not match. "
+                f"{combined_rmsds.shape[0]} vs. {frames_array.size}"
+                )
+            
+            combined_rmsds = combined_rmsds.reshape(frames_array.size, -1)
+            rows_chunks = None
         
         chain_name_export = chains.replace(',', '-')
-        key = StorageKey(
+        
+        if ref_structure:
+            ref_name_export = f"_ref-{self._ref_structure_name(ref_structure)}"
+        elif isinstance(ref_frame, list):
+            ref_name_export = \
+                "_ref-" + "-".join(str(r) for r in ref_frame)
+        else:
+            ref_name_export = ""
+        
+        key = storage.StorageKey(
             datatype=storage_key,
             identifier=(
                 f"{self.atom_selection} "
@@ -742,15 +1717,32 @@ class TaurenTraj(ABC):
                 f"{storage_key}"
                 f"_{self.atom_selection.replace(' ', '-')}"
                 f"_{chain_name_export.replace(' ', '-')}"
+                f"{ref_name_export}"
                 ),
+            selection=self.atom_selection,
+            chains=storage.chain_set(chain_list),
             )
         
-        datatuple = StorageData(
-            columns=["frames", key.identifier],
-            data=data,
+        if isinstance(ref_frame, list):
+            rmsds_columns = [
+                f"{key.identifier} ref {r}" for r in ref_frame
+                ]
+        else:
+            rmsds_columns = [key.identifier]
+        
+        datatuple = storage.ColumnarData(
+            frames_array,
+            rmsds_columns,
+            self._rmsds_values(
+                rows_chunks,
+                key,
+                rmsds_columns,
+                combined_rmsds,
+                export_stream,
+                ),
             )
         
-        self.observables.store(key, datatuple)
+        key = self.observables.store(key, datatuple)
         
         return key
     
@@ -800,7 +1792,31 @@ class TaurenTraj(ABC):
                 )
             log.debug(_err)
             raise TypeError(_err)
+    
+    @staticmethod
+    def _check_ref_frame_argument(ref_frame):
+        """
+        Checks validity of <ref_frame> input argument.
+        ref_frame should be int or a non-empty list of ints.
+        Raise TypeError otherwise.
+        """
+        
+        if isinstance(ref_frame, int):
+            return
         
+        elif isinstance(ref_frame, list) \
+                and ref_frame \
+                and all(isinstance(r, int) for r in ref_frame):
+            return
+        
+        else:
+            _err = (
+                "ref_frame should be int or list of ints. "
+                f"Wrong input: {ref_frame}"
+                )
+            log.debug(_err)
+            raise TypeError(_err)
+    
     @abstractmethod
     def _calc_rmsds_combined_chains(self):
         """
@@ -811,14 +1827,24 @@ class TaurenTraj(ABC):
         chain_list : list of strs
             List of strings containing the chains to operate with
         
-        ref_frame : int
-            The reference frame to which calculate te rmsds
+        ref_frame : int or list of ints
+            The reference frame to which calculate te rmsds.
+            If list, RMSDs against all references should be
+            calculated in a single pass over the trajectory.
+        
+        ref_structure : str or None
+            Path to an external reference structure. If given,
+            ref_frame is ignored. Use :meth:`_get_reference`.
+        
+        ref_weights : {None, "mass"}
+            The weights for the external reference structure.
         
         Returns
         -------
-        numpy.array of shape=(X,)
+        numpy.array of shape=(X,) or shape=(X, R)
             The returned array should be sliced according to the
-            current frame slicer (self._fslicer).
+            current frame slicer (self._fslicer). If ref_frame is
+            a list, R is the number of reference frames.
         """
         
         pass
@@ -830,12 +1856,17 @@ class TaurenTraj(ABC):
         """
         pass
     
+    @cache.cached_calculation
     def calc_rmsds_separated_chains(
             self,
             *,
             chains="all",
             ref_frame=0,
+            ref_structure=None,
+            ref_weights=None,
             storage_key="rmsds_separated_chains",
+            chunk_size=None,
+            export_stream=None,
             **kwargs
             ):
         """
@@ -863,13 +1894,37 @@ class TaurenTraj(ABC):
             represent chain order.
         
         ref_frame : int, optional
-            The reference frame for the RMSD calculation.
+            The reference frame for the RMSD calculation,
+            see :meth:`calc_rmsds_combined_chains`.
+        
+        ref_structure : str, optional
+            Path to an external reference structure, for example
+            a crystal structure. If given, ref_frame is ignored.
+            See :meth:`calc_rmsds_combined_chains`.
+            Defaults to None.
+        
+        ref_weights : {None, "mass"}, optional
+            Weights used to centre and fit to ref_structure.
+            Defaults to None.
         
         storage_key : str, optional
             The first element of the key tuple with which the
             calculated RMSD data will be stored in the trajectory's
             observables' dictionary. Defaults to "rmsds_combined_chains".
         
+        chunk_size : int, optional
+            Number of frames read at once when streaming.
+            Defaults to None, 100 or, with a memory budget, the
+            frames that fit, see :meth:`set_memory_budget`.
+        
+        export_stream : dict, optional
+            Keyword arguments of :class:`tauren.tables.TableStream`
+            to append the rows of each chunk of frames to a table
+            file as they are calculated, see
+            :meth:`calc_rmsds_per_residue`. RMSDs against
+            <ref_structure> are calculated before being streamed.
+            Defaults to None, no streaming.
+        
         Returns
         -------
         key : tuple
@@ -894,46 +1949,79 @@ class TaurenTraj(ABC):
         
         chain_list = self._gen_chain_list(chains)  # abstractmethod
         
-        rmsds, chains_headers = self._calc_rmsds_separated_chains(
-            chain_list,
-            ref_frame=ref_frame,
+        precalculated = self._pass_results.pop(
+            self._pass_key("rmsds_separated_chains", chain_list, ref_frame),
+            None,
             )
         
-        frames_array = np.array(self.sliced_frames_list)
+        frames_array = self.frames_index
+        rmsds = None
         
-        assert rmsds.shape[0] == frames_array.size, (
-            "RMSDs array does not match frames_array size. "
-            f"{rmsds.shape[0]} vs. {frames_array.size}."
-            )
+        if export_stream is not None \
+                and precalculated is None \
+                and not ref_structure:
+            
+            chains_headers, rows_chunks = self._stream_rmsds(
+                "rmsds_separated_chains",
+                chains,
+                ref_frame,
+                chunk_size,
+                )
         
-        data = np.concatenate(
-            (
-                frames_array.reshape(frames_array.size, 1),
-                rmsds
-                ),
-            axis=1,
-            )
+        else:
+            
+            if precalculated is None or ref_structure:
+                rmsds, chains_headers = self._calc_rmsds_separated_chains(
+                    chain_list,
+                    ref_frame=ref_frame,
+                    ref_structure=ref_structure,
+                    ref_weights=ref_weights,
+                    )
+            else:
+                rmsds, chains_headers = precalculated
+            
+            assert rmsds.shape[0] == frames_array.size, (
+                "RMSDs array does not match frames_array size. "
+                f"{rmsds.shape[0]} vs. {frames_array.size}."
+                )
+            
+            rows_chunks = None
         
         chains_columns = list(map(
             lambda x: f"{self.atom_selection}_{x}",
             chains_headers
             ))
         
-        key = StorageKey(
+        if ref_structure:
+            ref_name_export = f"_ref-{self._ref_structure_name(ref_structure)}"
+        else:
+            ref_name_export = ""
+        
+        key = storage.StorageKey(
             datatype=storage_key,
             identifier=",".join(chains_columns),
             filenaming=(
                 f"{self.atom_selection.replace(' ','-')}"
                 f"_{'-'.join(chains_headers)}"
+                f"{ref_name_export}"
                 ),
+            selection=self.atom_selection,
+            chains=storage.chain_set(chain_list),
             )
         
-        datatuple = StorageData(
-            columns=["frames", *chains_columns],
-            data=data,
+        datatuple = storage.ColumnarData(
+            frames_array,
+            chains_columns,
+            self._rmsds_values(
+                rows_chunks,
+                key,
+                chains_columns,
+                rmsds,
+                export_stream,
+                ),
             )
         
-        self.observables.store(key, datatuple)
+        key = self.observables.store(key, datatuple)
         return key
     
     @abstractmethod
@@ -949,6 +2037,13 @@ class TaurenTraj(ABC):
         ref_frame : int
             The reference frame to which calculate te rmsds
         
+        ref_structure : str or None
+            Path to an external reference structure. If given,
+            ref_frame is ignored. Use :meth:`_get_reference`.
+        
+        ref_weights : {None, "mass"}
+            The weights for the external reference structure.
+        
         Returns
         -------
         numpy.array of shape=(Y,X)
@@ -961,6 +2056,507 @@ class TaurenTraj(ABC):
         """
         pass
     
+    @cache.cached_calculation
+    def calc_rmsf(
+            self,
+            *,
+            chains="all",
+            ref_frame=0,
+            per_residue=False,
+            chunk_size=None,
+            storage_key="rmsf",
+            **kwargs
+            ):
+        """
+        Calculates the Root Mean Square Fluctuation (RMSF).
+        
+        Frames are fitted to the reference frame and fluctuations
+        around the average fitted structure are accumulated in a
+        single pass over chunks of frames, so memory is independent
+        of the number of frames.
+        
+        Calculated RMSFs are stored in the form of np.ndarray
+        in trajectory's observables attribute. The first column
+        is the atom number or, if per_residue, the residue number
+        (both starting at 1 and counting over the whole topology).
+        
+        Parameters
+        ----------
+        chains : str or list of identifiers, optional
+            Defaults to "all", all chains are used.
+            Chains subselect over the current atom selection, see
+            :meth:`calc_rmsds_combined_chains`.
+        
+        ref_frame : int, optional
+            The frame (index of the current slicing, starting at 0)
+            to which frames are fitted. Defaults to 0.
+        
+        per_residue : bool, optional
+            Whether to calculate RMSFs per residue instead of
+            per atom. Residue RMSF is the square root of the
+            residue's average atomic mean square fluctuation.
+            Defaults to False.
+        
+        chunk_size : int, optional
+            Number of frames fitted and accumulated at once.
+            Defaults to None, 100 or, with a memory budget, the
+            frames that fit, see :meth:`set_memory_budget`.
+        
+        storage_key : str, optional
+            The first element of the key tuple with which the
+            calculated RMSF data will be stored in the trajectory's
+            observables' dictionary. Defaults to "rmsf".
+        
+        Returns
+        -------
+        key : tuple
+            The key with which data was stored in observables
+            attribute dictionary.
+        """
+        
+        log.info("* Calculating RMSFs...")
+        
+        storage_key = storage_key or "rmsf"
+        
+        self._check_chains_argument(chains)
+        
+        if chunk_size is not None \
+                and (not isinstance(chunk_size, int) or chunk_size < 1):
+            raise ValueError(
+                f"chunk_size should be a positive integer: '{chunk_size}'"
+                )
+        
+        chain_list = self._gen_chain_list(chains)  # abstractmethod
+        
+        # float64 fitted coordinates and their temporaries
+        chunk_size = self._chunk_size(
+            chunk_size,
+            len(self._select_atom_indexes(self.atom_selection)),
+            "calc_rmsf",
+            atom_bytes=4 * memory.coordinate_bytes,
+            )
+        
+        fitted = self._fit_chunks(chain_list, ref_frame, chunk_size)
+        
+        accumulator = calc.RunningMeanVar(fitted.reference.shape)
+        
+        for chunk in fitted.chunks:
+            accumulator.update(chunk)
+        
+        msf = accumulator.variance.sum(axis=1)
+        atom_indexes = fitted.atom_indexes
+        residue_indexes = fitted.residue_indexes
+        
+        if per_residue:
+            rmsf = np.sqrt(calc.residue_means(msf, residue_indexes))
+            numbers = residue_indexes[calc.residue_boundaries(residue_indexes)]
+            first_column = "residues"
+        
+        else:
+            rmsf = np.sqrt(msf)
+            numbers = atom_indexes
+            first_column = "atoms"
+        
+        data = np.column_stack((numbers + 1, rmsf))
+        
+        chain_name_export = chains.replace(',', '-')
+        key = storage.StorageKey(
+            datatype=storage_key,
+            identifier=(
+                f"{self.atom_selection} "
+                f"for '{chain_name_export}' chains per {first_column[:-1]}"
+                ),
+            filenaming=(
+                f"{self.atom_selection.replace(' ', '-')}"
+                f"_{chain_name_export.replace(' ', '-')}"
+                f"_{first_column}"
+                ),
+            selection=self.atom_selection,
+            chains=storage.chain_set(chain_list),
+            )
+        
+        datatuple = storage.StorageData(
+            columns=[first_column, key.identifier],
+            data=data,
+            )
+        
+        key = self.observables.store(key, datatuple)
+        
+        return key
+    
+    @cache.cached_calculation
+    def calc_rmsds_per_residue(
+            self,
+            *,
+            chains="all",
+            ref_frame=0,
+            chunk_size=None,
+            storage_key="rmsds_per_residue",
+            export_stream=None,
+            **kwargs
+            ):
+        """
+        Calculates RMSDs decomposed per residue.
+        
+        Frames are fitted once to the reference frame using all the
+        selected atoms of <chains> (the same global fit of
+        :meth:`calc_rmsds_combined_chains`) and the atomic squared
+        deviations of the fitted coordinates are reduced over residue
+        boundaries, chunk by chunk, in a single pass.
+        
+        Calculated RMSDs are stored in the form of np.ndarray
+        in trajectory's observables attribute, one column per residue.
+        Residues are numbered from 1 over the whole topology.
+        
+        Parameters
+        ----------
+        chains : str or list of identifiers, optional
+            Defaults to "all", all chains are used.
+            Chains subselect over the current atom selection, see
+            :meth:`calc_rmsds_combined_chains`.
+        
+        ref_frame : int, optional
+            The frame (index of the current slicing, starting at 0)
+            to which frames are fitted. Defaults to 0.
+        
+        chunk_size : int, optional
+            Number of frames fitted and reduced at once.
+            Defaults to None, 100 or, with a memory budget, the
+            frames that fit, see :meth:`set_memory_budget`.
+        
+        storage_key : str, optional
+            The first element of the key tuple with which the
+            calculated RMSD data will be stored in the trajectory's
+            observables' dictionary. Defaults to "rmsds_per_residue".
+        
+        export_stream : dict, optional
+            Keyword arguments of :class:`tauren.tables.TableStream`
+            to append the rows of each chunk to a table file as they
+            are calculated, "file_name" defaults to
+            :func:`tauren.tables.default_file_name`.
+            With a "raw" table the stored data is memory mapped from
+            the file and memory does not depend on the number of
+            frames. Defaults to None, no streaming.
+        
+        Returns
+        -------
+        key : tuple
+            The key with which data was stored in observables
+            attribute dictionary.
+        """
+        
+        log.info("* Calculating RMSDs per residue...")
+        
+        storage_key = storage_key or "rmsds_per_residue"
+        
+        self._check_chains_argument(chains)
+        
+        if chunk_size is not None \
+                and (not isinstance(chunk_size, int) or chunk_size < 1):
+            raise ValueError(
+                f"chunk_size should be a positive integer: '{chunk_size}'"
+                )
+        
+        chain_list = self._gen_chain_list(chains)  # abstractmethod
+        
+        # float64 fitted coordinates and their temporaries
+        chunk_size = self._chunk_size(
+            chunk_size,
+            len(self._select_atom_indexes(self.atom_selection)),
+            "calc_rmsds_per_residue",
+            atom_bytes=4 * memory.coordinate_bytes,
+            )
+        
+        fitted = self._fit_chunks(chain_list, ref_frame, chunk_size)
+        
+        residue_numbers = fitted.residue_indexes[
+            calc.residue_boundaries(fitted.residue_indexes)
+            ] + 1
+        
+        frames_array = np.array(self.sliced_frames_list)
+        
+        def rows_chunks():
+            row = 0
+            for chunk in fitted.chunks:
+                
+                squared_deviations = \
+                    ((chunk - fitted.reference) ** 2).sum(axis=2)
+                
+                rmsds = np.sqrt(calc.residue_means(
+                    squared_deviations,
+                    fitted.residue_indexes,
+                    axis=1,
+                    ))
+                
+                yield np.column_stack(
+                    (frames_array[row:row + chunk.shape[0]], rmsds),
+                    )
+                
+                row += chunk.shape[0]
+            
+            assert row == self.n_frames, (
+                f"fitted frames '{row}' NOT matching "
+                f"n_frames '{self.n_frames}'"
+                )
+        
+        columns = ["frames", *(f"res_{n}" for n in residue_numbers)]
+        
+        chain_name_export = chains.replace(',', '-')
+        key = storage.StorageKey(
+            datatype=storage_key,
+            identifier=(
+                f"{self.atom_selection} "
+                f"for '{chain_name_export}' chains per residue"
+                ),
+            filenaming=(
+                f"{self.atom_selection.replace(' ', '-')}"
+                f"_{chain_name_export.replace(' ', '-')}"
+                ),
+            selection=self.atom_selection,
+            chains=storage.chain_set(chain_list),
+            )
+        
+        datatuple = storage.StorageData(
+            columns=columns,
+            data=self._collect_rows(
+                rows_chunks(),
+                key,
+                columns,
+                export_stream,
+                ),
+            )
+        
+        key = self.observables.store(key, datatuple)
+        
+        return key
+    
+    def _stream_rmsds(self, calculation, chains, ref_frame, chunk_size):
+        """
+        Calculates the RMSDs of a calc_rmsds_* call reading chunks
+        of frames, see :class:`tauren.framepass.RMSDConsumer`.
+        
+        Returns
+        -------
+        tuple (list, iterator of np.ndarray)
+            The chain headers and the chunks of rows, the frame
+            followed by the RMSDs.
+        """
+        
+        consumer = framepass.RMSDConsumer(self, calculation, chains, ref_frame)
+        
+        # float32 frames and the float64 copies of superposed_rmsds
+        chunk_size = self._chunk_size(
+            chunk_size,
+            consumer.atom_indexes.size,
+            calculation,
+            atom_bytes=5 * memory.coordinate_bytes,
+            )
+        
+        frames_list = np.asarray(self.sliced_frames_list)
+        
+        def rows_chunks():
+            for start in range(0, frames_list.size, chunk_size):
+                
+                frames = frames_list[start:start + chunk_size]
+                coordinates, _, _ = \
+                    self._read_frames(frames, consumer.atom_indexes)
+                
+                yield np.column_stack((frames, consumer.calc(coordinates)))
+        
+        return consumer.headers, rows_chunks()
+    
+    def _rmsds_values(
+            self,
+            rows_chunks,
+            key,
+            columns,
+            rmsds=None,
+            export_stream=None,
+            ):
+        """
+        Returns the value columns of a calc_rmsds_* observable.
+        
+        Without <export_stream>, the columns of the calculated
+        <rmsds> array. Otherwise, views of the rows in
+        <rows_chunks>, or of <rmsds> if None, gathered by
+        :meth:`_collect_rows`.
+        """
+        
+        if export_stream is None:
+            return [np.ascontiguousarray(column) for column in rmsds.T]
+        
+        if rows_chunks is None:
+            rows_chunks = [np.column_stack((self.frames_index, rmsds))]
+        
+        data = self._collect_rows(
+            rows_chunks,
+            key,
+            ["frames", *columns],
+            export_stream,
+            )
+        
+        return list(data[:, 1:].T)
+    
+    def _collect_rows(self, rows_chunks, key, columns, export_stream=None):
+        """
+        Gathers the data of a per frame observable calculated in
+        chunks of rows.
+        
+        Parameters
+        ----------
+        rows_chunks : iterator of np.ndarray
+            Chunks of rows, one row per frame of the current slicing.
+        
+        key : StorageKey
+        
+        columns : list of str
+        
+        export_stream : dict, optional
+            Keyword arguments of :class:`tauren.tables.TableStream`,
+            chunks are appended to the table as they are calculated.
+            Rows streamed to text tables are also appended to a
+            temporary raw table, in the folder of the observables
+            store if it has one, so that the returned data is memory
+            mapped for every format.
+            Defaults to None, chunks are gathered in memory.
+        
+        Returns
+        -------
+        np.ndarray
+            Of shape=(n_frames, len(columns)).
+        """
+        
+        if export_stream is None:
+            
+            data = np.empty((self.n_frames, len(columns)))
+            
+            row = 0
+            for rows in rows_chunks:
+                data[row:row + rows.shape[0]] = rows
+                row += rows.shape[0]
+            
+            return data
+        
+        export_stream = dict(export_stream)
+        
+        if export_stream.get("file_name") is None:
+            export_stream["file_name"] = tables.default_file_name(
+                key,
+                export_stream.get("format"),
+                )
+        
+        log.info(f"    streaming rows to {export_stream['file_name']}")
+        
+        streams = [tables.TableStream(
+            columns=columns,
+            key=key,
+            **export_stream,
+            )]
+        
+        if streams[0].format != "raw":
+            
+            fd, raw_name = tempfile.mkstemp(
+                prefix="tauren_rows_",
+                suffix=".raw",
+                dir=getattr(self.observables, "folder", None),
+                )
+            os.close(fd)
+            
+            streams.append(tables.TableStream(
+                raw_name,
+                columns,
+                key=key,
+                format="raw",
+                flush_every=streams[0].flush_every,
+                ))
+        
+        try:
+            for rows in rows_chunks:
+                for stream in streams:
+                    stream.append(rows)
+        
+        finally:
+            for stream in streams:
+                stream.close()
+        
+        log.info(
+            f"    saved {streams[0].file_name} ({streams[0].n_rows} rows)"
+            )
+        
+        return streams[-1].load()
+    
+    @abstractmethod
+    def _fit_chunks(self):
+        """
+        MD analysis library specific implementation.
+        
+        Fits the selected atoms of each frame in the current slicing
+        to the reference frame, centring and rotating without weights.
+        
+        Parameters
+        ----------
+        chain_list : list of strs
+            List of strings containing the chains to operate with
+        
+        ref_frame : int
+            The frame to which fit, index of the current slicing.
+        
+        chunk_size : int
+            The maximum number of frames in each chunk.
+        
+        Returns
+        -------
+        :class:`FittedChunks`
+            Where <chunks> is an iterator of np.ndarrays of
+            shape=(k, N, 3) with the fitted coordinates. Arrays may be
+            reused between iterations, consume each before the next.
+        """
+        pass
+    
+    def _get_reference(self, ref_structure, selection, weights=None):
+        """
+        Returns the :class:`tauren.reference.PreparedReference`
+        of ref_structure for the given atom selection.
+        """
+        
+        return reference.get_reference(
+            ref_structure,
+            selection,
+            type(self).__name__,
+            self._parse_ref_structure,
+            weights=weights,
+            )
+    
+    @staticmethod
+    @abstractmethod
+    def _parse_ref_structure(ref_structure, selection):
+        """
+        MD analysis library specific implementation.
+        
+        Parameters
+        ----------
+        ref_structure : str
+            Path to the reference structure file.
+        
+        selection : str
+            The atom selection in the library's grammar.
+        
+        Returns
+        -------
+        tuple of np.ndarray
+            The selected atoms coordinates, shape=(N, 3), in the
+            library's length units, and atom masses, shape=(N,).
+        """
+        pass
+    
+    @staticmethod
+    def _ref_structure_name(ref_structure):
+        """
+        Returns the name of the reference structure file to use in
+        file naming.
+        """
+        return Path(ref_structure).stem.replace(" ", "-")
+    
     def _gen_selector(
             self,
             identifiers,
@@ -988,15 +2584,18 @@ class TaurenTraj(ABC):
             file_name="table.csv",
             sep=",",
             header="",
+            format=None,
             ):
         """
         Exports data arrays to file.
         
         Parameters
         ----------
-        key : tuple
+        key : StorageKey or str
             The key with which the data is stored in the
-            observables attribute dictionary.
+            observables attribute dictionary, or a datatype,
+            the last observable of that datatype is exported,
+            see :meth:`tauren.storage.TrajObservables.resolve`.
         
         file_name : str
             The name of the file.
@@ -1010,29 +2609,139 @@ class TaurenTraj(ABC):
             Any text you wish to add as comment as file header.
             Headers are identified by "#".
             Defaults to nothing.
+        
+        format : str, optional ["csv", "npy", "npz", "hdf5", "raw"]
+            The table format, see :mod:`tauren.tables`.
+            Defaults to None, the format is taken from the
+            <file_name> extension, unknown extensions are "csv".
+            Binary formats keep the column names and the key and
+            columns can be read individually with
+            :func:`tauren.tables.read_column`.
         """
         
         log.info(f"* Exporting {file_name} data")
         
-        header = f"{key}\n{header}\n{','.join(self.observables[key].columns)}"
+        if isinstance(key, str):
+            key = self.observables.resolve(key)
         
-        np.savetxt(
+        format = tables.write_table(
             file_name,
             self.observables[key].data,
-            delimiter=sep,
+            self.observables[key].columns,
+            key=key,
+            header=header,
+            format=format,
+            sep=sep,
+            )
+        
+        log.info(f"    saved {file_name} ({format})")
+        
+        return
+    
+    def export_observables(
+            self,
+            file_name="observables.csv",
+            sep=",",
+            header="",
+            format=None,
+            **kwargs
+            ):
+        """
+        Exports all per frame observables to a single table.
+        
+        Observables whose first column is "frames" are joined on the
+        frame number. One "frames" column is written followed by the
+        columns of each observable, named "<datatype>:<column>", or
+        "<datatype>_<filenaming>:<column>" if several observables
+        share the datatype.
+        Frames missing in an observable are NaN.
+        Other observables, RMSFs for example, are skipped.
+        
+        The table is built once and written in a single pass.
+        
+        Parameters
+        ----------
+        file_name : str, optional
+            Defaults to "observables.csv".
+        
+        sep : str, optional
+            The column separator of text tables.
+            Defaults to comma ",".
+        
+        header : str, optional
+            Any text to add to the table header.
+        
+        format : str, optional ["csv", "npy", "npz", "hdf5", "raw"]
+            See :meth:`export_data`.
+        """
+        
+        log.info(f"* Exporting observables table {file_name}")
+        
+        per_frame = []
+        for key, observable in self.observables.items():
+            
+            if observable.columns[0] != "frames":
+                log.info(f"    skipping {key.datatype}, not per frame")
+                continue
+            
+            per_frame.append((key, observable))
+        
+        if not per_frame:
+            log.info("    there are no per frame observables to export")
+            return
+        
+        frames = np.unique(np.concatenate(
+            [observable.data[:, 0] for _, observable in per_frame]
+            ))
+        
+        n_columns = sum(len(obs.columns) - 1 for _, obs in per_frame)
+        table = np.full((frames.size, n_columns + 1), np.nan)
+        table[:, 0] = frames
+        
+        columns = ["frames"]
+        col = 1
+        for key, observable in per_frame:
+            
+            if len(self.observables.find(datatype=key.datatype)) > 1:
+                prefix = f"{key.datatype}_{key.filenaming}"
+            else:
+                prefix = key.datatype
+            
+            rows = np.searchsorted(frames, observable.data[:, 0])
+            width = len(observable.columns) - 1
+            
+            table[rows, col:col + width] = observable.data[:, 1:]
+            
+            columns.extend(
+                f"{prefix}:{name}"
+                for name in observable.columns[1:]
+                )
+            
+            col += width
+        
+        format = tables.write_table(
+            file_name,
+            table,
+            columns,
+            key="observables",
             header=header,
+            format=format,
+            sep=sep,
             )
         
-        log.info(f"    saved {file_name}")
+        log.info(
+            f"    saved {file_name} ({format}) with {len(per_frame)} "
+            f"observables and {frames.size} frames"
+            )
         
         return
 
 
 class TaurenMDAnalysis(TaurenTraj):
     
-    def __init__(self, trajectory, topology):
+    def __init__(self, trajectory, topology, **kwargs):
         
-        self.universe = mda.Universe(topology, trajectory)
+        self.universe = mda.Universe(topology, trajectory, **kwargs)
         self.topology = mda.Universe(topology)
         self.original_traj = self.universe.trajectory
         
@@ -1043,6 +2752,13 @@ class TaurenMDAnalysis(TaurenTraj):
     def _set_full_frames_list(self):
         super()._set_full_frames_list(self.original_traj.n_frames)
     
+    def _gen_chain_index(self):
+        # chains are identified by segid
+        return {
+            segment.segid: segment.atoms.indices
+            for segment in self.topology.segments
+            }
+    
     @property
     def original_traj(self):
         return self._original_traj
@@ -1096,6 +2812,16 @@ class TaurenMDAnalysis(TaurenTraj):
             inplace,
             ):
         
+        in_memory_bytes = self.original_traj.n_frames \
+            * self.universe.atoms.n_atoms * memory.coordinate_bytes
+        
+        if inplace \
+                and not isinstance(self.original_traj, MemoryReader) \
+                and not self._fits_memory(in_memory_bytes):
+            
+            self._align_traj_to_file(weights, file_name)
+            return
+        
         # https://www.mdanalysis.org/docs/documentation_pages/analysis/align.html#MDAnalysis.analysis.align.AlignTraj
         alignment = mdaalign.AlignTraj(
             self.universe,
@@ -1112,61 +2838,289 @@ class TaurenMDAnalysis(TaurenTraj):
         
         return
     
+    def _align_traj_to_file(self, weights, file_name):
+        """
+        Aligns all frames to <file_name> and reads the trajectory
+        from it, when the trajectory does not fit in the memory
+        budget to be aligned in memory.
+        """
+        
+        log.info(
+            f"    aligning to {file_name} to fit the memory budget, "
+            "frames are read from it afterwards"
+            )
+        
+        mdaalign.AlignTraj(
+            self.universe,
+            self.topology,
+            filename=file_name,
+            in_memory=False,
+            force=True,
+            verbose=True,
+            ).run()
+        
+        self.universe.load_new(file_name)
+        self.original_traj = self.universe.trajectory
+        
+        return
+    
+    def _resident_bytes(self):
+        
+        if isinstance(self.original_traj, MemoryReader):
+            return self.original_traj.get_array().nbytes
+        
+        return 0
+    
     def _frames2file(
             self,
             frames_to_extract,
             pdb_name_fmt,
+            workers,
+            processes,
+            max_pending=None,
             ):
         """
         frames_to_extract, list of frames index (int)
         pdb_name_fmt, "prefix_{FORMATTING CONDITION}.extension"
         """
         
-        # frames are treated separatelly to allow exception capture and log
-        for frame in frames_to_extract:
+        atoms = self.trajectory
+        
+        # each frame is read once, files are written by the workers
+        def jobs():
+            frame_indexes = [frame - 1 for frame in frames_to_extract]
             
-            try:
-                self.trajectory.write(
-                    filename=pdb_name_fmt.format(frame),
-                    frames=[frame],
-                    file_format="PDB",
-                    bonds=None,
+            for frame, ts in zip(
+                    frames_to_extract,
+                    self.original_traj[frame_indexes],
+                    ):
+                
+                yield (
+                    atoms,
+                    atoms.positions.copy(),
+                    _copy_dimensions(ts),
+                    pdb_name_fmt.format(frame),
                     )
+        
+        for file_name in parallel.bounded_map(
+                writers.write_mda_frame,
+                jobs(),
+                workers=workers,
+                processes=processes,
+                max_pending=max_pending,
+                ):
             
-            except IndexError as e:
-                log.info(self._err_frame_index.format(frame))
-                log.debug(e)
-                continue
-            
-            log.info(f"    extracted {pdb_name_fmt.format(frame)}")
+            log.info(f"    extracted {file_name}")
         
         return
     
+    def _gen_atoms_table(self):
+        
+        atoms = self.trajectory
+        
+        if hasattr(atoms, "chainIDs"):
+            chainids = atoms.chainIDs
+        else:
+            chainids = atoms.segids
+        
+        if hasattr(atoms, "elements"):
+            elements = atoms.elements
+        else:
+            elements = [""] * atoms.n_atoms
+        
+        return writers.AtomsTable(
+            names=atoms.names,
+            resnames=atoms.resnames,
+            chainids=chainids,
+            resids=atoms.resids,
+            segids=atoms.segids,
+            elements=elements,
+            )
+    
+    def _iter_frames(self, frames_list):
+        
+        atoms = self.trajectory
+        
+        for frame, ts in zip(
+                frames_list,
+                self.original_traj[[frame - 1 for frame in frames_list]],
+                ):
+            
+            yield frame, atoms.positions, _copy_dimensions(ts)
+    
+    def _select_atom_indexes(self, selection):
+        return self.universe.select_atoms(selection).indices
+    
+    def _read_frames(self, frames_list, atom_indexes):
+        
+        coordinates = np.empty(
+            (len(frames_list), len(atom_indexes), 3),
+            dtype=np.float32,
+            )
+        boxes = np.full((len(frames_list), 6), np.nan)
+        times = np.empty(len(frames_list))
+        
+        for ii, ts in enumerate(
+                self.original_traj[[frame - 1 for frame in frames_list]]
+                ):
+            
+            coordinates[ii] = ts.positions[atom_indexes]
+            times[ii] = ts.time
+            
+            if ts.dimensions is not None:
+                boxes[ii] = ts.dimensions
+        
+        if np.isnan(boxes).any():
+            boxes = None
+        
+        return coordinates, boxes, times
+    
+    def _read_references(self, ref_frame, atom_indexes):
+        
+        if isinstance(ref_frame, list):
+            return super()._read_references(ref_frame, atom_indexes)
+        
+        # as MDAnalysis RMSD, a single reference frame is read from
+        # the topology universe
+        self.topology.trajectory[ref_frame]
+        coordinates = \
+            self.topology.atoms.positions[atom_indexes].astype(np.float64)
+        
+        return [coordinates - coordinates.mean(axis=0)]
+    
+    def _rmsd_groups(self, chain_list, separated):
+        
+        selected = self._select_atom_indexes(self.atom_selection)
+        filtered_chains = self._filter_existent_chains(chain_list)
+        
+        groups = [
+            (chain, np.intersect1d(selected, self.chain_index[chain]))
+            for chain in filtered_chains
+            ]
+        
+        if separated:
+            return [(chain, atoms) for chain, atoms in groups if atoms.size]
+        
+        atoms = np.concatenate(
+            [np.empty(0, dtype=int)] + [atoms for _, atoms in groups]
+            )
+        
+        if atoms.size == 0:
+            log.info(
+                "   * EMPTY SELECTION ERROR *"
+                f" chains '{chain_list}' in '{self.atom_selection}'"
+                " give an empty selection.\n"
+                "* Aborting calculation..."
+                )
+            sys.exit(1)
+        
+        return [(None, np.sort(atoms))]
+    
+    def _open_traj_writer(self, file_name, atom_indexes):
+        return writers.MDATrajWriter(
+            self.universe.atoms[atom_indexes],
+            file_name,
+            )
+    
     def _save_traj(
             self,
             file_name,
+            chunk_size,
+            progress_interval,
             ):
         
         # https://www.mdanalysis.org/MDAnalysisTutorial/writing.html#trajectories
         selection = self.universe.select_atoms(self.atom_selection)
+        
+        # the writer thread works on its own copy of the selection
+        # while the reader thread moves through the trajectory
+        frame_universe = mda.Merge(selection)
+        frame_ts = frame_universe.trajectory.ts
+        
+        n_frames = len(self.sliced_frames_list)
+        exported = 0
+        
+        def read_chunks():
+            chunk = []
+            for ts in self.original_traj[self._fslicer]:
+                chunk.append(
+                    (selection.positions, _copy_dimensions(ts), ts.time)
+                    )
+                if len(chunk) == chunk_size:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+        
         with mda.Writer(file_name, selection.n_atoms) as W:
-            for ts in self.original_traj[self._fslicer]:
-                W.write(selection)
-                log.info(f"    exported {ts}")
+            
+            def write_chunk(chunk):
+                nonlocal exported
+                for positions, dimensions, time in chunk:
+                    frame_universe.atoms.positions = positions
+                    frame_universe.dimensions = dimensions
+                    frame_ts.time = time
+                    W.write(frame_universe.atoms)
+                    exported += 1
+                    if exported % progress_interval == 0:
+                        log.info(f"    exported {exported}/{n_frames} frames")
+            
+            parallel.pipeline(read_chunks(), write_chunk, max_pending=2)
+        
+        if exported % progress_interval:
+            log.info(f"    exported {exported}/{n_frames} frames")
         
         return
     
+    def _get_shard_writer(self):
+        return writers.write_mda_shard
+    
+    def _gen_shard_jobs(self, shard_frames, part_names):
+        
+        trajectory = self.universe.trajectory
+        
+        # workers open their own Universe from the input files,
+        # trajectories held in memory (aligned inplace, for
+        # example) are sent as coordinates
+        in_memory = isinstance(trajectory, MemoryReader)
+        
+        if not in_memory:
+            traj_files = getattr(trajectory, "filenames", None)
+            if traj_files is None:
+                traj_files = trajectory.filename
+            else:
+                traj_files = list(traj_files)
+        
+        for frames, part_name in zip(shard_frames, part_names):
+            
+            frame_indexes = [frame - 1 for frame in frames]
+            
+            if in_memory:
+                source = trajectory.coordinate_array[frame_indexes]
+                frame_indexes = list(range(len(frame_indexes)))
+            else:
+                source = traj_files
+            
+            yield (
+                self.universe.filename,
+                source,
+                self.atom_selection,
+                frame_indexes,
+                part_name,
+                )
+    
     def _calc_rmsds_combined_chains(
             self,
             chain_list,
             ref_frame,
+            ref_structure=None,
+            ref_weights=None,
             ):
         
-        absolute_selector = self._gen_selector(chain_list)
-        
-        chain_selectors = absolute_selector.split(" or ")
-        
-        filtered_selectors = self._filter_existent_selectors(chain_selectors)
+        filtered_selectors = list(map(
+            lambda x: self._gen_selector([x]),
+            self._filter_existent_chains(chain_list),
+            ))
         
         log.debug(f"chain_selector: {filtered_selectors}")
         
@@ -1196,6 +3150,25 @@ class TaurenMDAnalysis(TaurenTraj):
                 )
             sys.exit(1)
         
+        if ref_structure:
+            prepared = self._get_reference(
+                ref_structure,
+                final_selection,
+                weights=ref_weights,
+                )
+            
+            return self._fit_rmsds(
+                self.universe.select_atoms(final_selection),
+                [prepared.coordinates],
+                weights=prepared.weights,
+                )[:, 0]
+        
+        if isinstance(ref_frame, list):
+            return self._calc_rmsds_multiple_refs(
+                self.universe.select_atoms(final_selection),
+                ref_frame,
+                )
+        
         # https://www.mdanalysis.org/docs/documentation_pages/analysis/align.html#rms-fitting-tutorial
         # https://www.mdanalysis.org/docs/documentation_pages/analysis/rms.html#MDAnalysis.analysis.rms.RMSD
         R = mdaRMSD(
@@ -1210,37 +3183,141 @@ class TaurenMDAnalysis(TaurenTraj):
         
         return R.rmsd[:, 2][self._fslicer]  # numpy array
     
+    def _calc_rmsds_multiple_refs(self, atoms, ref_frames):
+        """
+        Calculates RMSDs of <atoms> against several reference frames
+        reading each trajectory frame only once.
+        
+        Parameters
+        ----------
+        atoms : MDAnalysis.AtomGroup
+            The atoms upon which RMSDs are calculated.
+        
+        ref_frames : list of ints
+            Indexes of the reference frames in the current slicing.
+        
+        Returns
+        -------
+        np.ndarray of shape=(n_frames, len(ref_frames))
+        """
+        
+        sliced_frames = self.sliced_frames_list
+        
+        # reference coordinates are centred only once
+        references = []
+        for ref_frame in ref_frames:
+            
+            try:
+                self.original_traj[sliced_frames[ref_frame] - 1]
+            
+            except IndexError as e:
+                log.info(self._err_frame_index.format(ref_frame))
+                log.debug(e)
+                raise
+            
+            references.append(atoms.positions - atoms.center_of_geometry())
+        
+        return self._fit_rmsds(atoms, references)
+    
+    def _fit_rmsds(self, atoms, references, weights=None):
+        """
+        Calculates RMSDs of <atoms> against centred reference
+        coordinates in a single pass over the current frame slicing.
+        
+        Parameters
+        ----------
+        atoms : MDAnalysis.AtomGroup
+            The atoms upon which RMSDs are calculated.
+        
+        references : list of np.ndarray, shape=(N, 3)
+            Reference coordinates, already centred.
+        
+        weights : np.ndarray, shape=(N,), optional
+            Atom weights for centring and fitting.
+        
+        Returns
+        -------
+        np.ndarray of shape=(n_frames, len(references))
+        """
+        
+        for ref_coords in references:
+            if ref_coords.shape[0] != atoms.n_atoms:
+                _err = (
+                    "* ERROR * Reference and trajectory selections"
+                    f" differ in number of atoms: {ref_coords.shape[0]}"
+                    f" vs. {atoms.n_atoms}"
+                    )
+                log.info(_err)
+                raise ValueError(_err)
+        
+        rmsds = np.empty((self.n_frames, len(references)))
+        
+        for ii, _ in enumerate(self.original_traj[self._fslicer]):
+            
+            positions = atoms.positions
+            mobile = \
+                positions - np.average(positions, axis=0, weights=weights)
+            
+            for jj, ref_coords in enumerate(references):
+                rmsds[ii, jj] = mdarmsd(
+                    mobile,
+                    ref_coords,
+                    weights=weights,
+                    center=False,
+                    superposition=True,
+                    )
+        
+        return rmsds
+    
     def _calc_rmsds_separated_chains(
             self,
             chain_list,
             ref_frame,
+            ref_structure=None,
+            ref_weights=None,
             ):
         
-        absolute_selector = self._gen_selector(chain_list)
+        filtered_chains = self._filter_existent_chains(chain_list)
         
-        chain_selectors = absolute_selector.split(" or ")
-        
-        filtered_selectors = self._filter_existent_selectors(chain_selectors)
-        
-        rmsds = np.empty((self.n_frames, len(filtered_selectors)))
+        rmsds = np.empty((self.n_frames, len(filtered_chains)))
         
         subplot_has_data = []
         
-        for ii, chain_selector in enumerate(filtered_selectors):
+        selected_atoms = self.universe.select_atoms(self.atom_selection)
+        
+        for ii, chain in enumerate(filtered_chains):
             
             final_selection = (
                 f"{self.atom_selection}"
-                f" and ({chain_selector})"
+                f" and ({self._gen_selector([chain])})"
                 )
             
-            atoms = self.universe.select_atoms(final_selection)
+            atoms = selected_atoms.intersection(
+                self.universe.atoms[self.chain_index[chain]]
+                )
             
             if len(atoms) == 0:
                 log.debug("len of atoms is 0. Continuing...")
                 subplot_has_data.append(False)
                 continue
             
-            atoms_top = self.topology.select_atoms(final_selection)
+            if ref_structure:
+                prepared = self._get_reference(
+                    ref_structure,
+                    final_selection,
+                    weights=ref_weights,
+                    )
+                
+                rmsds[:, ii] = self._fit_rmsds(
+                    atoms,
+                    [prepared.coordinates],
+                    weights=prepared.weights,
+                    )[:, 0]
+                
+                subplot_has_data.append(True)
+                continue
+            
+            atoms_top = self.topology.atoms[atoms.indices]
             
             R = mdaRMSD(
                 atoms,
@@ -1256,16 +3333,11 @@ class TaurenMDAnalysis(TaurenTraj):
             
             subplot_has_data.append(True)
         
-        column_headers = list(map(
-            lambda x: x.replace("segid ", ""),
-            filtered_selectors
-            ))
-        
-        assert isinstance(column_headers, list), "c_selectors NOT list!"
+        assert isinstance(filtered_chains, list), "c_selectors NOT list!"
         
         return (
             rmsds[:, subplot_has_data],
-            np.array(column_headers)[subplot_has_data],
+            np.array(filtered_chains)[subplot_has_data],
             )
     
     def _gen_chain_list(
@@ -1276,7 +3348,7 @@ class TaurenMDAnalysis(TaurenTraj):
         log.debug(f"input chains: {chains}")
         
         if chains == "all":
-            chain_list = list(string.ascii_letters + string.digits)
+            chain_list = list(self.chain_index)
         
         elif isinstance(chains, str) and chains.count(",") == 0:
             chain_list = [chains]
@@ -1292,6 +3364,72 @@ class TaurenMDAnalysis(TaurenTraj):
         
         return chain_list
     
+    def _fit_chunks(
+            self,
+            chain_list,
+            ref_frame,
+            chunk_size,
+            ):
+        
+        filtered_chains = self._filter_existent_chains(chain_list)
+        
+        chains_atoms = np.concatenate(
+            [np.empty(0, dtype=int)]
+            + [self.chain_index[c] for c in filtered_chains]
+            )
+        
+        atoms = self.universe.select_atoms(self.atom_selection).intersection(
+            self.universe.atoms[chains_atoms]
+            )
+        
+        if len(atoms) == 0:
+            log.info(
+                "   * EMPTY SELECTION ERROR *"
+                f" chains '{chain_list}' in '{self.atom_selection}'"
+                " give an empty selection.\n"
+                "* Aborting calculation..."
+                )
+            sys.exit(1)
+        
+        self.original_traj[self.sliced_frames_list[ref_frame] - 1]
+        reference_coords = atoms.positions - atoms.center_of_geometry()
+        
+        def chunks():
+            
+            chunk = np.empty((chunk_size, atoms.n_atoms, 3))
+            
+            ii = 0
+            for _ in self.original_traj[self._fslicer]:
+                
+                mobile = atoms.positions - atoms.center_of_geometry()
+                rotation, _ = mdaalign.rotation_matrix(
+                    mobile,
+                    reference_coords,
+                    )
+                chunk[ii] = mobile @ rotation.T
+                ii += 1
+                
+                if ii == chunk_size:
+                    yield chunk
+                    ii = 0
+            
+            if ii:
+                yield chunk[:ii]
+        
+        return FittedChunks(
+            reference=reference_coords.astype(np.float64),
+            atom_indexes=atoms.indices,
+            residue_indexes=atoms.resindices,
+            chunks=chunks(),
+            )
+    
+    @staticmethod
+    def _parse_ref_structure(ref_structure, selection):
+        
+        atoms = mda.Universe(ref_structure).select_atoms(selection)
+        
+        return atoms.positions, atoms.masses
+    
     def _filter_existent_selectors(self, selectors_list):
         
         # https://www.mdanalysis.org/docs/documentation_pages/selections.html#simple-selections
@@ -1312,9 +3450,15 @@ class TaurenMDAnalysis(TaurenTraj):
 
 class TaurenMDTraj(TaurenTraj):
     
+    _length_unit = 10.0
+    _concurrent_frame_reads = True
+    
     def __init__(self, trajectory, topology):
         
-        traj_ = mdtraj.load(trajectory, top=topology)
+        if isinstance(trajectory, mdtraj.Trajectory):
+            traj_ = trajectory
+        else:
+            traj_ = mdtraj.load(trajectory, top=topology)
         self.original_traj = traj_
         self.topology = traj_.topology
         
@@ -1325,6 +3469,13 @@ class TaurenMDTraj(TaurenTraj):
     def _set_full_frames_list(self):
         super()._set_full_frames_list(self.original_traj.n_frames)
     
+    def _gen_chain_index(self):
+        # chains are identified by chainid, the chain order
+        return {
+            str(chain.index): np.array([atom.index for atom in chain.atoms])
+            for chain in self.original_traj.topology.chains
+            }
+    
     @property
     def original_traj(self):
         return self._trajectory
@@ -1349,7 +3500,7 @@ class TaurenMDTraj(TaurenTraj):
             f"returning sliced traj for atoms '{self.atom_selection}'"
             f" in frames '{self._fslicer}'"
             )
-
+        
         return sliced_traj[self._fslicer]
     
     @TaurenTraj.totaltime.getter
@@ -1401,6 +3552,8 @@ class TaurenMDTraj(TaurenTraj):
         log.info("* Removing solvent...")
         log.info(f"    received trajectory: {self.trajectory}")
         
+        self._check_view_copy("remove_solvent")
+        
         new_traj = self.trajectory.remove_solvent(
             inplace=False,
             exclude=exclude
@@ -1410,6 +3563,7 @@ class TaurenMDTraj(TaurenTraj):
         
         if inplace:
             self.original_traj = new_traj
+            self._update_chain_index()
             return None
         
         else:
@@ -1436,6 +3590,8 @@ class TaurenMDTraj(TaurenTraj):
         """
         log.info("* Trying imaging molecules... this can take a while...")
         
+        self._check_view_copy("image_molecules")
+        
         new_traj = self.trajectory.image_molecules(
             inplace=False,
             anchor_molecules=anchor_molecules,
@@ -1447,6 +3603,13 @@ class TaurenMDTraj(TaurenTraj):
         log.info("    completed.")
         
         if inplace:
+            self._record_transformation(
+                "image_molecules",
+                anchor_molecules=anchor_molecules,
+                other_molecules=other_molecules,
+                sorted_bonds=sorted_bonds,
+                make_whole=make_whole,
+                )
             self.trajectory = new_traj
             return None
         
@@ -1469,35 +3632,205 @@ class TaurenMDTraj(TaurenTraj):
             self,
             frames_to_extract,
             pdb_name_fmt,
+            workers,
+            processes,
+            max_pending=None,
             ):
         """
         frames_to_extract, list of frames index (int)
         pdb_name_fmt, "prefix_{FORMATTING CONDITION}.extension"
         """
         
-        for frame in frames_to_extract:
+        selected = self.original_traj.topology.select(self.atom_selection)
+        chunk_size = max_pending or len(frames_to_extract)
         
-            try:
-                slice_ = self.trajectory.slice(frame, copy=True)
+        # a subset is built once per chunk of frames
+        def jobs():
+            for start in range(0, len(frames_to_extract), chunk_size):
+                
+                frames = frames_to_extract[start:start + chunk_size]
+                subset = self.original_traj[
+                    [frame - 1 for frame in frames]
+                    ].atom_slice(selected)
+                
+                for ii, frame in enumerate(frames):
+                    yield subset[ii], pdb_name_fmt.format(frame)
+        
+        for file_name in parallel.bounded_map(
+                writers.save_mdtraj_frame,
+                jobs(),
+                workers=workers,
+                processes=processes,
+                max_pending=max_pending,
+                ):
             
-            except IndexError as e:
-                log.info(self._err_frame_index.format(frame))
-                log.debug(e)
-                continue
-        
-            pdb_name = pdb_name_fmt.format(frame)
-            slice_.save_pdb(pdb_name)
-            log.info(f"    extracted {pdb_name}")
+            log.info(f"    extracted {file_name}")
         
         return
     
+    def _gen_atoms_table(self):
+        
+        atoms = [
+            self.original_traj.topology.atom(ii)
+            for ii in self.original_traj.topology.select(self.atom_selection)
+            ]
+        
+        return writers.AtomsTable(
+            names=[a.name for a in atoms],
+            resnames=[a.residue.name for a in atoms],
+            chainids=[
+                a.residue.chain.chain_id
+                or chr(65 + a.residue.chain.index % 26)
+                for a in atoms
+                ],
+            resids=[a.residue.resSeq for a in atoms],
+            segids=[a.segment_id for a in atoms],
+            elements=[
+                a.element.symbol if a.element is not None else ""
+                for a in atoms
+                ],
+            )
+    
+    def _iter_frames(self, frames_list):
+        
+        selected = self.original_traj.topology.select(self.atom_selection)
+        
+        for frame in frames_list:
+            
+            frame_traj = self.original_traj[frame - 1]
+            
+            # MDTraj works in nanometers
+            coordinates = frame_traj.xyz[0, selected] * 10
+            
+            if frame_traj.unitcell_lengths is None:
+                box = None
+            else:
+                box = np.concatenate((
+                    frame_traj.unitcell_lengths[0] * 10,
+                    frame_traj.unitcell_angles[0],
+                    ))
+            
+            yield frame, coordinates, box
+    
+    def _select_atom_indexes(self, selection):
+        return self.original_traj.topology.select(selection)
+    
+    def _read_frames(self, frames_list, atom_indexes):
+        
+        positions = np.asarray(frames_list) - 1
+        traj = self.original_traj
+        
+        # MDTraj works in nanometers
+        coordinates = traj.xyz[positions[:, np.newaxis], atom_indexes] * 10
+        times = traj.time[positions]
+        
+        if traj.unitcell_lengths is None:
+            return coordinates, None, times
+        
+        boxes = np.column_stack((
+            traj.unitcell_lengths[positions] * 10,
+            traj.unitcell_angles[positions],
+            ))
+        
+        return coordinates, boxes, times
+    
+    def _check_view_copy(self, label):
+        """
+        Warns if the copy of the current selection and slicing
+        MDTraj transformations work on is over the memory budget.
+        """
+        
+        n_atoms = self._select_atom_indexes(self.atom_selection).size
+        
+        self._fits_memory(
+            self.n_frames * n_atoms * memory.coordinate_bytes,
+            label,
+            )
+    
+    def _open_traj_writer(self, file_name, atom_indexes):
+        
+        if file_name.lower().endswith(".dcd"):
+            return writers.MDTrajDCDWriter(file_name)
+        
+        return None
+    
+    def _resident_bytes(self):
+        
+        traj = self.original_traj
+        
+        if traj.unitcell_lengths is None:
+            return traj.xyz.nbytes
+        
+        return traj.xyz.nbytes \
+            + traj.unitcell_lengths.nbytes \
+            + traj.unitcell_angles.nbytes
+    
+    def _rmsd_groups(self, chain_list, separated):
+        
+        if not(all(str(s).isdigit() for s in chain_list)):
+            raise ValueError(
+                "MDTraj requires chainid as integer values: "
+                f"given: {chain_list}")
+        
+        if separated:
+            return [
+                (str(chain), self._gen_chains_slicer([chain]))
+                for chain in chain_list
+                ]
+        
+        chain_list = self._filter_existent_chains(chain_list)
+        
+        return [(None, self._gen_chains_slicer(chain_list))]
+    
     def _save_traj(
             self,
             file_name,
+            chunk_size,
+            progress_interval,
             ):
         
+        atom_indexes = self._select_atom_indexes(self.atom_selection)
+        copy_bytes = \
+            self.n_frames * atom_indexes.size * memory.coordinate_bytes
+        
+        writer = None
+        if not self._fits_memory(copy_bytes):
+            writer = self._open_traj_writer(file_name, atom_indexes)
+        
+        if writer is not None:
+            log.info("    writing in chunks to fit the memory budget")
+            self._save_traj_chunks(
+                writer,
+                atom_indexes,
+                chunk_size,
+                progress_interval,
+                )
+            return
+        
+        self._fits_memory(copy_bytes, "save_traj")
+        
+        # MDTraj holds the trajectory in memory, there is no reading
+        # to overlap with writing
         self.trajectory.save(file_name, force_overwrite=True)
         
+        log.info(f"    exported {self.trajectory.n_frames} frames")
+        
+        return
+    
+    def _get_shard_writer(self):
+        return writers.save_mdtraj_shard
+    
+    def _gen_shard_jobs(self, shard_frames, part_names):
+        
+        # the trajectory is in memory, each part is sent to its worker
+        selected = self.original_traj.topology.select(self.atom_selection)
+        
+        for frames, part_name in zip(shard_frames, part_names):
+            
+            part = self.original_traj[[frame - 1 for frame in frames]]
+            
+            yield part.atom_slice(selected), part_name
+        
         return
     
     def _gen_chain_list(
@@ -1509,7 +3842,13 @@ class TaurenMDTraj(TaurenTraj):
         
         if chains == "all":
             
-            chain_list = list(range(self.trajectory.n_chains))
+            # only chains sharing atoms with the current atom selection
+            selected = self.original_traj.topology.select(self.atom_selection)
+            chain_list = [
+                chain
+                for chain, atoms in self.chain_index.items()
+                if np.intersect1d(atoms, selected).size
+                ]
         
         elif isinstance(chains, str) \
                 and chains.isalpha() or chains.isdigit():
@@ -1547,6 +3886,8 @@ class TaurenMDTraj(TaurenTraj):
             self,
             chain_list,
             ref_frame,
+            ref_structure=None,
+            ref_weights=None,
             ):
         
         if not(all(str(s).isdigit() for s in chain_list)):
@@ -1556,57 +3897,169 @@ class TaurenMDTraj(TaurenTraj):
         
         log.debug(f"chain_list: {chain_list}")
         
+        chain_list = self._filter_existent_chains(chain_list)
+        
         chain_selector = self._gen_selector(
             chain_list,
             selection="chainid",
             boolean="or",
             )
         
-        sliced_traj = self._atom_slice_traj(chain_selector)
+        sliced_traj = self._atom_slice_traj(chain_list)
         
         log.debug(f"len sliced_traj: {len(sliced_traj)}")
         
         combined_rmsds = self._calc_rmsds(
             sliced_traj,
             ref_frame=ref_frame,
+            reference=self._get_mdtraj_reference(
+                ref_structure,
+                chain_selector,
+                ref_weights,
+                ),
             )
         
         log.debug(f"combined_rmsds: {combined_rmsds.shape}")
         
-        assert combined_rmsds.size == self.n_frames, (
-            f"combined_rmsds size '{combined_rmsds.size}' NOT matching"
+        assert combined_rmsds.shape[0] == self.n_frames, (
+            f"combined_rmsds size '{combined_rmsds.shape[0]}' NOT matching"
             f" n_frames '{self.n_frames}'."
             )
         return combined_rmsds
     
-    def _atom_slice_traj(self, selector):
+    def _fit_chunks(
+            self,
+            chain_list,
+            ref_frame,
+            chunk_size,
+            ):
+        
+        chain_list = self._filter_existent_chains(chain_list)
+        
+        atom_indexes = self._gen_chains_slicer(chain_list)
+        topology = self.original_traj.topology.subset(atom_indexes)
+        
+        positions = np.asarray(self.sliced_frames_list) - 1
+        xyz = self.original_traj.xyz
+        
+        reference = mdtraj.Trajectory(
+            xyz[positions[ref_frame], atom_indexes],
+            topology,
+            )
+        
+        def chunks():
+            for start in range(0, positions.size, chunk_size):
+                
+                # each chunk is a copy, fits in place
+                chunk = mdtraj.Trajectory(
+                    xyz[positions[start:start + chunk_size, np.newaxis],
+                        atom_indexes],
+                    topology,
+                    )
+                chunk.superpose(reference)
+                
+                yield chunk.xyz
+        
+        residue_indexes = np.array([
+            self.original_traj.topology.atom(i).residue.index
+            for i in atom_indexes
+            ])
+        
+        return FittedChunks(
+            reference=reference.xyz[0].astype(np.float64),
+            atom_indexes=atom_indexes,
+            residue_indexes=residue_indexes,
+            chunks=chunks(),
+            )
+    
+    def _atom_slice_traj(self, chain_list):
         """
-        Slices trajectory according to selector.
+        Slices trajectory to the atoms of the chains in <chain_list>
+        within the current atom selection, using :attr:`chain_index`.
         Returns a sliced_traj.
         """
         
-        slicer = self.original_traj.topology.select(selector)
+        slicer = self._gen_chains_slicer(chain_list)
+        
+        sliced_traj = self.original_traj.atom_slice(slicer, inplace=False)
+        
+        return sliced_traj[self._fslicer]
+    
+    def _gen_chains_slicer(self, chain_list):
+        """
+        Returns the atom indexes of the chains in <chain_list>
+        within the current atom selection, using :attr:`chain_index`.
+        """
         
         try:
-            sliced_traj = self.trajectory.atom_slice(slicer, inplace=False)
+            chain_atoms = np.concatenate(
+                [self.chain_index[str(c)] for c in chain_list]
+                )
         
-        except IndexError as e:
+        except (KeyError, ValueError) as e:
             log.debug(e)
             log.info(
-                f"* ERROR * Could not slice traj using slicer '{selector}'."
-                f" Most likely the slicer does NOT share selection"
+                f"* ERROR * chains '{chain_list}' do NOT exist.\n"
+                "* Aborting calculation *"
+                )
+            sys.exit(1)
+        
+        slicer = np.intersect1d(
+            self.original_traj.topology.select(self.atom_selection),
+            chain_atoms,
+            )
+        
+        if slicer.size == 0:
+            log.info(
+                f"* ERROR * Could not slice traj using chains '{chain_list}'."
+                f" Most likely the chains do NOT share selection"
                 f" with the general atom selection '{self.atom_selection}'.\n"
                 "* Aborting calculation *"
                 )
             sys.exit(1)
         
-        return sliced_traj
+        return slicer
+    
+    def _get_mdtraj_reference(self, ref_structure, selector, weights):
+        """
+        Returns the prepared reference for the atoms selected by
+        <selector> within the current atom selection.
+        Returns None if <ref_structure> is None.
+        """
+        
+        if not ref_structure:
+            return None
+        
+        if weights:
+            log.info(
+                "* IMPORTANT *"
+                " weighted RMSDs are NOT implemented in Tauren-MD"
+                " for MDTraj library. Ignoring ref_weights..."
+                )
+        
+        return self._get_reference(
+            ref_structure,
+            f"({self.atom_selection}) and ({selector})",
+            )
+    
+    @staticmethod
+    def _parse_ref_structure(ref_structure, selection):
+        
+        ref_traj = mdtraj.load(ref_structure)
+        atom_indexes = ref_traj.topology.select(selection)
+        
+        masses = np.array([
+            ref_traj.topology.atom(i).element.mass for i in atom_indexes
+            ])
+        
+        return ref_traj.xyz[0, atom_indexes], masses
     
     @staticmethod
     def _calc_rmsds(
             trajectory,
             *,
             ref_frame=0,
+            reference=None,
             **kwargs
             ):
         """
@@ -1617,22 +4070,75 @@ class TaurenMDTraj(TaurenTraj):
         trajectory : mdtraj.Trajectory
             The trajectory upon which operate.
         
-        ref_frame : int, optional
+        ref_frame : int or list of ints, optional
             Defaults to 0.
             The reference frame for RMSDs calculation.
+            If list, <trajectory> is centered once (IN PLACE) and
+            RMSDs are calculated against each reference frame.
+        
+        reference : :class:`tauren.reference.PreparedReference`, optional
+            An external prepared reference. If given, ref_frame is
+            ignored and <trajectory> is centered IN PLACE.
         
         Return
         ------
         np.ndarray : float
-            The calculated RMSDs.
+            The calculated RMSDs, shape=(n_frames,) or
+            shape=(n_frames, len(ref_frame)) if ref_frame is list.
         """
-        rmsds = mdtraj.rmsd(
-            trajectory,
-            trajectory,
-            frame=ref_frame,
-            parallel=True,
-            precentered=False,
-            )
+        if reference is not None:
+            
+            if reference.coordinates.shape[0] != trajectory.n_atoms:
+                _err = (
+                    "* ERROR * Reference and trajectory selections"
+                    " differ in number of atoms:"
+                    f" {reference.coordinates.shape[0]}"
+                    f" vs. {trajectory.n_atoms}"
+                    )
+                log.info(_err)
+                raise ValueError(_err)
+            
+            ref_traj = mdtraj.Trajectory(
+                reference.coordinates[np.newaxis],
+                trajectory.topology,
+                )
+            
+            # coordinates are already centred, this only
+            # computes the traces mdtraj needs for precentered=True
+            ref_traj.center_coordinates()
+            trajectory.center_coordinates()
+            
+            rmsds = mdtraj.rmsd(
+                trajectory,
+                ref_traj,
+                frame=0,
+                parallel=True,
+                precentered=True,
+                )
+        
+        elif isinstance(ref_frame, list):
+            
+            trajectory.center_coordinates()
+            
+            rmsds = np.column_stack([
+                mdtraj.rmsd(
+                    trajectory,
+                    trajectory,
+                    frame=r,
+                    parallel=True,
+                    precentered=True,
+                    )
+                for r in ref_frame
+                ])
+        
+        else:
+            rmsds = mdtraj.rmsd(
+                trajectory,
+                trajectory,
+                frame=ref_frame,
+                parallel=True,
+                precentered=False,
+                )
     
         log.debug(
             f"<rmsds>: max {rmsds.max()},"
@@ -1646,18 +4152,24 @@ class TaurenMDTraj(TaurenTraj):
             self,
             chain_list,
             ref_frame,
+            ref_structure=None,
+            ref_weights=None,
             ):
         
         rmsds = np.empty((self.n_frames, len(chain_list)))
         
         for index, chain in enumerate(chain_list):
             
-            sliced_traj_single_chain = \
-                self._atom_slice_traj(f"chainid {chain}")
+            sliced_traj_single_chain = self._atom_slice_traj([chain])
             
             rmsds[:, index] = self._calc_rmsds(
                 sliced_traj_single_chain,
                 ref_frame=ref_frame,
+                reference=self._get_mdtraj_reference(
+                    ref_structure,
+                    f"chainid {chain}",
+                    ref_weights,
+                    ),
                 )
         
         chain_list = list(map(lambda x: str(x), chain_list))
@@ -1670,38 +4182,10 @@ class TaurenMDTraj(TaurenTraj):
         return rmsds, chain_list
 
 
-class TrajObservables(dict):
+def _copy_dimensions(ts):
     """
-    Stores observables obtained from traj analysis.
+    Returns a copy of the unit cell of an MDAnalysis Timestep, or
+    None. Readers update the dimensions of their Timestep in place
+    when moving to the next frame.
     """
-    
-    def store(self, key, data):
-        """
-        Stored data with key.
-        
-        Warns user and ignores execution if key exists.
-        """
-        
-        if not(isinstance(key, StorageKey)):
-            raise TypeError(f"key should be namedtuple, '{type(key)}' given.")
-        
-        if not(isinstance(data, StorageData)):
-            raise TypeError(f"data sould be SorageData, '{type(data)}' given.")
-        
-        if key in self:
-            
-            log.warning(
-                "* WARNING *"
-                f" The storage keyword {key} already exists in the"
-                " trajectory observables data base."
-                )
-            
-            key.datatype = f"{key.datatype}_"
-            
-            log.warning(
-                f" CHANGING KEY TO... {key}"
-                )
-            
-        self.setdefault(key, data)
-        
-        return
+    return None if ts.dimensions is None else ts.dimensions.copy()
@@ -0,0 +1,79 @@
+import os
+
+import numpy as np
+
+from tauren import cache
+from tauren import storage
+
+
+def _put(results_cache, input_file, name):
+    
+    key = storage.StorageKey(name, name, name, "all", ("A",))
+    cache_key = results_cache.gen_key([input_file], calculation=name)
+    
+    results_cache.put(cache_key, key, ["frames", name], np.ones((100, 2)))
+    
+    return cache_key
+
+
+def test_results_cache_content_key(tmp_path):
+    """keys follow file content, cached observables are read back"""
+    
+    input_file = tmp_path.joinpath("traj.dcd")
+    input_file.write_text("frames")
+    
+    results_cache = cache.ResultsCache(tmp_path.joinpath("rc"))
+    cache_key = _put(results_cache, input_file, "rmsd")
+    
+    assert cache_key in results_cache
+    
+    key, columns, data, columnar = results_cache.get(cache_key)
+    
+    assert storage.StorageKey(**key).datatype == "rmsd"
+    assert columns == ["frames", "rmsd"]
+    assert np.array_equal(data, np.ones((100, 2)))
+    assert not columnar
+    
+    input_file.write_text("other frames")
+    
+    assert results_cache.gen_key([input_file], calculation="rmsd") \
+        != cache_key
+    assert (results_cache.hits, results_cache.misses) == (1, 0)
+
+
+def test_results_cache_eviction(tmp_path):
+    """least recently used observables are removed first"""
+    
+    input_file = tmp_path.joinpath("traj.dcd")
+    input_file.write_text("frames")
+    
+    results_cache = cache.ResultsCache(tmp_path, max_size_mb=0.007)
+    
+    first = _put(results_cache, input_file, "a")
+    second = _put(results_cache, input_file, "b")
+    
+    # older access time for the second observable
+    os.utime(tmp_path.joinpath(f"{second}.npz"), ns=(0, 0))
+    results_cache.get(first)
+    
+    _put(results_cache, input_file, "c")
+    
+    assert results_cache.get(second) is None
+    assert results_cache.get(first) is not None
+    assert results_cache.size <= results_cache.max_size
+
+
+def test_cached_keys_unversioned():
+    """keys are cached as calculated, before versioning"""
+    
+    key = storage.StorageKey("rmsd", "rmsd", "rmsd_all", "all", ("A",))
+    
+    observables = storage.TrajObservables()
+    observables.store(key, storage.StorageData(["frames"], np.ones((2, 1))))
+    versioned = observables.store(
+        key,
+        storage.StorageData(["frames"], np.ones((2, 1))),
+        )
+    
+    assert versioned.filenaming == "rmsd_all_v1"
+    assert cache.unversioned(versioned) == key
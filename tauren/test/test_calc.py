@@ -0,0 +1,51 @@
+import numpy as np
+
+from tauren import calc
+
+
+def test_running_mean_var_chunks():
+    """chunked accumulation equals the two pass variance"""
+    
+    samples = np.random.default_rng(0).normal(size=(53, 4, 3))
+    
+    acc = calc.RunningMeanVar((4, 3))
+    for start in range(0, 53, 10):
+        acc.update(samples[start:start + 10])
+    
+    assert np.allclose(acc.mean, samples.mean(axis=0))
+    assert np.allclose(acc.variance, samples.var(axis=0))
+
+
+def test_residue_means():
+    """per atom values are averaged over contiguous residues"""
+    
+    values = np.array([1.0, 3.0, 5.0, 2.0, 4.0, 6.0])
+    residues = np.array([0, 0, 0, 1, 2, 2])
+    
+    assert np.allclose(calc.residue_means(values, residues), [3, 2, 5])
+
+
+def test_superposed_rmsds_rotated_frames():
+    """rotated and translated copies of the reference have zero RMSD"""
+    
+    rng = np.random.default_rng(1)
+    reference = rng.normal(size=(12, 3))
+    reference -= reference.mean(axis=0)
+    
+    angle = 0.7
+    rotation = np.array([
+        [np.cos(angle), -np.sin(angle), 0],
+        [np.sin(angle), np.cos(angle), 0],
+        [0, 0, 1],
+        ])
+    
+    noise = rng.normal(scale=0.1, size=(12, 3))
+    mobile = np.array([
+        reference @ rotation.T + 5,
+        reference + noise,
+        ])
+    
+    rmsds = calc.superposed_rmsds(mobile, reference)
+    
+    assert np.isclose(rmsds[0], 0, atol=1e-6)
+    assert rmsds[1] <= np.sqrt((noise ** 2).sum(axis=1).mean())
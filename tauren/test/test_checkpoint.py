@@ -0,0 +1,43 @@
+from tauren import checkpoint
+
+
+def test_checkpoint_resume_unchanged_actions(tmp_path):
+    """the last checkpoint before the changed action is restored"""
+    
+    input_file = tmp_path.joinpath("traj.dcd")
+    input_file.write_text("frames")
+    
+    actions = [("frame_slice", {"step": 1}), ("plot", {"alpha": 0.7})]
+    digests = checkpoint.chain_digests([input_file], "mdtraj", actions)
+    
+    checkpoints = checkpoint.Checkpoints(tmp_path.joinpath("cp"))
+    checkpoints.save(0, digests, {"state": 0})
+    checkpoints.save(1, digests, {"state": 1})
+    
+    actions[1] = ("plot", {"alpha": 0.5})
+    changed = checkpoint.chain_digests([input_file], "mdtraj", actions)
+    
+    assert changed[0] == digests[0]
+    assert checkpoints.restore(changed) == (0, {"state": 0})
+    
+    actions[0] = ("frame_slice", {"step": 2})
+    changed = checkpoint.chain_digests([input_file], "mdtraj", actions)
+    
+    assert checkpoints.restore(changed) is None
+
+
+def test_checkpoints_folder(tmp_path):
+    """the folder is created on save, other pickles are ignored"""
+    
+    folder = tmp_path.joinpath("cp")
+    digests = checkpoint.chain_digests([], "mdtraj", [("plot", {})])
+    
+    checkpoints = checkpoint.Checkpoints(folder)
+    
+    assert not folder.exists()
+    assert checkpoints.restore(digests) is None
+    
+    checkpoints.save(0, digests, {"state": 0})
+    folder.joinpath("my_state.pkl").write_bytes(b"")
+    
+    assert checkpoints.restore(digests) == (0, {"state": 0})
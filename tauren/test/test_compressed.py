@@ -0,0 +1,51 @@
+import numpy as np
+
+from tauren import compressed
+
+
+def test_compressed_random_access(tmp_path):
+    """frames read back within half the precision, in any order"""
+    
+    rng = np.random.default_rng(0)
+    coordinates = np.cumsum(rng.normal(0, 0.5, size=(23, 11, 3)), axis=0)
+    file_name = str(tmp_path / "traj.tcz")
+    
+    with compressed.CompressedTrajWriter(
+            file_name,
+            11,
+            precision=0.01,
+            chunk_size=5,
+            ) as writer:
+        for frame in coordinates:
+            writer.write(frame)
+    
+    with compressed.CompressedTrajReader(file_name) as reader:
+        assert len(reader) == 23
+        assert np.abs(reader[:] - coordinates).max() <= 0.005 + 1e-6
+        assert np.allclose(reader[17], coordinates[17], atol=0.006)
+        assert np.allclose(
+            reader[[22, 3, 10]],
+            coordinates[[22, 3, 10]],
+            atol=0.006,
+            )
+
+
+def test_compressed_boxes_per_frame(tmp_path):
+    """boxes are stored per frame when the caller reuses the array"""
+    
+    file_name = str(tmp_path / "traj.tcz")
+    box = np.array([30.0, 30.0, 30.0, 90.0, 90.0, 90.0])
+    
+    with compressed.CompressedTrajWriter(
+            file_name,
+            2,
+            chunk_size=4,
+            ) as writer:
+        for ii in range(6):
+            box[:3] = 30.0 + ii
+            writer.write(np.zeros((2, 3)), box)
+    
+    with compressed.CompressedTrajReader(file_name) as reader:
+        _, _, boxes = reader.read()
+    
+    assert np.array_equal(boxes[:, 0], 30.0 + np.arange(6))
@@ -0,0 +1,72 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import mdtraj
+
+from tauren import estimate
+
+
+def test_estimate_follows_slicing_and_selection():
+    """costs after slicing and selection count only those frames and atoms"""
+    
+    header = SimpleNamespace(
+        traj_type="mdanalysis",
+        n_frames=100,
+        n_atoms=50,
+        count_selection=lambda selection: 20,
+        )
+    
+    state = estimate._RunState(header)
+    
+    estimate._estimators["frame_slice"](state, step=10)
+    estimate._estimators["atom_selection"](state, selector="protein")
+    
+    touched, written = estimate._estimators["save_traj"](
+        state,
+        file_name="out.dcd",
+        )
+    
+    assert (state.n_frames, state.n_selected) == (10, 20)
+    assert touched == written == 10 * 20 * estimate.coordinate_bytes
+    
+    touched, written = estimate._estimators["frames2file"](
+        state,
+        frames="1,5",
+        ext="pdb",
+        )
+    
+    assert written == 2 * 20 * 81
+
+
+@pytest.mark.parametrize("ext", ["xtc", "trr"])
+def test_estimate_reads_no_offsets(tmp_path, ext):
+    """frames are counted without writing files, times follow throughput"""
+    
+    topology = mdtraj.Topology()
+    residue = topology.add_residue("ALA", topology.add_chain())
+    for name in ("N", "CA"):
+        topology.add_atom(
+            name,
+            mdtraj.element.get_by_symbol(name[0]),
+            residue,
+            )
+    
+    traj = mdtraj.Trajectory(np.zeros((8, 2, 3), np.float32), topology)
+    traj[0].save_pdb(str(tmp_path / "top.pdb"))
+    traj.save(str(tmp_path / f"traj.{ext}"))
+    
+    files = sorted(tmp_path.iterdir())
+    
+    (save,) = estimate.estimate_actions(
+        str(tmp_path / f"traj.{ext}"),
+        str(tmp_path / "top.pdb"),
+        "mdanalysis",
+        [("save_traj", {"file_name": str(tmp_path / "out.dcd")})],
+        throughput="1KB",
+        )
+    
+    assert sorted(tmp_path.iterdir()) == files
+    assert save.frames == 8
+    assert save.seconds == save.read_bytes / 1024
@@ -0,0 +1,33 @@
+import pytest
+
+from tauren import memory
+
+
+@pytest.mark.parametrize(
+    "size,expected",
+    [
+        (16, 16 * 1024 ** 2),
+        ("16GB", 16 * 1024 ** 3),
+        ("512 mb", 512 * 1024 ** 2),
+        ("1.5k", 1536),
+        ],
+    )
+def test_parse_size(size, expected):
+    assert memory.parse_size(size) == expected
+
+
+@pytest.mark.parametrize("size", ["16XB", "-1GB", 0, "GB"])
+def test_parse_size_error(size):
+    with pytest.raises(ValueError):
+        memory.parse_size(size)
+
+
+def test_chunk_frames_fit_left_budget():
+    """chunk sizes count what is already held and are at least 1"""
+    
+    budget = memory.MemoryBudget("10KB")
+    
+    assert budget.chunk_frames(1024, resident=2048, label="a") == 8
+    assert budget.chunk_frames(1024, n_frames=3, label="b") == 3
+    assert budget.chunk_frames(1024, resident=20480, label="c") == 1
+    assert budget.chunk_sizes == [("a", 8), ("b", 3), ("c", 1)]
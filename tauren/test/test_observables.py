@@ -0,0 +1,183 @@
+import gc
+from types import SimpleNamespace
+
+import numpy as np
+
+from tauren import storage
+from tauren import tables
+from tauren import tauren
+
+
+def _gen_observable(datatype, n_frames):
+    
+    key = storage.StorageKey(datatype, datatype, datatype)
+    data = storage.StorageData(
+        columns=["frames", "value"],
+        data=np.column_stack((np.arange(1, n_frames + 1), np.ones(n_frames))),
+        )
+    
+    return key, data
+
+
+def test_disk_observables_budget(tmp_path):
+    """only recent observables stay in memory, others are read back"""
+    
+    observables = storage.DiskTrajObservables(tmp_path, budget_mb=0.001)
+    
+    key_a, data_a = _gen_observable("a", 50)
+    key_b, data_b = _gen_observable("b", 50)
+    
+    observables.store(key_a, data_a)
+    observables.store(key_b, data_b)
+    
+    assert list(observables._resident) == [key_b]
+    assert np.array_equal(observables[key_a].data, data_a.data)
+    assert observables[key_a].columns == ["frames", "value"]
+    assert list(observables._resident) == [key_a]
+    
+    items = observables.items()
+    
+    assert next(items)[0] == key_a
+    assert list(observables._resident) == [key_a]
+    assert next(items)[0] == key_b
+    assert list(observables._resident) == [key_b]
+
+
+def test_disk_observables_temporary_folder(tmp_path):
+    """temporary folders are removed with the store, given ones are kept"""
+    
+    for folder in (None, tmp_path / "observables"):
+        
+        observables = storage.DiskTrajObservables(folder)
+        observables.store(*_gen_observable("a", 10))
+        
+        used_folder = observables.folder
+        del observables
+        gc.collect()
+        
+        assert used_folder.exists() == (folder is not None)
+
+
+def test_columnar_data_shares_frames():
+    """columns are returned without copies, data is built on access"""
+    
+    frames = np.arange(1, 6, dtype=np.int32)
+    values = np.linspace(0, 1, 5)
+    
+    observable = storage.ColumnarData(frames, ["rmsd"], [values])
+    
+    observables = storage.TrajObservables()
+    key = storage.StorageKey("rmsd", "rmsd", "rmsd")
+    observables.store(key, observable)
+    
+    assert observables.column(key, "frames") is frames
+    assert observables.column(key, 1) is values
+    assert observable.columns == ["frames", "rmsd"]
+    assert np.array_equal(observable[1], np.column_stack((frames, values)))
+
+
+def test_disk_observables_keep_columnar(tmp_path):
+    """columnar observables read back share their frames index"""
+    
+    frames = np.arange(1, 51, dtype=np.int32)
+    frames.flags.writeable = False
+    
+    observables = storage.DiskTrajObservables(tmp_path, budget_mb=0.001)
+    
+    keys = [storage.StorageKey(name, name, name) for name in ("a", "b")]
+    for key in keys:
+        observables.store(
+            key,
+            storage.ColumnarData(frames, ["rmsd"], [np.linspace(0, 1, 50)]),
+            )
+    
+    assert list(observables._resident) == [keys[1]]
+    
+    observable = observables[keys[0]]
+    
+    assert isinstance(observable, storage.ColumnarData)
+    assert observable.column("frames") is frames
+    assert np.array_equal(observable.column("rmsd"), np.linspace(0, 1, 50))
+
+
+def test_observables_registry_versions():
+    """repeated keys are versioned and indexes resolve them"""
+    
+    observables = storage.TrajObservables()
+    
+    key = storage.StorageKey("rmsd", "rmsd", "rmsd", "all", ("A", "B"))
+    _, data = _gen_observable("rmsd", 5)
+    
+    first = observables.store(key, data)
+    second = observables.store(key, data)
+    
+    assert first == key
+    assert second.version == 1
+    assert second.filenaming == "rmsd_v1"
+    assert observables.find(chains="B,A") == [first, second]
+    assert observables.resolve("rmsd", selection="all") == second
+    assert observables.resolve("rmsd", version=0) == first
+    
+    del observables[second]
+    
+    assert observables.resolve("rmsd") == first
+    assert observables.find(datatype="rmsf") == []
+
+
+def test_export_observables_joins_frames(tmp_path):
+    """per frame observables share one frames column, RMSFs are skipped"""
+    
+    observables = storage.TrajObservables()
+    
+    for frames in ([1, 2, 3], [2, 3, 4]):
+        frames = np.array(frames, dtype=np.int32)
+        observables.store(
+            storage.StorageKey("rmsd", "rmsd", "all", "all", ("A",)),
+            storage.ColumnarData(frames, ["rmsd"], [frames * 0.5]),
+            )
+    
+    observables.store(
+        storage.StorageKey("rmsd_chains", "chains", "all", "all", ("A",)),
+        storage.ColumnarData(
+            np.array([1, 4], dtype=np.int32),
+            ["A", "B"],
+            [np.array([1.0, 4.0]), np.array([10.0, 40.0])],
+            ),
+        )
+    
+    observables.store(
+        storage.StorageKey("rmsf", "rmsf", "all", "all", ("A",)),
+        storage.StorageData(
+            columns=["residues", "rmsf"],
+            data=np.array([[1, 0.1], [2, 0.2]]),
+            ),
+        )
+    
+    file_name = str(tmp_path / "observables.npy")
+    
+    tauren.TaurenTraj.export_observables(
+        SimpleNamespace(observables=observables),
+        file_name=file_name,
+        )
+    
+    columns, data, _ = tables.read_table(file_name)
+    
+    assert columns == [
+        "frames",
+        "rmsd_all:rmsd",
+        "rmsd_all_v1:rmsd",
+        "rmsd_chains:A",
+        "rmsd_chains:B",
+        ]
+    
+    nan = np.nan
+    assert np.array_equal(
+        data,
+        [
+            [1, 0.5, nan, 1.0, 10.0],
+            [2, 1.0, 1.0, nan, nan],
+            [3, 1.5, 1.5, nan, nan],
+            [4, nan, 2.0, 4.0, 40.0],
+            ],
+        equal_nan=True,
+        )
@@ -0,0 +1,45 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from tauren import parallel
+
+
+def test_pipeline_order():
+    """items reach the consumer in order"""
+    
+    consumed = []
+    parallel.pipeline(iter(range(50)), consumed.append, max_pending=2)
+    
+    assert consumed == list(range(50))
+
+
+def test_pipeline_reader_error():
+    """errors in the reader thread reach the caller"""
+    
+    def items():
+        yield 1
+        raise RuntimeError("broken reader")
+    
+    with pytest.raises(RuntimeError):
+        parallel.pipeline(items(), lambda x: None)
+
+
+def test_ordered_turns():
+    """tasks finishing in reverse order take turns in serial order"""
+    
+    turns = parallel.OrderedTurns()
+    stored = []
+    
+    def task(number):
+        time.sleep(0.01 * (3 - number))
+        turns.wait(number)
+        stored.append(number)
+    
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        for number in range(3):
+            turns.register(number)
+            executor.submit(turns.run, number, task, number)
+    
+    assert stored == [0, 1, 2]
@@ -0,0 +1,93 @@
+from tauren import plan
+
+
+def test_compile_plan_fuses_consecutive_frame_actions():
+    """frame actions between other actions share one step"""
+    
+    actions = [
+        ("frame_slice", {}),
+        ("produce_rmsds_combined_chains", {}),
+        ("save_traj", {}),
+        ("frames2file_", {}),
+        ("align_traj", {}),
+        ("save_traj__", {}),
+        ]
+    
+    steps = plan.compile_plan(actions, start=3)
+    
+    assert [len(step.actions) for step in steps] == [1, 3, 1, 1]
+    assert [step.last_index for step in steps] == [3, 6, 7, 8]
+    assert steps[1].actions[2].name == "frames2file"
+    
+    steps = plan.compile_plan(actions, fuse=False)
+    
+    assert not any(step.fused for step in steps)
+
+
+def test_step_dependencies():
+    """producers only wait for transforms, exports for producers"""
+    
+    effects = {
+        name: plan.action_effects[name]
+        for name in (
+            "frame_slice",
+            "produce_rmsf",
+            "produce_rmsds_combined_chains",
+            "export_observables",
+            )
+        }
+    
+    assert plan._conflict(effects["frame_slice"], effects["produce_rmsf"])
+    assert not plan._conflict(
+        effects["produce_rmsf"],
+        effects["produce_rmsds_combined_chains"],
+        )
+    assert plan._conflict(
+        effects["export_observables"],
+        effects["produce_rmsf"],
+        )
+
+
+def test_reorder_actions():
+    """slicing moves before actions not using it, only"""
+    
+    actions = [
+        ("remove_solvent", {}),
+        ("frames2file", {"frames": "50:55"}),
+        ("export_observables", {"file_name": "observables.csv"}),
+        ("frame_slice", {"step": 10}),
+        ("save_traj", {}),
+        ("frame_slice_", {"step": 2}),
+        ]
+    
+    reordered = plan.reorder_actions(actions)
+    
+    assert [action for action, _ in reordered] == [
+        "remove_solvent",
+        "frame_slice",
+        "frames2file",
+        "export_observables",
+        "save_traj",
+        "frame_slice_",
+        ]
+
+
+def test_step_waits_turn_to_append(monkeypatch):
+    """only actions appending observables wait their turn"""
+    
+    calls = []
+    monkeypatch.setattr(
+        plan,
+        "run_action",
+        lambda traj, action, frames=None: calls.append(action.name),
+        )
+    
+    steps = plan.compile_plan(
+        [("frame_slice", {}), ("produce_rmsf", {})],
+        fuse=False,
+        )
+    
+    for step in steps:
+        step.run(None, wait_turn=lambda: calls.append("turn"))
+    
+    assert calls == ["frame_slice", "turn", "produce_rmsf"]
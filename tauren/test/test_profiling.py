@@ -0,0 +1,44 @@
+import json
+from types import SimpleNamespace
+
+from tauren import profiling
+
+
+def test_profiler_records_active_actions(tmp_path):
+    """measured actions are recorded only while the profiler is active"""
+    
+    traj = SimpleNamespace(
+        results_cache=SimpleNamespace(hits=0, misses=0),
+        )
+    
+    with profiling.measure("before") as measurements:
+        assert measurements == []
+    
+    with profiling.Profiler(traj, trace_memory=True) as profiler:
+        
+        with profiling.measure("calc", frames=10):
+            traj.results_cache.hits += 1
+            data = list(range(10000))
+        
+        with profiler.action("load") as loading:
+            loading.frames = 5
+    
+    with profiling.measure("after"):
+        pass
+    
+    calc, load = profiler.records
+    
+    assert [r.action for r in profiler.records] == ["calc", "load"]
+    assert calc.frames == 10 and load.frames == 5
+    assert calc.caches["results"] == {"hits": 1, "misses": 0}
+    assert calc.traced_peak >= len(data) * 8
+    assert calc.wall_time >= 0 and calc.frames_per_second > 0
+    
+    report = tmp_path.joinpath("profile.json")
+    profiler.write_json(str(report))
+    
+    with open(report) as fh:
+        actions = json.load(fh)["actions"]
+    
+    assert actions[0]["caches"]["results"]["hit_rate"] == 1.0
+    assert profiler.format_table().splitlines()[-1].startswith("total")
@@ -0,0 +1,38 @@
+import numpy as np
+
+from tauren import reference
+
+
+def test_prepare_reference_centred():
+    """prepared coordinates are centred on the weighted center"""
+    
+    coords = np.array([[0.0, 0.0, 0.0], [2.0, 0.0, 0.0], [4.0, 3.0, 0.0]])
+    
+    prepared = reference.prepare_reference(coords, weights=[1, 1, 2])
+    
+    assert np.allclose(
+        np.average(prepared.coordinates, axis=0, weights=[1, 1, 2]),
+        0,
+        )
+
+
+def test_get_reference_disk_cache(tmp_path):
+    """second call reads from the persistent cache"""
+    
+    ref_file = tmp_path.joinpath("ref.pdb")
+    ref_file.write_text("fake structure")
+    
+    calls = []
+    
+    def parser(ref_structure, selection):
+        calls.append(selection)
+        return np.arange(9.0).reshape(3, 3), np.ones(3)
+    
+    args = (str(ref_file), "name CA", "test", parser)
+    
+    first = reference.get_reference(*args, cache_folder=tmp_path)
+    reference._memory_cache.clear()
+    second = reference.get_reference(*args, cache_folder=tmp_path)
+    
+    assert len(calls) == 1
+    assert np.array_equal(first.coordinates, second.coordinates)
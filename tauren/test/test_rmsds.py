@@ -0,0 +1,147 @@
+import string
+
+import numpy as np
+import pytest
+
+import mdtraj
+
+from tauren import tauren
+
+_n_frames = 8
+
+
+@pytest.fixture
+def chains_traj(tmp_path):
+    """two protein chains and a water chain, the topology is not a frame"""
+    
+    topology = mdtraj.Topology()
+    
+    for _ in range(2):
+        chain = topology.add_chain()
+        for _ in range(3):
+            residue = topology.add_residue("ALA", chain)
+            for name in ("N", "CA", "C", "O"):
+                topology.add_atom(
+                    name,
+                    mdtraj.element.get_by_symbol(name[0]),
+                    residue,
+                    )
+    
+    waters = topology.add_chain()
+    for _ in range(2):
+        topology.add_atom(
+            "O",
+            mdtraj.element.oxygen,
+            topology.add_residue("HOH", waters),
+            )
+    
+    rng = np.random.default_rng(0)
+    structure = rng.normal(scale=0.5, size=(topology.n_atoms, 3))
+    
+    mdtraj.Trajectory(structure, topology).save_pdb(str(tmp_path / "top.pdb"))
+    
+    traj = mdtraj.Trajectory(
+        structure + rng.normal(scale=0.05, size=(_n_frames, 1, 3))
+        + rng.normal(scale=0.02, size=(_n_frames, topology.n_atoms, 3)),
+        topology,
+        )
+    traj.save_dcd(str(tmp_path / "traj.dcd"))
+    
+    return str(tmp_path / "traj.dcd"), str(tmp_path / "top.pdb")
+
+
+def _values(traj, key):
+    return traj.observables[key].data[:, 1:]
+
+
+def test_mdanalysis_int_ref_frame_is_topology(chains_traj):
+    """an int fits to the topology, a list to frames of the slicing"""
+    
+    traj_file, topo_file = chains_traj
+    
+    traj = tauren.TaurenMDAnalysis(traj_file, topo_file)
+    traj.frame_slice(start=3, step=2)
+    
+    frames = mdtraj.load(traj_file, top=topo_file)[2::2]
+    
+    to_topology = _values(
+        traj,
+        traj.calc_rmsds_combined_chains(ref_frame=0),
+        )
+    to_frame = _values(
+        traj,
+        traj.calc_rmsds_combined_chains(ref_frame=[0]),
+        )
+    
+    assert np.allclose(
+        to_topology[:, 0],
+        mdtraj.rmsd(frames, mdtraj.load(topo_file)) * 10,
+        atol=1e-3,
+        )
+    assert np.allclose(
+        to_frame[:, 0],
+        mdtraj.rmsd(frames, frames, 0) * 10,
+        atol=1e-3,
+        )
+
+
+@pytest.mark.parametrize("traj_class", ["TaurenMDTraj", "TaurenMDAnalysis"])
+def test_rmsds_per_residue_global_fit(chains_traj, traj_class):
+    """a residue column is its RMSD after the fit of all atoms"""
+    
+    traj_file, topo_file = chains_traj
+    
+    traj = getattr(tauren, traj_class)(traj_file, topo_file)
+    key = traj.calc_rmsds_per_residue()
+    
+    frames = mdtraj.load(traj_file, top=topo_file)
+    frames.superpose(frames, 0)
+    
+    residue = frames.topology.residue(1)
+    
+    expected = mdtraj.rmsd(
+        frames,
+        frames,
+        0,
+        atom_indices=[atom.index for atom in residue.atoms],
+        superpose=False,
+        )
+    
+    observable = traj.observables[key]
+    column = observable.columns.index(f"res_{residue.index + 1}")
+    
+    assert np.allclose(
+        observable.data[:, column],
+        expected * 10 / traj._length_unit,
+        atol=1e-3,
+        )
+
+
+def test_chain_index_matches_probing(chains_traj):
+    """"all" resolves to the chains selection probing used to find"""
+    
+    traj_file, topo_file = chains_traj
+    
+    traj = tauren.TaurenMDAnalysis(traj_file, topo_file)
+    
+    probed = [
+        chain
+        for chain in string.ascii_letters + string.digits
+        if traj._filter_existent_selectors([f"segid {chain}"])
+        ]
+    
+    assert probed == ["A", "B", "C"]
+    assert traj._gen_chain_list("all") == probed
+    
+    traj = tauren.TaurenMDTraj(traj_file, topo_file)
+    
+    def probed():
+        return [str(chain) for chain in range(traj.trajectory.n_chains)]
+    
+    assert probed() == ["0", "1", "2"]
+    assert traj._gen_chain_list("all") == probed()
+    
+    traj.remove_solvent()
+    
+    assert probed() == ["0", "1"]
+    assert traj._gen_chain_list("all") == probed()
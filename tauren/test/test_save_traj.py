@@ -0,0 +1,175 @@
+import numpy as np
+import pytest
+
+import mdtraj
+import MDAnalysis as mda
+
+from tauren import framepass
+from tauren import load
+from tauren import tauren
+
+_n_frames = 6
+
+
+@pytest.fixture
+def boxes_traj(tmp_path):
+    """a trajectory whose unit cell changes in every frame"""
+    
+    topology = mdtraj.Topology()
+    residue = topology.add_residue("ALA", topology.add_chain())
+    for name in ("N", "CA", "C", "O"):
+        topology.add_atom(
+            name,
+            mdtraj.element.get_by_symbol(name[0]),
+            residue,
+            )
+    
+    rng = np.random.default_rng(0)
+    lengths = 3.0 + 0.1 * np.arange(_n_frames)
+    
+    traj = mdtraj.Trajectory(
+        rng.normal(size=(_n_frames, 4, 3)).astype(np.float32),
+        topology,
+        unitcell_lengths=np.repeat(lengths[:, np.newaxis], 3, axis=1),
+        unitcell_angles=np.full((_n_frames, 3), 90.0),
+        time=100.0 + 10 * np.arange(_n_frames),
+        )
+    
+    traj[0].save_pdb(str(tmp_path / "top.pdb"))
+    traj.save_xtc(str(tmp_path / "traj.xtc"))
+    traj.save_trr(str(tmp_path / "traj.trr"))
+    
+    # Angstroms
+    return tmp_path, lengths * 10
+
+
+@pytest.mark.parametrize("ext", ["xtc", "trr"])
+def test_save_traj_keeps_boxes(boxes_traj, ext):
+    """each frame is written with its own unit cell"""
+    
+    folder, lengths = boxes_traj
+    topology = str(folder / "top.pdb")
+    output = str(folder / "out.dcd")
+    
+    traj = tauren.TaurenMDAnalysis(str(folder / f"traj.{ext}"), topology)
+    traj.save_traj(output, chunk_size=4)
+    
+    saved = mda.Universe(topology, output)
+    
+    assert np.allclose(
+        [ts.dimensions[0] for ts in saved.trajectory],
+        lengths,
+        atol=1e-3,
+        )
+
+
+def test_save_traj_compressed_keeps_boxes(boxes_traj):
+    """boxes of a chunk of a .tcz file are not the last frame box"""
+    
+    folder, lengths = boxes_traj
+    topology = str(folder / "top.pdb")
+    output = str(folder / "out.tcz")
+    
+    traj = tauren.TaurenMDAnalysis(str(folder / "traj.xtc"), topology)
+    traj.save_traj(output, chunk_size=4)
+    
+    saved = load.load_traj(output, topology, traj_type="mdanalysis")
+    
+    assert np.allclose(
+        [ts.dimensions[0] for ts in saved.original_traj],
+        lengths,
+        atol=1e-3,
+        )
+
+
+def test_fused_save_traj_keeps_times(boxes_traj):
+    """the frame pass writes the times save_traj writes"""
+    
+    folder, _ = boxes_traj
+    topology = str(folder / "top.pdb")
+    
+    traj = tauren.TaurenMDAnalysis(str(folder / "traj.xtc"), topology)
+    
+    traj.save_traj(str(folder / "serial.xtc"), chunk_size=4)
+    framepass.run_pass(
+        traj,
+        [framepass.traj_consumer(traj, str(folder / "fused.xtc"))],
+        chunk_size=4,
+        )
+    
+    times = [
+        [ts.time for ts in mda.Universe(topology, str(output)).trajectory]
+        for output in (folder / "serial.xtc", folder / "fused.xtc")
+        ]
+    
+    assert np.allclose(times[0], 100.0 + 10 * np.arange(_n_frames))
+    assert np.allclose(times[1], times[0])
+
+
+@pytest.mark.parametrize("traj_type", ["mdtraj", "mdanalysis"])
+def test_frames2file_after_frame_slice(boxes_traj, traj_type):
+    """explicit frames number the input trajectory, not the slicing"""
+    
+    folder, _ = boxes_traj
+    topology = str(folder / "top.pdb")
+    
+    traj = load.load_traj(
+        str(folder / "traj.xtc"),
+        topology,
+        traj_type=traj_type,
+        )
+    traj.frame_slice(start=1, step=2)
+    
+    traj.frames2file(frames="2", prefix=str(folder / "single_"))
+    traj.frames2file(frames="4:6", prefix=str(folder / "range_"))
+    
+    frames = mdtraj.load(str(folder / "traj.xtc"), top=topology)
+    
+    for prefix, numbers in (("single_", [2]), ("range_", [4, 5, 6])):
+        for number in numbers:
+            
+            extracted = mdtraj.load(str(folder / f"{prefix}{number}.pdb"))
+            
+            assert np.allclose(
+                extracted.xyz[0],
+                frames.xyz[number - 1],
+                atol=1e-3,
+                )
+
+
+@pytest.mark.parametrize("ext", ["dcd", "xtc"])
+@pytest.mark.parametrize("traj_type", ["mdtraj", "mdanalysis"])
+def test_sharded_save_traj_manifest(boxes_traj, traj_type, ext):
+    """shards of a sliced selection load back as one trajectory"""
+    
+    folder, _ = boxes_traj
+    topology = str(folder / "top.pdb")
+    
+    traj = load.load_traj(
+        str(folder / "traj.xtc"),
+        topology,
+        traj_type=traj_type,
+        )
+    traj.frame_slice(start=2)
+    traj.set_atom_selection("name CA or name C")
+    traj.save_traj(str(folder / f"out.{ext}"), shards=3, workers=2)
+    
+    frames = mdtraj.load(str(folder / "traj.xtc"), top=topology)
+    expected = frames.atom_slice(
+        frames.topology.select("name CA or name C"),
+        )[1:]
+    expected[0].save_pdb(str(folder / "selection.pdb"))
+    
+    saved = load.load_traj(
+        str(folder / "out.manifest.json"),
+        str(folder / "selection.pdb"),
+        traj_type=traj_type,
+        )
+    
+    coordinates, _, _ = saved._read_frames(
+        saved.sliced_frames_list,
+        np.arange(expected.n_atoms),
+        )
+    
+    assert saved.n_frames == _n_frames - 1
+    assert np.allclose(coordinates, expected.xyz * 10, atol=1e-2)
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from tauren import tables
+
+
+@pytest.mark.parametrize("ext", [".npy", ".npz", ".raw"])
+def test_binary_table_roundtrip(tmp_path, ext):
+    """binary tables keep columns and read single columns"""
+    
+    data = np.arange(20, dtype=float).reshape(5, 4)
+    columns = ["frames", "A", "B", "C"]
+    file_name = str(tmp_path / f"table{ext}")
+    
+    tables.write_table(file_name, data, columns, key={"datatype": "rmsd"})
+    
+    read_columns, read_data, metadata = tables.read_table(file_name)
+    
+    assert read_columns == columns
+    assert np.array_equal(read_data, data)
+    assert metadata["key"] == {"datatype": "rmsd"}
+    assert np.array_equal(tables.read_column(file_name, "B"), data[:, 2])
+
+
+def test_raw_stream_header_follows_rows(tmp_path):
+    """flushed raw streams are readable before closing"""
+    
+    file_name = str(tmp_path / "stream.raw")
+    stream = tables.TableStream(file_name, ["frames", "A"])
+    
+    stream.append(np.array([[1, 0.5], [2, 0.6]]))
+    assert tables.read_table(file_name)[1].shape == (2, 2)
+    
+    stream.append(np.array([[3, 0.7]]))
+    stream.close()
+    
+    assert np.array_equal(tables.read_column(file_name, "frames"), [1, 2, 3])
+
+
+def test_format_text_table_totals():
+    """columns fit their widest cell, totals follow a separator"""
+    
+    text = tables.format_text_table(
+        ("action", "frames"),
+        [("save_traj", "100"), ("total", "100")],
+        )
+    
+    lines = text.splitlines()
+    
+    assert lines[0] == "action     frames"
+    assert lines[2] == "save_traj     100"
+    assert lines[3] == lines[1] == "---------  ------"
+    assert lines[-1].startswith("total")
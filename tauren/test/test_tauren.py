@@ -1,5 +1,6 @@
 import pytest
 
+from tauren import tauren
 from tauren.tauren import TaurenTraj
 
 def test_string_to_slice_1():
@@ -53,3 +54,34 @@ def test_string_to_slice_5():
     
     assert frames500[s1] == frames500[s2]
     
+
+
+def test_check_ref_frame_argument_1():
+    """int and list of ints are valid"""
+    
+    TaurenTraj._check_ref_frame_argument(0)
+    TaurenTraj._check_ref_frame_argument([0, 500, 1000])
+
+
+def test_check_ref_frame_argument_2():
+    """empty lists and non-int values are not valid"""
+    
+    with pytest.raises(TypeError):
+        TaurenTraj._check_ref_frame_argument([])
+    
+    with pytest.raises(TypeError):
+        TaurenTraj._check_ref_frame_argument("0")
+
+@pytest.mark.parametrize(
+    "frames,expected",
+    [
+        ("3", [3]),
+        ("1,5,40", [1, 5, 40]),
+        ("28:", [28, 29, 30]),
+        (":3", [1, 2, 3]),
+        ("10:20:5", [10, 15, 20]),
+        ],
+    )
+def test_frames_from_string(frames, expected):
+    """frames2file strings select frames indexed at 1, ends included"""
+    assert tauren._frames_from_string(frames, 30) == expected
@@ -0,0 +1,79 @@
+import zipfile
+
+import numpy as np
+
+from tauren import writers
+
+_table = writers.AtomsTable(
+    names=["N", "CA"],
+    resnames=["ALA", "ALA"],
+    chainids=["A", "A"],
+    resids=[1, 1],
+    segids=["A", "A"],
+    elements=["N", "C"],
+    )
+
+
+def test_pdb_formatter_columns():
+    """coordinates land in the PDB fixed columns"""
+    
+    text = writers.PDBFormatter(_table).format(
+        np.array([[1.0, -2.5, 30.125], [0.0, 0.0, 0.0]]),
+        )
+    
+    line = text.splitlines()[0]
+    assert line[12:16] == " N  "
+    assert float(line[30:38]) == 1.0
+    assert float(line[38:46]) == -2.5
+    assert float(line[46:54]) == 30.125
+    assert line[76:78] == " N"
+
+
+def test_formatters_empty_table():
+    """a selection without atoms formats to empty frames"""
+    
+    table = writers.AtomsTable([], [], [], [], [], [])
+    
+    assert writers.PDBFormatter(table).format(np.zeros((0, 3))) == ""
+
+
+def test_zip_archive_index(tmp_path):
+    """archive members are indexed to frame numbers"""
+    
+    formatter = writers.PDBFormatter(_table)
+    archive = str(tmp_path / "frames.zip")
+    
+    with writers.open_frames_sink("zip", archive) as sink:
+        for frame in (3, 7):
+            sink.add(f"_{frame}.pdb", frame, formatter.format(np.zeros((2, 3))))
+    
+    with zipfile.ZipFile(archive) as zf:
+        assert zf.namelist() == ["_3.pdb", "_7.pdb", "index.csv"]
+        assert zf.read("index.csv").decode().splitlines()[1:] \
+            == ["_3.pdb,3", "_7.pdb,7"]
+
+
+def test_multimodel_serial_columns(tmp_path):
+    """frame numbers above 9999 fit the MODEL serial field"""
+    
+    file_name = str(tmp_path / "frames.pdb")
+    
+    with writers.open_frames_sink("multimodel", file_name) as sink:
+        sink.add(None, 12345, "")
+    
+    with open(file_name) as fh:
+        model = fh.read().splitlines()[1]
+    
+    assert len(model) == 14
+    assert int(model[9:14]) == 12345
+
+
+def test_format_fixed_matches_str_format():
+    """vectorised formatting equals str.format away from ties"""
+    
+    values = np.array([0.0, -0.5, 1.2344, -12.5, 999.999, -99.999, 123.4564])
+    
+    formatted = writers.format_fixed(values, 8, 3)
+    
+    assert [bytes(f).decode() for f in formatted] \
+        == ["{:8.3f}".format(v) for v in values]
@@ -0,0 +1,732 @@
+"""
+Tauren-MD writers for trajectory frames.
+
+Frames are formatted from the static atom information of the topology
+(:class:`AtomsTable`) and the coordinates of each frame, and are sent to
+a sink: a single multi-model file or an archive.
+
+Trajectory files are written with the MD library of the trajectory,
+streamed chunk by chunk or in shards by worker processes.
+"""
+# Copyright © 2018-2019 Tauren-MD Project
+#
+# Tauren-MD is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Tauren-MD is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Tauren-MD. If not, see <http://www.gnu.org/licenses/>.
+#
+# Contributors to this file:
+# - João M.C. Teixeira (https://github.com/joaomcteixeira)
+import io
+import json
+import os
+import tarfile
+import time
+import zipfile
+from collections import namedtuple
+
+import mdtraj
+import MDAnalysis as mda
+import numpy as np
+from MDAnalysis.coordinates.memory import MemoryReader
+
+from tauren import logger
+
+log = logger.get_log(__name__)
+
+AtomsTable = namedtuple(
+    "AtomsTable",
+    [
+        "names",
+        "resnames",
+        "chainids",
+        "resids",
+        "segids",
+        "elements",
+        ],
+    )
+"""
+Static per atom information used to format frames.
+All fields are sequences with one value per atom.
+"""
+
+frames_outputs = ("files", "multimodel", "zip", "tar")
+"""Output modes accepted by :meth:`tauren.tauren.TaurenTraj.frames2file`."""
+
+
+def _as_bytes_table(lines):
+    """
+    Returns a list of equal width strings as an array of ASCII codes
+    with shape (N, width).
+    """
+    
+    if not lines:
+        return np.empty((0, 0), dtype=np.uint8)
+    
+    width = len(lines[0])
+    
+    return np.frombuffer(
+        "".join(lines).encode("ascii", "replace"),
+        dtype=np.uint8,
+        ).reshape(len(lines), width)
+
+
+def format_fixed(values, width, decimals):
+    """
+    Formats floats as fixed width text, vectorised over all values.
+    
+    Same as applying "{:>width.decimalsf}" to each value, except
+    that ties in the last decimal place may round differently.
+    
+    Parameters
+    ----------
+    values : np.ndarray, shape=(N,)
+    
+    width : int
+        The field width.
+    
+    decimals : int
+        The number of decimal places.
+    
+    Returns
+    -------
+    np.ndarray of np.uint8, shape=(N, width)
+        The ASCII codes of the formatted values.
+    
+    Exceptions
+    ----------
+    ValueError
+        If any value does not fit in <width>.
+    """
+    
+    values = np.asarray(values, dtype=np.float64)
+    
+    # rounds half away from zero
+    remaining = np.floor(np.abs(values) * 10 ** decimals + 0.5)
+    remaining = remaining.astype(np.int64)
+    negative = (values < 0) & (remaining > 0)
+    
+    out = np.full((remaining.size, width), ord(" "), dtype=np.uint8)
+    
+    for pos in range(width - 1, width - 1 - decimals, -1):
+        out[:, pos] = 48 + remaining % 10
+        remaining //= 10
+    
+    point = width - 1 - decimals
+    out[:, point] = ord(".")
+    
+    # number of digits in the integer part, at least one
+    int_digits = np.ones(remaining.size, dtype=np.int64)
+    int_digits[remaining > 0] = \
+        np.floor(np.log10(remaining[remaining > 0])).astype(np.int64) + 1
+    
+    if np.any(int_digits + negative > point):
+        raise ValueError(
+            f"values do not fit in a field of width {width}: "
+            f"{values[int_digits + negative > point][:5]}"
+            )
+    
+    for digit in range(point):
+        pos = point - 1 - digit
+        has_digit = int_digits > digit
+        out[has_digit, pos] = 48 + remaining[has_digit] % 10
+        remaining //= 10
+    
+    sign_at = point - 1 - int_digits
+    out[negative, sign_at[negative]] = ord("-")
+    
+    return out
+
+
+class _FrameFormatter:
+    """
+    Base class for frame formatters.
+    
+    Text columns that do not change between frames are computed
+    once from the :class:`AtomsTable`, only coordinates are formatted
+    per frame, vectorised over atoms.
+    
+    Parameters
+    ----------
+    atoms_table : :class:`AtomsTable`
+    """
+    
+    ext = None
+    
+    def __init__(self, atoms_table):
+        
+        self.atoms_table = atoms_table
+        self.n_atoms = len(atoms_table.names)
+        self._prefix, self._suffix = self._gen_static_columns(atoms_table)
+    
+    def _gen_static_columns(self, atoms_table):
+        """
+        Returns the (N, width) ASCII arrays before and after
+        the coordinates fields.
+        """
+        raise NotImplementedError
+    
+    def _format_coordinates(self, coordinates):
+        """Returns the (N, width) ASCII array of coordinates."""
+        raise NotImplementedError
+    
+    def _header(self, box):
+        return ""
+    
+    def _footer(self, box):
+        return ""
+    
+    def format(self, coordinates, box=None):
+        """
+        Returns the text of a frame.
+        
+        PDB frames do not carry MODEL or END records.
+        
+        Parameters
+        ----------
+        coordinates : np.ndarray, shape=(N, 3)
+            The atom coordinates in Angstroms.
+        
+        box : sequence of 6 floats, optional
+            Unit cell lengths (Angstroms) and angles (degrees).
+        """
+        
+        coordinates = np.asarray(coordinates)
+        
+        if coordinates.shape != (self.n_atoms, 3):
+            raise ValueError(
+                f"coordinates should have shape ({self.n_atoms}, 3): "
+                f"{coordinates.shape} given."
+                )
+        
+        body = np.concatenate(
+            (
+                self._prefix,
+                self._format_coordinates(coordinates),
+                self._suffix,
+                ),
+            axis=1,
+            )
+        
+        return "".join((
+            self._header(box),
+            body.tobytes().decode("ascii"),
+            self._footer(box),
+            ))
+
+
+class PDBFormatter(_FrameFormatter):
+    """Formats frames as PDB text."""
+    
+    ext = "pdb"
+    
+    @staticmethod
+    def _format_name(name):
+        """Aligns atom names to the PDB convention."""
+        if len(name) < 4:
+            return f" {name:<3s}"
+        return name[:4]
+    
+    def _gen_static_columns(self, table):
+        
+        prefix = [
+            "ATOM  {:>5d} {:4s} {:>3s} {:1s}{:>4d}    ".format(
+                (ii + 1) % 100000,
+                self._format_name(table.names[ii]),
+                table.resnames[ii][:3],
+                table.chainids[ii][:1],
+                table.resids[ii] % 10000,
+                )
+            for ii in range(self.n_atoms)
+            ]
+        
+        suffix = [
+            "{:6.2f}{:6.2f}      {:<4s}{:>2s}\n".format(
+                1.0,
+                0.0,
+                table.segids[ii][:4],
+                table.elements[ii][:2],
+                )
+            for ii in range(self.n_atoms)
+            ]
+        
+        return _as_bytes_table(prefix), _as_bytes_table(suffix)
+    
+    def _format_coordinates(self, coordinates):
+        
+        return np.concatenate(
+            [format_fixed(coordinates[:, ii], 8, 3) for ii in range(3)],
+            axis=1,
+            )
+    
+    def _header(self, box):
+        
+        if box is None:
+            return ""
+        
+        return (
+            "CRYST1{:9.3f}{:9.3f}{:9.3f}{:7.2f}{:7.2f}{:7.2f}"
+            " P 1           1\n".format(*box)
+            )
+
+
+class GROFormatter(_FrameFormatter):
+    """
+    Formats frames as GROMACS GRO text.
+    
+    Coordinates are written in nanometers.
+    """
+    
+    ext = "gro"
+    
+    def _gen_static_columns(self, table):
+        
+        prefix = [
+            "{:>5d}{:<5s}{:>5s}{:>5d}".format(
+                table.resids[ii] % 100000,
+                table.resnames[ii][:5],
+                table.names[ii][:5],
+                (ii + 1) % 100000,
+                )
+            for ii in range(self.n_atoms)
+            ]
+        
+        suffix = ["\n"] * self.n_atoms
+        
+        return _as_bytes_table(prefix), _as_bytes_table(suffix)
+    
+    def _format_coordinates(self, coordinates):
+        
+        return np.concatenate(
+            [format_fixed(coordinates[:, ii] / 10, 8, 3) for ii in range(3)],
+            axis=1,
+            )
+    
+    def _header(self, box):
+        return f"Written by Tauren-MD\n{self.n_atoms:>5d}\n"
+    
+    def _footer(self, box):
+        
+        if box is None:
+            return "{:10.5f}{:10.5f}{:10.5f}\n".format(0, 0, 0)
+        
+        lengths = np.asarray(box[:3]) / 10
+        alpha, beta, gamma = np.radians(box[3:])
+        
+        # box vectors in the GROMACS triclinic convention
+        v1 = (lengths[0], 0.0, 0.0)
+        v2 = (lengths[1] * np.cos(gamma), lengths[1] * np.sin(gamma), 0.0)
+        v3x = lengths[2] * np.cos(beta)
+        v3y = lengths[2] \
+            * (np.cos(alpha) - np.cos(beta) * np.cos(gamma)) \
+            / np.sin(gamma)
+        v3z = np.sqrt(max(lengths[2] ** 2 - v3x ** 2 - v3y ** 2, 0.0))
+        
+        values = [v1[0], v2[1], v3z]
+        
+        if not np.allclose(box[3:], 90):
+            values.extend([v1[1], v1[2], v2[0], v2[2], v3x, v3y])
+        
+        return "".join("{:10.5f}".format(v) for v in values) + "\n"
+
+
+class XYZFormatter(_FrameFormatter):
+    """Formats frames as XYZ text."""
+    
+    ext = "xyz"
+    
+    def _gen_static_columns(self, table):
+        
+        prefix = [
+            "{:<2s}".format(
+                (table.elements[ii] or table.names[ii][:1])[:2],
+                )
+            for ii in range(self.n_atoms)
+            ]
+        
+        suffix = ["\n"] * self.n_atoms
+        
+        return _as_bytes_table(prefix), _as_bytes_table(suffix)
+    
+    def _format_coordinates(self, coordinates):
+        
+        return np.concatenate(
+            [format_fixed(coordinates[:, ii], 12, 5) for ii in range(3)],
+            axis=1,
+            )
+    
+    def _header(self, box):
+        return f"{self.n_atoms}\nWritten by Tauren-MD\n"
+
+
+formatters = {
+    f.ext: f
+    for f in (PDBFormatter, GROFormatter, XYZFormatter)
+    }
+"""Frame formatters by file extension."""
+
+
+def get_formatter(ext, atoms_table):
+    """
+    Returns the formatter for a file extension.
+    
+    Parameters
+    ----------
+    ext : str
+        The file extension, for example, "pdb".
+    
+    atoms_table : :class:`AtomsTable`
+    
+    Exceptions
+    ----------
+    ValueError
+        If there is no formatter for <ext>.
+    """
+    
+    try:
+        return formatters[ext.lower()](atoms_table)
+    
+    except KeyError:
+        raise ValueError(
+            f"Tauren-MD can not write '{ext}' files, "
+            f"options are: {list(formatters)}."
+            )
+
+
+def write_text(text, file_name):
+    """
+    Writes text to file_name.
+    
+    Returns
+    -------
+    str
+        The file name.
+    """
+    
+    with open(file_name, "w") as fh:
+        fh.write(text)
+    
+    return file_name
+
+
+class MultiModelSink:
+    """
+    Writes frames as MODEL records of a single PDB file.
+    
+    The MODEL serial number is the frame number, written in
+    columns 10-14 so that frames up to 99999 keep the records
+    aligned.
+    """
+    
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self._fh = open(file_name, "w")
+        self._fh.write(
+            "REMARK    MODEL SERIAL NUMBERS ARE TRAJECTORY FRAME NUMBERS\n"
+            )
+    
+    def add(self, member_name, frame, text):
+        """Writes a frame."""
+        self._fh.write(f"MODEL    {frame:>5d}\n")
+        self._fh.write(text)
+        self._fh.write("ENDMDL\n")
+    
+    def close(self):
+        self._fh.write("END\n")
+        self._fh.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *args):
+        self.close()
+
+
+class ArchiveSink:
+    """
+    Writes frames as members of an uncompressed zip or tar archive.
+    
+    Members are streamed to the archive as frames are added, no
+    intermediate files are created. An ``index.csv`` member mapping
+    member names to frame numbers is written when the archive closes.
+    
+    Parameters
+    ----------
+    file_name : str
+        The archive file name.
+    
+    archive : {"zip", "tar"}
+    """
+    
+    index_name = "index.csv"
+    
+    def __init__(self, file_name, archive="zip"):
+        
+        self.file_name = file_name
+        self.archive = archive
+        self._index = ["member,frame\n"]
+        
+        if archive == "zip":
+            self._fh = zipfile.ZipFile(
+                file_name,
+                mode="w",
+                compression=zipfile.ZIP_STORED,
+                allowZip64=True,
+                )
+        
+        elif archive == "tar":
+            self._fh = tarfile.open(file_name, mode="w")
+        
+        else:
+            raise ValueError(f"archive should be 'zip' or 'tar': '{archive}'")
+    
+    def _write_member(self, member_name, data):
+        
+        if self.archive == "zip":
+            self._fh.writestr(member_name, data)
+        
+        else:
+            info = tarfile.TarInfo(member_name)
+            info.size = len(data)
+            info.mtime = time.time()
+            self._fh.addfile(info, io.BytesIO(data))
+    
+    def add(self, member_name, frame, text):
+        """Writes a frame as a new member."""
+        if member_name.endswith(".pdb"):
+            text += "END\n"
+        self._write_member(member_name, text.encode())
+        self._index.append(f"{member_name},{frame}\n")
+    
+    def close(self):
+        self._write_member(self.index_name, "".join(self._index).encode())
+        self._fh.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *args):
+        self.close()
+
+
+def open_frames_sink(output, file_name):
+    """
+    Returns the sink for an output mode.
+    
+    Parameters
+    ----------
+    output : {"multimodel", "zip", "tar"}
+    
+    file_name : str
+    """
+    
+    if output == "multimodel":
+        return MultiModelSink(file_name)
+    
+    elif output in ("zip", "tar"):
+        return ArchiveSink(file_name, archive=output)
+    
+    else:
+        raise ValueError(
+            f"output should be one of {frames_outputs[1:]}: '{output}'"
+            )
+
+
+def write_trajectory_manifest(file_name, part_names, shard_frames):
+    """
+    Writes the manifest of a trajectory saved in parts.
+    
+    Part paths are stored relative to the manifest folder.
+    
+    Parameters
+    ----------
+    file_name : str
+        The manifest file name, usually "<name>.manifest.json".
+    
+    part_names : list of str
+        The part files, in trajectory order.
+    
+    shard_frames : list of lists of ints
+        The frames of the input trajectory (indexed at 1)
+        saved in each part.
+    
+    Returns
+    -------
+    str
+        The manifest file name.
+    """
+    
+    folder = os.path.dirname(os.path.abspath(file_name))
+    
+    manifest = {
+        "tauren_manifest": 1,
+        "parts": [
+            {
+                "file": os.path.relpath(os.path.abspath(part), folder),
+                "n_frames": len(frames),
+                "first_frame": frames[0],
+                "last_frame": frames[-1],
+                }
+            for part, frames in zip(part_names, shard_frames)
+            ],
+        }
+    
+    with open(file_name, "w") as fh:
+        json.dump(manifest, fh, indent=4)
+    
+    return file_name
+
+
+class MDATrajWriter:
+    """
+    Streams chunks of coordinates of <atoms> to a trajectory file
+    with MDAnalysis, see
+    :meth:`tauren.tauren.TaurenTraj._open_traj_writer`.
+    """
+    
+    def __init__(self, atoms, file_name):
+        
+        self._universe = mda.Merge(atoms)
+        self._writer = mda.Writer(file_name, atoms.n_atoms)
+    
+    def write(self, coordinates, boxes, frames, times):
+        
+        ts = self._universe.trajectory.ts
+        
+        for ii in range(len(coordinates)):
+            self._universe.atoms.positions = coordinates[ii]
+            if boxes is not None:
+                self._universe.dimensions = boxes[ii]
+            ts.time = times[ii]
+            self._writer.write(self._universe.atoms)
+    
+    def close(self):
+        self._writer.close()
+
+
+class MDTrajDCDWriter:
+    """
+    Streams chunks of coordinates to a DCD file with MDTraj,
+    see :meth:`tauren.tauren.TaurenTraj._open_traj_writer`.
+    """
+    
+    def __init__(self, file_name):
+        self._file = mdtraj.formats.DCDTrajectoryFile(
+            file_name,
+            "w",
+            force_overwrite=True,
+            )
+    
+    def write(self, coordinates, boxes, frames, times):
+        
+        # DCD files are in Angstroms, as the chunks
+        if boxes is None:
+            self._file.write(coordinates)
+        else:
+            self._file.write(
+                coordinates,
+                cell_lengths=boxes[:, :3],
+                cell_angles=boxes[:, 3:],
+                )
+    
+    def close(self):
+        self._file.close()
+
+
+def write_mda_frame(atoms, positions, dimensions, file_name):
+    """
+    Writes a single frame of an MDAnalysis AtomGroup to a PDB file.
+    
+    Works on a copy of <atoms> so that concurrent calls do not
+    share coordinates.
+    """
+    
+    frame_universe = mda.Merge(atoms)
+    frame_universe.atoms.positions = positions
+    frame_universe.dimensions = dimensions
+    
+    frame_universe.atoms.write(file_name, file_format="PDB", bonds=None)
+    
+    return file_name
+
+
+def save_mdtraj_frame(frame_traj, file_name):
+    """
+    Writes a single frame MDTraj trajectory to a PDB file.
+    """
+    
+    frame_traj.save_pdb(file_name)
+    
+    return file_name
+
+
+def write_mda_shard(
+        topology,
+        trajectory,
+        selection,
+        frame_indexes,
+        file_name,
+        ):
+    """
+    Writes frames of a trajectory to file_name with MDAnalysis.
+    
+    Runs in worker processes, the Universe is created here.
+    
+    Parameters
+    ----------
+    topology : str
+        The topology file.
+    
+    trajectory : str, list of str or np.ndarray
+        The trajectory file(s) or the coordinates array
+        (frames, atoms, 3) of a trajectory in memory.
+    
+    selection : str
+        The atom selection to write.
+    
+    frame_indexes : list of int
+        Frames to write, indexed at 0 in <trajectory>.
+    
+    file_name : str
+    
+    Returns
+    -------
+    tuple
+        (file_name, number of frames written)
+    """
+    
+    if isinstance(trajectory, np.ndarray):
+        universe = mda.Universe(topology, trajectory, format=MemoryReader)
+    else:
+        universe = mda.Universe(topology, trajectory)
+    
+    atoms = universe.select_atoms(selection)
+    
+    with mda.Writer(file_name, atoms.n_atoms) as W:
+        for _ in universe.trajectory[frame_indexes]:
+            W.write(atoms)
+    
+    return file_name, len(frame_indexes)
+
+
+def save_mdtraj_shard(part_traj, file_name):
+    """
+    Writes an MDTraj trajectory to file_name.
+    
+    Returns
+    -------
+    tuple
+        (file_name, number of frames written)
+    """
+    
+    part_traj.save(file_name, force_overwrite=True)
+    
+    return file_name, part_traj.n_frames